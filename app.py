@@ -6,9 +6,16 @@
 使用Flask框架构建，支持参数控制、按周模拟和结果查看
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, make_response, session, abort, g
+import atexit
 import os
+import shutil
 import sys
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # 添加src目录到路径，以便导入现有模块
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
@@ -17,9 +24,73 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 
-# 全局模拟管理器实例
-from src.simulation_manager import SimulationManager
-sim_manager = SimulationManager()
+# 会话注册表：每个浏览器会话（或指定的场景ID）使用独立的模拟管理器
+from src.monte_carlo import check_batch_args, run_batch
+from src.parameter_sweep import SweepCache, expand_grid, latin_hypercube, run_sweep, scenario_params
+from src.event_stream import format_sse
+from src.event_ledger import LTV_FIELDS
+from src.daily_history import COLUMNS
+from src.downsample import METHODS
+from src.session_registry import SessionRegistry
+# 空闲会话溢出目录：可用环境变量指定，默认在启动时新建仅本进程用户可访问（0700）的临时目录，退出时删除
+SPILL_DIR = os.environ.get('SESSION_SPILL_DIR')
+if not SPILL_DIR:
+    SPILL_DIR = tempfile.mkdtemp(prefix='dental_clinic_sessions_')
+    atexit.register(shutil.rmtree, SPILL_DIR, ignore_errors=True)
+sessions = SessionRegistry(
+    max_sessions=32,  # 内存中最多保留的会话数
+    memory_budget=1024 * 1024 * 1024,  # 内存中全部会话的估算内存上限：1GB
+    spill_dir=SPILL_DIR,  # 空闲会话溢出目录
+    idle_seconds=1800  # 空闲30分钟后溢出到磁盘
+)
+sweep_cache = SweepCache()  # 参数扫描结果缓存（按场景哈希）
+montecarlo_executor = ThreadPoolExecutor(max_workers=1)  # 蒙特卡洛后台任务依次执行（每个任务内部多进程并行）
+montecarlo_jobs = OrderedDict()  # 任务ID -> Future，按提交顺序
+montecarlo_lock = threading.Lock()
+MONTE_CARLO_MAX_REPLICATIONS = 5000  # 单个任务最多重复模拟次数
+MONTE_CARLO_MAX_JOBS = 32  # 最多保留的任务数（超出时丢弃已完成的旧任务）
+STREAM_KEEPALIVE_SECONDS = 15  # 事件流无数据时发送心跳的间隔（秒）
+SCENARIO_HEADER = 'X-Scenario-ID'  # 指定场景ID的请求头（也可用scenario查询参数）
+PATIENT_QUERY_MAX_LIMIT = 1000  # 患者明细查询每页最多返回的事件数
+SERIES_METRICS = [name for name, dtype in COLUMNS.items() if dtype is not object]  # 可降采样的日指标（数值列）
+SERIES_MAX_WIDTH = 4000  # 降采样序列的最大点数
+SERIES_MAX_METRICS = 8  # 一次最多请求的指标数
+LTV_MAX_LIMIT = 500  # 患者价值表每页最多返回的患者数
+BEHAVIOR_MAX_PATIENTS = 200  # 行为矩阵一次最多返回的患者数
+BEHAVIOR_MAX_DAYS = 366  # 行为矩阵一次最多返回的天数
+BEHAVIOR_DEFAULT_DAYS = 30  # 行为矩阵默认返回的天数
+
+
+def current_session_id():
+    """当前请求的会话ID：优先使用显式指定的场景ID，否则使用浏览器会话"""
+    scenario = request.args.get('scenario') or request.headers.get(SCENARIO_HEADER)
+    if scenario:
+        return scenario
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+
+def current_manager():
+    """获取当前会话的模拟管理器（请求结束前标记为正在使用，不会被溢出到磁盘）"""
+    if 'session_in_use' in g:
+        return sessions.get(g.session_in_use)
+    sessions.spill_idle()
+    session_id = current_session_id()
+    try:
+        manager = sessions.acquire(session_id)
+    except ValueError as e:
+        abort(make_response(jsonify({'status': 'error', 'message': str(e)}), 400))
+    g.session_in_use = session_id
+    return manager
+
+
+@app.teardown_request
+def release_manager(exc):
+    """请求结束：解除当前会话的使用标记"""
+    session_id = g.pop('session_in_use', None)
+    if session_id is not None:
+        sessions.release(session_id)
 
 
 @app.route('/')
@@ -43,6 +114,7 @@ def summary():
 @app.route('/api/params', methods=['GET', 'POST'])
 def api_params():
     """获取或设置模拟参数"""
+    sim_manager = current_manager()
     if request.method == 'GET':
         return jsonify(sim_manager.get_params())
     else:
@@ -54,6 +126,7 @@ def api_params():
 @app.route('/api/simulation/reset', methods=['POST'])
 def api_reset():
     """重置模拟"""
+    sim_manager = current_manager()
     result = sim_manager.reset_simulation()
     return jsonify(result)
 
@@ -61,50 +134,492 @@ def api_reset():
 @app.route('/api/simulation/next', methods=['POST'])
 def api_next():
     """运行下一周模拟"""
+    sim_manager = current_manager()
     result = sim_manager.run_next_week()
     return jsonify(result)
 
 
+@app.route('/api/simulation/run', methods=['POST'])
+def api_run():
+    """运行模拟到目标天数（默认运行到结束），可选后台运行"""
+    sim_manager = current_manager()
+    options = request.get_json(silent=True) or {}
+    target_day = options.get('target_day')
+    try:
+        target_day = None if target_day is None else int(target_day)
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'target_day must be an integer'}), 400
+    result = sim_manager.start_run(target_day, background=bool(options.get('background', False)))
+    return jsonify(result)
+
+
+@app.route('/api/simulation/progress', methods=['GET'])
+def api_progress():
+    """获取运行进度：当前天数、速度（天/秒）和预计剩余时间"""
+    sim_manager = current_manager()
+    return jsonify(sim_manager.get_progress())
+
+
 @app.route('/api/simulation/state', methods=['GET'])
 def api_state():
     """获取当前模拟状态"""
+    sim_manager = current_manager()
     state = sim_manager.get_state()
     return jsonify(state)
 
 
+@app.route('/api/sessions', methods=['GET'])
+def api_sessions():
+    """获取会话统计：内存中/已溢出的会话数和估算内存占用"""
+    return jsonify(sessions.stats())
+
+
+@app.route('/api/sessions/current', methods=['DELETE'])
+def api_delete_session():
+    """删除当前会话（内存和磁盘中的模拟数据）"""
+    sessions.remove(current_session_id())
+    return jsonify({'status': 'success', 'message': 'Session removed'})
+
+
+@app.route('/api/stream', methods=['GET'])
+def api_stream():
+    """
+    模拟事件流（Server-Sent Events）
+
+    事件：
+    - state: 连接建立时的当前状态
+    - week / month: 新产生的周统计数据、当前天所在月份的月度统计（月份未结束时为至今的汇总）
+    - progress: 连续运行的进度
+    - reset: 模拟已重置
+    - gap: 客户端读取过慢，部分事件被丢弃，应通过增量查询接口重新同步
+    """
+    sim_manager = current_manager()
+
+    def generate():
+        # 在生成器内订阅：客户端在生成器开始前断开时close()不会执行finally，订阅不能放在视图函数中
+        subscription = sim_manager.stream.subscribe()
+        try:
+            yield format_sse('state', sim_manager.get_state(), sim_manager.version)
+            while True:
+                events, dropped = subscription.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                if dropped:
+                    yield format_sse('gap', {'dropped': dropped}, sim_manager.version)
+                if not events:
+                    yield ': keepalive\n\n'  # 心跳注释行，保持连接并及时发现断开的客户端
+                for event, event_id, data in events:
+                    yield format_sse(event, data, event_id)
+        finally:
+            sim_manager.stream.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/simulation/montecarlo', methods=['POST'])
+def api_montecarlo():
+    """
+    按当前参数批量重复模拟（后台任务）
+
+    参数校验通过后立即返回202和任务ID，批量模拟在后台依次执行，
+    通过 GET /api/simulation/montecarlo/<job_id> 查询状态，完成后返回分位带和回本月份分布
+    """
+    sim_manager = current_manager()
+    options = request.get_json(silent=True) or {}
+    if not isinstance(options.get('params', {}), dict):
+        return jsonify({'status': 'error', 'message': 'params must be an object'}), 400
+    params = dict(sim_manager.get_params())
+    params.update(options.get('params', {}))
+    replications = options.get('replications', 100)
+    seed, workers = options.get('seed'), options.get('workers')
+    try:
+        check_batch_args(replications, seed, workers)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if replications > MONTE_CARLO_MAX_REPLICATIONS:
+        return jsonify({'status': 'error', 'message': f'replications must not exceed {MONTE_CARLO_MAX_REPLICATIONS}'}), 400
+
+    job_id = uuid.uuid4().hex
+    with montecarlo_lock:
+        montecarlo_jobs[job_id] = montecarlo_executor.submit(run_batch, params, replications, seed, workers)
+        # 只保留最近的任务结果，优先丢弃已完成的旧任务
+        for old_id in [jid for jid, job in montecarlo_jobs.items() if job.done()]:
+            if len(montecarlo_jobs) <= MONTE_CARLO_MAX_JOBS:
+                break
+            del montecarlo_jobs[old_id]
+    return jsonify({'status': 'accepted', 'job_id': job_id,
+                    'status_url': f'/api/simulation/montecarlo/{job_id}'}), 202
+
+
+@app.route('/api/simulation/montecarlo/<job_id>', methods=['GET'])
+def api_montecarlo_job(job_id):
+    """查询蒙特卡洛后台任务：queued / running / error，完成时返回结果"""
+    with montecarlo_lock:
+        job = montecarlo_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    if not job.done():
+        return jsonify({'status': 'running' if job.running() else 'queued', 'job_id': job_id})
+    error = job.exception()
+    if error is not None:
+        return jsonify({'status': 'error', 'job_id': job_id, 'message': str(error)}), 500
+    result = dict(job.result())
+    result.update({'status': 'success', 'job_id': job_id})
+    return jsonify(result)
+
+
+@app.route('/api/simulation/sweep', methods=['POST'])
+def api_sweep():
+    """参数扫描：按网格或拉丁超立方展开场景并行运行，返回排序后的结果表"""
+    sim_manager = current_manager()
+    options = request.get_json(silent=True) or {}
+    try:
+        if options.get('lhs'):
+            scenarios = latin_hypercube(options['lhs'], int(options.get('samples', 20)), options.get('seed'))
+        else:
+            scenarios = expand_grid(options.get('grid', {}))
+        result = run_sweep(
+            scenario_params(sim_manager.get_params()),  # 会话的随机种子不参与场景哈希，由扫描种子代替
+            scenarios,
+            seed=options.get('seed', 0),
+            objectives=tuple(options.get('objectives', ['final_cash'])),
+            workers=options.get('workers'),
+            cache=sweep_cache
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(result)
+
+
+def _parse_cursor(snapshot):
+    """
+    解析增量查询参数
+
+    支持两种写法：
+    - cursor=<运行编号>:<天数>：上次响应返回的游标，模拟重置后自动从头返回
+    - since_day=<天数>：只返回该天之后的数据
+
+    返回：
+    - (since_day, 是否需要从头同步)，两个参数都没有时返回(None, False)
+    """
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        run_id, _, day = cursor.partition(':')
+        if int(run_id) != snapshot.run_id:
+            return 0, True  # 游标属于重置前的模拟，从头返回
+        return int(day), False
+    since_day = request.args.get('since_day')
+    if since_day is not None:
+        return max(0, int(since_day)), False
+    return None, False
+
+
+def _events_unsupported(snapshot):
+    """向量化引擎不记录逐条患者事件和行为矩阵：相关接口返回400，支持时返回None"""
+    if snapshot.records_events:
+        return None
+    return jsonify({'status': 'error', 'message': "engine 'vectorized' does not record patient events or behavior; run with engine 'object' to use this endpoint"}), 400
+
+
+def _snapshot_etag(snapshot):
+    """
+    快照的ETag：会话ID、运行编号和数据版本
+
+    会话被删除后重建时数据版本从头计数，运行编号（全局不重复）区分不同的模拟数据
+    """
+    return f'{current_session_id()}-{snapshot.run_id}-{snapshot.version}'
+
+
+def _etag_response(snapshot, build):
+    """
+    带ETag的JSON响应：客户端缓存的版本与快照一致时返回304，否则用build()生成数据
+
+    参数：
+    - snapshot: 本次请求读取的快照
+    - build: 无参函数，返回可序列化为JSON的数据
+    """
+    etag = _snapshot_etag(snapshot)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    return response
+
+
+def _results_response(sim_manager, type):
+    """
+    构造结果响应：数据版本未变化时返回304，带since_day/cursor时只返回增量数据
+
+    整个响应只读取同一个已发布的快照，不会与正在推进的模拟互相影响
+
+    参数：
+    - sim_manager: 当前会话的模拟管理器
+    - type: daily / weekly / monthly / yearly / patient_details / summary
+    """
+    snapshot = sim_manager.get_snapshot()
+    if type == 'patient_details' and not snapshot.records_events:
+        return _events_unsupported(snapshot)
+    try:
+        since_day, reset = _parse_cursor(snapshot)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid since_day or cursor'}), 400
+
+    def build():
+        if type == 'summary':
+            return snapshot.summary
+        if since_day is None:
+            return snapshot.results(type)
+        return {
+            'run': snapshot.run_id,  # 运行编号
+            'version': snapshot.version,  # 数据版本
+            'since_day': since_day,
+            'current_day': snapshot.current_day,
+            'cursor': f'{snapshot.run_id}:{snapshot.current_day}',  # 下次增量查询使用的游标
+            'reset': reset,  # 模拟已重置，客户端需要丢弃已有数据
+            'rows': snapshot.results(type, since_day)
+        }
+
+    return _etag_response(snapshot, build)
+
+
 @app.route('/api/results/daily', methods=['GET'])
 def api_results_daily():
-    """获取每日结果"""
-    results = sim_manager.get_results(type="daily")
-    return jsonify(results)
+    """获取每日结果（支持since_day/cursor增量查询）"""
+    sim_manager = current_manager()
+    return _results_response(sim_manager, 'daily')
 
 
 @app.route('/api/results/weekly', methods=['GET'])
 def api_results_weekly():
-    """获取每周结果"""
-    results = sim_manager.get_results(type="weekly")
-    return jsonify(results)
+    """获取每周结果（支持since_day/cursor增量查询）"""
+    sim_manager = current_manager()
+    return _results_response(sim_manager, 'weekly')
 
 
 @app.route('/api/results/monthly', methods=['GET'])
 def api_results_monthly():
-    """获取月度结果"""
-    results = sim_manager.get_results(type="monthly")
-    return jsonify(results)
+    """获取月度结果（支持since_day/cursor增量查询）"""
+    sim_manager = current_manager()
+    return _results_response(sim_manager, 'monthly')
+
+
+@app.route('/api/results/yearly', methods=['GET'])
+def api_results_yearly():
+    """获取年度结果（支持since_day/cursor增量查询）"""
+    sim_manager = current_manager()
+    return _results_response(sim_manager, 'yearly')
 
 
 @app.route('/api/results/summary', methods=['GET'])
 def api_results_summary():
     """获取总结数据"""
-    summary = sim_manager.get_summary()
-    return jsonify(summary)
+    sim_manager = current_manager()
+    return _results_response(sim_manager, 'summary')
 
 
 @app.route('/api/results/patient_details', methods=['GET'])
 def api_results_patient_details():
-    """获取患者详细记录"""
-    patient_details = sim_manager.get_patient_details()
-    return jsonify(patient_details)
+    """获取患者详细记录（支持since_day/cursor增量查询）"""
+    sim_manager = current_manager()
+    return _results_response(sim_manager, 'patient_details')
+
+
+def _parse_patient_id(value):
+    """解析患者ID：支持 12 和 P012 两种写法，无效时抛出ValueError"""
+    return int(value[1:] if value[:1] in ('P', 'p') else value)
+
+
+@app.route('/api/results/patient_details/query', methods=['GET'])
+def api_results_patient_details_query():
+    """
+    按条件分页查询患者详细记录
+
+    查询参数：
+    - patient_id: 患者ID（如 12 或 P012）
+    - action: 行为类型（如 治疗、续卡、矫正开始）
+    - source: 患者来源（native / existing）
+    - day_start / day_end: 日期范围（含两端）
+    - limit: 每页事件数（默认100）
+    - cursor: 上一页返回的next_cursor，模拟重置后自动从头返回
+    """
+    sim_manager = current_manager()
+    snapshot = sim_manager.get_snapshot()
+    unsupported = _events_unsupported(snapshot)
+    if unsupported:
+        return unsupported
+    args = request.args
+    try:
+        patient_id = args.get('patient_id')
+        patient_id = None if patient_id is None else _parse_patient_id(patient_id)
+        day_start = None if args.get('day_start') is None else int(args['day_start'])
+        day_end = None if args.get('day_end') is None else int(args['day_end'])
+        limit = int(args.get('limit', 100))
+        start, reset = 0, False
+        cursor = args.get('cursor')
+        if cursor is not None:
+            run_id, _, position = cursor.partition(':')
+            if int(run_id) == snapshot.run_id:
+                start = int(position)
+            else:
+                reset = True  # 游标属于重置前的模拟，从头返回
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'patient_id, day_start, day_end, limit and cursor must be integers'}), 400
+    if not 0 < limit <= PATIENT_QUERY_MAX_LIMIT or start < 0:
+        return jsonify({'status': 'error', 'message': f'limit must be between 1 and {PATIENT_QUERY_MAX_LIMIT}'}), 400
+
+    rows, next_start = snapshot.query_events(
+        start, limit, patient_id=patient_id, action=args.get('action'), source=args.get('source'),
+        day_start=day_start, day_end=day_end)
+    return jsonify({
+        'run': snapshot.run_id,  # 运行编号
+        'version': snapshot.version,  # 数据版本
+        'current_day': snapshot.current_day,
+        'reset': reset,  # 模拟已重置，客户端需要丢弃已有数据
+        'next_cursor': None if next_start is None else f'{snapshot.run_id}:{next_start}',  # 下一页的游标，没有更多数据时为null
+        'rows': rows
+    })
+
+
+@app.route('/api/series', methods=['GET'])
+def api_series():
+    """
+    获取降采样后的日指标序列，用于长周期图表
+
+    查询参数：
+    - metrics: 逗号分隔的日指标列名（如 Cash,RevenueTotal）
+    - width: 目标点数，通常为图表像素宽度（默认800）
+    - method: lttb（默认）/ minmax
+    - day_start / day_end: 日期范围（含两端），默认全部
+    """
+    sim_manager = current_manager()
+    metrics = [name for name in request.args.get('metrics', 'Cash').split(',') if name]
+    method = request.args.get('method', 'lttb')
+    unknown = [name for name in metrics if name not in SERIES_METRICS]
+    if not metrics or unknown or len(metrics) > SERIES_MAX_METRICS:
+        return jsonify({'status': 'error', 'message': f'metrics must be 1 to {SERIES_MAX_METRICS} numeric daily columns, unknown: {", ".join(unknown)}'}), 400
+    if method not in METHODS:
+        return jsonify({'status': 'error', 'message': f'method must be one of {", ".join(METHODS)}'}), 400
+    try:
+        width = int(request.args.get('width', 800))
+        day_start = int(request.args.get('day_start', 1))
+        day_end = None if request.args.get('day_end') is None else int(request.args['day_end'])
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'width, day_start and day_end must be integers'}), 400
+    if not 3 <= width <= SERIES_MAX_WIDTH or day_start < 1:
+        return jsonify({'status': 'error', 'message': f'width must be between 3 and {SERIES_MAX_WIDTH}'}), 400
+
+    snapshot = sim_manager.get_snapshot()
+    return _etag_response(snapshot, lambda: {
+        'current_day': snapshot.current_day,
+        'width': width,
+        'method': method,
+        'series': {name: snapshot.series(name, width, method, day_start, day_end) for name in metrics}
+    })
+
+
+@app.route('/api/patients/ltv', methods=['GET'])
+def api_patients_ltv():
+    """
+    获取按累计价值排序的患者价值表
+
+    查询参数：
+    - sort: 排序指标（CashFlow / Revenue / Costs / Visits / Renewals / OrthoRevenue，默认Revenue）
+    - order: desc（默认）/ asc
+    - offset / limit: 分页（默认0 / 50）
+    """
+    sim_manager = current_manager()
+    sort = request.args.get('sort', 'Revenue')
+    order = request.args.get('order', 'desc')
+    if sort not in LTV_FIELDS or order not in ('asc', 'desc'):
+        return jsonify({'status': 'error', 'message': f'sort must be one of {", ".join(LTV_FIELDS)} and order must be asc or desc'}), 400
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'offset and limit must be integers'}), 400
+    if offset < 0 or not 0 < limit <= LTV_MAX_LIMIT:
+        return jsonify({'status': 'error', 'message': f'limit must be between 1 and {LTV_MAX_LIMIT}'}), 400
+
+    snapshot = sim_manager.get_snapshot()
+    unsupported = _events_unsupported(snapshot)
+    if unsupported:
+        return unsupported
+
+    def build():
+        total, rows = snapshot.ltv_table(sort, order == 'desc', offset, limit)
+        return {'total': total, 'sort': sort, 'order': order, 'offset': offset, 'rows': rows}
+
+    return _etag_response(snapshot, build)
+
+
+@app.route('/api/patients/<patient_id>', methods=['GET'])
+def api_patient(patient_id):
+    """获取单个患者的时间线（全部事件）和累计价值"""
+    sim_manager = current_manager()
+    try:
+        patient_id = _parse_patient_id(patient_id)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid patient id'}), 400
+    snapshot = sim_manager.get_snapshot()
+    unsupported = _events_unsupported(snapshot)
+    if unsupported:
+        return unsupported
+    result = snapshot.patient(patient_id)
+    if result is None:
+        return jsonify({'status': 'error', 'message': 'Patient not found'}), 404
+    return jsonify(result)
+
+
+@app.route('/api/results/cashflow_by_source', methods=['GET'])
+def api_results_cashflow_by_source():
+    """获取按周/月汇总的纯新患者与老店患者现金流、营收（granularity=week|month）"""
+    sim_manager = current_manager()
+    granularity = request.args.get('granularity', 'week')
+    if granularity not in ('week', 'month'):
+        return jsonify({'status': 'error', 'message': 'granularity must be week or month'}), 400
+
+    snapshot = sim_manager.get_snapshot()
+    unsupported = _events_unsupported(snapshot)
+    if unsupported:
+        return unsupported
+    return _etag_response(snapshot, lambda: snapshot.cashflow_by_source(granularity))
+
+
+@app.route('/api/behavior', methods=['GET'])
+def api_behavior():
+    """
+    获取患者行为矩阵的一个窗口（只渲染请求的患者/日期范围）
+
+    查询参数：
+    - patient_offset / patient_limit: 从第几个有行为的患者开始、最多返回多少个患者
+    - day_start / day_end: 日期范围（含两端），day_end默认为day_start之后的30天
+    """
+    sim_manager = current_manager()
+    try:
+        patient_offset = int(request.args.get('patient_offset', 0))
+        patient_limit = int(request.args.get('patient_limit', 50))
+        day_start = int(request.args.get('day_start', 1))
+        day_end = int(request.args.get('day_end', day_start + BEHAVIOR_DEFAULT_DAYS - 1))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'patient_offset, patient_limit, day_start and day_end must be integers'}), 400
+    if patient_offset < 0:
+        return jsonify({'status': 'error', 'message': 'patient_offset must not be negative'}), 400
+    if not 0 < patient_limit <= BEHAVIOR_MAX_PATIENTS:
+        return jsonify({'status': 'error', 'message': f'patient_limit must be between 1 and {BEHAVIOR_MAX_PATIENTS}'}), 400
+    if day_start < 1 or not 0 <= day_end - day_start < BEHAVIOR_MAX_DAYS:
+        return jsonify({'status': 'error', 'message': f'day window must span 1 to {BEHAVIOR_MAX_DAYS} days'}), 400
+
+    snapshot = sim_manager.get_snapshot()
+    unsupported = _events_unsupported(snapshot)
+    if unsupported:
+        return unsupported
+
+    def build():
+        result = snapshot.behavior_window(patient_offset, patient_limit, day_start, day_end)
+        result['current_day'] = snapshot.current_day
+        return result
+
+    return _etag_response(snapshot, build)
 
 
 if __name__ == '__main__':
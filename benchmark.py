@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准脚本
+
+用法：python benchmark.py <基准名称>
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+# 添加src目录到路径，与app.py保持一致
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from patient import Patient
+from appointment_book import AppointmentBook
+from simulation_manager import SimulationManager
+
+
+def bench_appointments(sizes=(1000, 10000, 100000), due_per_day=50):
+    """
+    预约索引基准：比较按日期分桶取出到期患者与遍历全部患者的单日耗时
+
+    患者数增加时，索引的单日耗时应保持平稳，遍历的耗时随患者数线性增长
+    """
+    print(f"{'患者数':>10} {'索引(微秒/天)':>16} {'遍历(微秒/天)':>16}")
+    for size in sizes:
+        rng = random.Random(size)
+        book = AppointmentBook()
+        patients = []
+        # 预约均匀分布在span天内，使每天到期的患者数固定为due_per_day
+        span = size // due_per_day
+        days = min(span, 90)
+        for pid in range(1, size + 1):
+            p = Patient(pid, 0, 8, appointment_book=book)
+            p.next_appointment_day = rng.randint(1, span)
+            patients.append(p)
+
+        start = time.perf_counter()
+        for day in range(1, days + 1):
+            book.pop_due(day)
+        indexed = (time.perf_counter() - start) / days * 1e6
+
+        start = time.perf_counter()
+        for day in range(1, days + 1):
+            [p for p in patients if p.is_active and (p.next_appointment_day == day or p.next_ortho_appointment == day)]
+        scanned = (time.perf_counter() - start) / days * 1e6
+
+        print(f"{size:>10} {indexed:>16.1f} {scanned:>16.1f}")
+
+
+def bench_engines(sizes=(400, 10000, 100000), years=2):
+    """
+    引擎基准：比较对象引擎与向量化引擎在不同初始会员数下的单日患者流耗时
+    """
+    print(f"{'初始会员数':>10} {'对象引擎(毫秒/天)':>18} {'向量化引擎(毫秒/天)':>20}")
+    for size in sizes:
+        row = []
+        for engine in ('object', 'vectorized'):
+            manager = SimulationManager()
+            manager.set_params({'years': years, 'initial_members': size, 'engine': engine})
+            days = years * 365
+            start = time.perf_counter()
+            for _ in range(days):
+                manager._run_single_day()
+            row.append((time.perf_counter() - start) / days * 1e3)
+        print(f"{size:>10} {row[0]:>18.2f} {row[1]:>20.2f}")
+
+
+def bench_concurrency(readers=4, years=5, interval=0.1):
+    """
+    并发压力测试：后台连续运行模拟的同时，多个线程反复请求日数据和患者明细接口
+
+    校验每次读到的日数据天数连续、增量明细不重不漏，并比较有无并发读取时的模拟速度。
+    读取线程每轮请求之间间隔interval秒；间隔为0时纯Python线程争抢GIL，模拟速度会明显下降
+    """
+    import app as web
+
+    def run(reader_count):
+        scenario = f'stress{reader_count}'
+        headers = {web.SCENARIO_HEADER: scenario}
+        control = web.app.test_client()
+        control.post('/api/params', json={'years': years, 'seed': 1}, headers=headers)
+        manager = web.sessions.get(scenario)
+
+        errors = []
+        requests = [0]
+
+        def reader():
+            client = web.app.test_client()
+            cursor = None
+            events = 0
+            while True:
+                running = manager.is_running()
+                daily = client.get('/api/results/daily', headers=headers).get_json()
+                if [d['Day'] for d in daily] != list(range(1, len(daily) + 1)):
+                    errors.append('日数据天数不连续')
+                query = f'?cursor={cursor}' if cursor else '?since_day=0'
+                delta = client.get('/api/results/patient_details' + query, headers=headers).get_json()
+                if any(not delta['since_day'] < e['Day'] <= delta['current_day'] for e in delta['rows']):
+                    errors.append('增量明细超出游标范围')
+                events += len(delta['rows'])
+                cursor = delta['cursor']
+                requests[0] += 2
+                if not running:
+                    break
+                time.sleep(interval)
+            if events != len(manager.get_patient_details()):
+                errors.append(f'增量明细合计{events}条，全量{len(manager.get_patient_details())}条')
+
+        control.post('/api/simulation/run', json={'background': True}, headers=headers)
+        threads = [threading.Thread(target=reader) for _ in range(reader_count)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        while manager.is_running():
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        for t in threads:
+            t.join()
+        web.sessions.remove(scenario)
+        return years * 365 / elapsed, requests[0], errors
+
+    print(f"{'读取线程':>8} {'模拟速度(天/秒)':>16} {'请求数':>8} {'错误':>6}")
+    for reader_count in (0, readers):
+        speed, count, errors = run(reader_count)
+        print(f"{reader_count:>8} {speed:>16.0f} {count:>8} {len(errors):>6}")
+        for message in sorted(set(errors)):
+            print(f"  {message}")
+
+
+def _dict_patient_class():
+    """
+    对照用的患者类：方法与Patient相同，但没有__slots__，属性保存在实例__dict__中
+    （Patient改为固定槽位布局之前的内存布局）
+    """
+    namespace = {name: value for name, value in vars(Patient).items()
+                 if name not in Patient.__slots__ and name != '__slots__'}
+    return type('DictPatient', (), namespace)
+
+
+def _patient_memory(patient_class, size):
+    """创建size个患者（半数办卡、一成开始矫正），返回tracemalloc统计的内存占用（字节）"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    patients = []
+    for pid in range(1, size + 1):
+        p = patient_class(pid, pid % 365, 8.5, source="native")
+        if pid % 2 == 0:
+            p.buy_card('5yr', 1, 5000)
+        if pid % 10 == 0:
+            p.has_ortho = True
+            p.ortho_start_day = 100
+            p.ortho_age = 12.0
+            p.ortho_total_cost = 25000.0
+            p.ortho_revenue_remaining = 11250.0
+        patients.append(p)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used
+
+
+def bench_memory(size=100000):
+    """
+    患者内存基准：用同一组数据分别创建size个__dict__布局（改造前）和__slots__布局（当前）的患者，
+    对比总内存和平均每个患者占用的字节数
+    """
+    print(f"患者数：{size}")
+    print(f"{'布局':>10} {'总内存(MB)':>12} {'每个患者(字节)':>16}")
+    results = []
+    for name, patient_class in (('__dict__', _dict_patient_class()), ('__slots__', Patient)):
+        used = _patient_memory(patient_class, size)
+        results.append(used)
+        print(f"{name:>10} {used / 1024 / 1024:>12.1f} {used / size:>16.0f}")
+    print(f"节省：{(1 - results[1] / results[0]):.0%}")
+
+
+def bench_rollups(years=(1, 5, 10)):
+    """
+    周/月/年统计基准：每周增量更新的耗时与全量重算的耗时对比，并核对两者结果一致
+
+    增量更新只处理本周新增的7天，耗时不随模拟年数增长；全量重算随日数据线性增长
+    """
+    print(f"{'年数':>6} {'增量(微秒/周)':>16} {'全量重算(微秒/次)':>20} {'一致':>6}")
+    for year in years:
+        manager = SimulationManager()
+        manager.set_params({'years': year, 'seed': 1})
+        weekly_seconds = 0.0
+        while manager.state['current_day'] < year * 365:
+            for _ in range(7):
+                if manager.state['current_day'] >= year * 365:
+                    break
+                manager._run_single_day()
+            manager.state['current_week'] += 1
+            start = time.perf_counter()
+            manager._calculate_weekly_stats()
+            weekly_seconds += time.perf_counter() - start
+        weekly = weekly_seconds / manager.state['current_week'] * 1e6
+
+        start = time.perf_counter()
+        mismatches = manager.verify_rollups()
+        full = (time.perf_counter() - start) * 1e6
+
+        print(f"{year:>6} {weekly:>16.1f} {full:>20.1f} {'是' if not mismatches else '否':>6}")
+        for mismatch in mismatches[:10]:
+            print(f"  {mismatch}")
+
+
+def bench_incremental(years=3):
+    """
+    增量查询基准：每周按上次的天数（since_day）轮询周/月/年数据，与每次全量读取的传输行数对比，
+    并核对按周数/月份/年份合并后的结果与全量结果一致（月数据跨年合并，覆盖跨年的情况）
+    """
+    keys = {'weekly': 'Week', 'monthly': 'Month', 'yearly': 'Year'}
+    manager = SimulationManager()
+    manager.set_params({'years': years, 'seed': 1})
+    caches = {type: [] for type in keys}
+    full_rows = {type: 0 for type in keys}
+    delta_rows = {type: 0 for type in keys}
+    mismatches = []
+    since_day = 0
+    while manager.run_next_week()['status'] == 'success':
+        snapshot = manager.get_snapshot()
+        for type, key in keys.items():
+            # 与detail.js的mergeRows一致：按周数/月份/年份覆盖已有行，新周期追加到末尾
+            cache = caches[type]
+            positions = {row[key]: i for i, row in enumerate(cache)}
+            rows = snapshot.results(type, since_day)
+            delta_rows[type] += len(rows)
+            for row in rows:
+                if row[key] in positions:
+                    cache[positions[row[key]]] = row
+                else:
+                    cache.append(row)
+            expected = snapshot.results(type)
+            full_rows[type] += len(expected)
+            if cache != expected and len(mismatches) < 10:
+                mismatches.append(f'第{snapshot.current_day}天 {type}：增量合并{len(cache)}行，全量{len(expected)}行')
+        since_day = snapshot.current_day
+
+    print(f"{'类型':>8} {'全量(行)':>10} {'增量(行)':>10}")
+    for type in keys:
+        print(f"{type:>8} {full_rows[type]:>10} {delta_rows[type]:>10}")
+    print(f"模拟{years}年，增量合并与全量结果一致：{'是' if not mismatches else '否'}")
+    for mismatch in mismatches:
+        print(f"  {mismatch}")
+
+
+def bench_series(years=(1, 5, 10), metrics=('Cash', 'RevenueTotal', 'Profit'), width=800):
+    """
+    图表序列基准：全部日数据与按图表宽度降采样（LTTB）后的点数、数据量和生成耗时对比
+
+    降采样后的点数和数据量只取决于图表宽度，不随模拟年数增长
+    """
+    import json
+
+    print(f"{'年数':>6} {'原始点数':>10} {'原始(KB)':>10} {'降采样点数':>12} {'降采样(KB)':>12} {'首次(毫秒)':>12} {'缓存(毫秒)':>12}")
+    for year in years:
+        manager = SimulationManager()
+        manager.set_params({'years': year, 'seed': 1})
+        manager.start_run()
+        snapshot = manager.get_snapshot()
+
+        days = snapshot.daily_frame()['Day'].tolist()
+        raw = json.dumps({name: {'Day': days, 'Value': snapshot.daily_frame()[name].tolist()} for name in metrics})
+
+        start = time.perf_counter()
+        series = {name: snapshot.series(name, width) for name in metrics}
+        first = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        for name in metrics:
+            snapshot.series(name, width)
+        cached = (time.perf_counter() - start) * 1000
+
+        payload = json.dumps(series)
+        print(f"{year:>6} {len(days):>10} {len(raw) / 1024:>10.0f} {len(series[metrics[0]]['Day']):>12} "
+              f"{len(payload) / 1024:>12.0f} {first:>12.2f} {cached:>12.3f}")
+
+
+def bench_sources(years=(1, 3, 5)):
+    """
+    来源汇总基准：按来源汇总现金流时，传输并遍历全部患者事件与读取服务端汇总的耗时、数据量对比，
+    并核对两者结果一致
+    """
+    import json
+    import math
+
+    print(f"{'年数':>6} {'事件数':>10} {'全量事件(毫秒)':>16} {'全量(KB)':>10} {'服务端汇总(毫秒)':>18} {'汇总(KB)':>10} {'一致':>6}")
+    for year in years:
+        manager = SimulationManager()
+        manager.set_params({'years': year, 'seed': 1})
+        manager.start_run()
+        snapshot = manager.get_snapshot()
+
+        # 原做法：序列化全部事件，再逐条按周、来源分组
+        start = time.perf_counter()
+        payload = json.dumps(snapshot.events(), ensure_ascii=False)
+        expected = {}
+        for record in json.loads(payload):
+            if record.get('Source') in ('native', 'existing'):
+                key = ((record['Day'] - 1) // 7 + 1, record['Source'])
+                expected[key] = expected.get(key, 0) + record['CashFlow']
+        full = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        summary = json.dumps(snapshot.cashflow_by_source('week'))
+        aggregated = (time.perf_counter() - start) * 1000
+
+        actual = {(row['Week'], source): row[source]['CashFlow']
+                  for row in json.loads(summary) for source in ('native', 'existing')}
+        same = all(math.isclose(actual.get(key, 0), value, rel_tol=1e-9, abs_tol=1e-6) for key, value in expected.items())
+        same = same and all(value == 0 or key in expected for key, value in actual.items())
+        print(f"{year:>6} {len(snapshot.events()):>10} {full:>16.1f} {len(payload) / 1024:>10.0f} "
+              f"{aggregated:>18.1f} {len(summary) / 1024:>10.1f} {'是' if same else '否':>6}")
+
+
+def bench_montecarlo(replications=32, years=2):
+    """
+    蒙特卡洛扩展性基准：同一批重复模拟分别用1、2、4……个工作进程运行（不超过CPU核心数），
+    报告耗时、相对单进程的加速比和并行效率，并核对各进程数的结果一致
+
+    各次重复模拟互相独立，加速比应接近进程数；明显偏低说明进程启动或结果汇总成为瓶颈
+    """
+    from monte_carlo import run_batch
+
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+
+    print(f"CPU核心数：{cores}，重复次数：{replications}，模拟年数：{years}")
+    print(f"{'进程数':>6} {'耗时(秒)':>10} {'加速比':>8} {'效率':>6} {'结果一致':>8}")
+    baseline = reference = None
+    for workers in counts:
+        start = time.perf_counter()
+        result = run_batch({'years': years}, replications, seed=1, workers=workers)
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline, reference = elapsed, result
+        speedup = baseline / elapsed
+        same = result['bands'] == reference['bands'] and result['final_cash'] == reference['final_cash']
+        print(f"{workers:>6} {elapsed:>10.2f} {speedup:>8.2f} {speedup / workers:>6.0%} {'是' if same else '否':>8}")
+
+
+def bench_startup(runs=5):
+    """
+    冷启动基准：在新的Python进程中测量导入app、加载日历表和创建第一个模拟管理器的耗时
+
+    日历表分别从二进制日期数组（calendar.npy，内存映射）和JSON文件加载，对比两者耗时
+    """
+    import json
+    import subprocess
+    import tempfile
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    data_dir = os.path.join(root, 'data')
+    json_dir = tempfile.mkdtemp()
+    with open(os.path.join(data_dir, 'calendar.json'), 'r', encoding='utf-8') as src, \
+            open(os.path.join(json_dir, 'calendar.json'), 'w', encoding='utf-8') as dst:
+        dst.write(src.read())
+    script = f"""
+import json, sys, time
+sys.path.insert(0, {os.path.join(root, 'src')!r})
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+from calendar_table import load_calendar
+load_calendar({data_dir!r})
+binary = time.perf_counter()
+load_calendar({json_dir!r})
+text = time.perf_counter()
+from simulation_manager import SimulationManager
+SimulationManager()
+manager = time.perf_counter()
+print(json.dumps([imported - start, binary - imported, text - binary, manager - text]))
+"""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True, check=True)
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    best = [min(column) * 1000 for column in zip(*samples)]
+    print(f"导入app：{best[0]:.1f} 毫秒")
+    print(f"加载日历（calendar.npy）：{best[1]:.2f} 毫秒")
+    print(f"加载日历（calendar.json）：{best[2]:.2f} 毫秒")
+    print(f"创建第一个模拟管理器：{best[3]:.1f} 毫秒")
+
+
+BENCHMARKS = {
+    'appointments': bench_appointments,
+    'concurrency': bench_concurrency,
+    'engines': bench_engines,
+    'incremental': bench_incremental,
+    'memory': bench_memory,
+    'montecarlo': bench_montecarlo,
+    'rollups': bench_rollups,
+    'series': bench_series,
+    'sources': bench_sources,
+    'startup': bench_startup,
+}
+
+
+def main():
+    """运行指定的基准"""
+    parser = argparse.ArgumentParser(description='诊所模拟性能基准')
+    parser.add_argument('name', choices=sorted(BENCHMARKS), help='基准名称')
+    args = parser.parse_args()
+    BENCHMARKS[args.name]()
+
+
+if __name__ == "__main__":
+    main()
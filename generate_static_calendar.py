@@ -2,12 +2,16 @@
 # -*- coding: utf-8 -*-
 """
 生成静态日历文件，保存2026-2036年的真实日历数据
+
+同时输出JSON（便于查看）和二进制日期数组calendar.npy（模拟管理器内存映射加载）
 """
 
 import json
 from datetime import datetime, timedelta
 import os
 
+import numpy as np
+
 def generate_calendar():
     """生成2026-2036年的真实日历数据"""
     calendar = []
@@ -66,8 +70,12 @@ def main():
     with open(calendar_file, 'w', encoding='utf-8') as f:
         json.dump(calendar_data, f, ensure_ascii=False, indent=2)
     
+    # 保存二进制日期数组（datetime64[D]，其余字段加载时按日期推算）
+    binary_file = os.path.join(script_dir, 'data', 'calendar.npy')
+    np.save(binary_file, np.array([item['date'] for item in calendar_data], dtype='datetime64[D]'))
+    
     print(f"静态日历文件生成完成！")
-    print(f"保存路径：{calendar_file}")
+    print(f"保存路径：{calendar_file}、{binary_file}")
     print(f"日历天数：{len(calendar_data)}")
     print(f"日期范围：从{calendar_data[0]['date']}到{calendar_data[-1]['date']}")
 
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预约日历索引
+
+按日期分桶保存患者的常规复诊与矫正复诊预约，每天只需取出当天到期的患者，
+无需遍历全部患者列表
+"""
+
+
+class AppointmentBook:
+    """
+    按日期分桶的预约索引
+
+    患者的 next_appointment_day / next_ortho_appointment / is_active 变化时，
+    由 Patient 自动调用 schedule() 登记到对应日期的桶中。
+    改约后旧桶中的记录不做删除，取出时再按患者当前状态校验（惰性删除），
+    因此每次登记和取出的代价只与当天到期的患者数有关。
+    """
+
+    def __init__(self):
+        """初始化空索引"""
+        self._buckets = {}  # 日期 -> 当天登记过预约的患者列表
+
+    def schedule(self, patient, day):
+        """
+        登记患者在某日的预约
+
+        参数：
+        - patient: 患者对象
+        - day: 预约日期，None表示取消预约（无需登记）
+        """
+        if day is None:
+            return
+        bucket = self._buckets.get(day)
+        if bucket is None:
+            self._buckets[day] = [patient]
+        else:
+            bucket.append(patient)
+
+    def pop_due(self, day, include_ortho=True):
+        """
+        取出当天到期的活跃患者，并从索引中移除该日期的桶
+
+        参数：
+        - day: 模拟日期
+        - include_ortho: 是否包含矫正复诊预约
+
+        返回：
+        - 按患者ID排序的到期患者列表（与遍历全部患者的顺序一致）
+        """
+        bucket = self._buckets.pop(day, None)
+        if not bucket:
+            return []
+
+        due = {}
+        for p in bucket:
+            if p.id in due or not p.is_active:
+                continue
+            # 校验预约仍然有效，过滤已改约的旧记录
+            if p.next_appointment_day == day or (include_ortho and p.next_ortho_appointment == day):
+                due[p.id] = p
+
+        return [due[pid] for pid in sorted(due)]
+
+    def clear(self):
+        """清空索引"""
+        self._buckets.clear()
+
+    def __len__(self):
+        """索引中登记的预约记录数（含尚未清理的旧记录）"""
+        return sum(len(bucket) for bucket in self._buckets.values())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+患者行为矩阵（稀疏存储）
+
+患者×日期的行为矩阵绝大部分单元格为空，不再用pandas pivot生成稠密的字符串表，
+而是只保存有行为的 (患者, 日期, 行为编码, 金额) 记录，行为描述在渲染时才按编码和金额生成；
+查询时按患者建立CSR索引，只渲染请求的患者/日期窗口
+"""
+
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+# 行为编码
+# - BEHAVIOR_TEXT: 写入时给定的文字描述（驻留在labels中，金额列保存其下标）
+# - 其余编码的描述由模板和金额生成
+(BEHAVIOR_TEXT, BEHAVIOR_INITIAL_VISIT, BEHAVIOR_INITIAL_VISIT_1YR, BEHAVIOR_INITIAL_VISIT_5YR,
+ BEHAVIOR_FOLLOW_UP, BEHAVIOR_TREATMENT, BEHAVIOR_RENEW_1YR, BEHAVIOR_RENEW_5YR,
+ BEHAVIOR_ORTHO_START, BEHAVIOR_ORTHO_END) = range(10)
+
+# 行为编码中标记金额为浮点数的位（未标记的金额写入时为整数，按整数格式输出）
+FLOAT_AMOUNT = 0x40
+
+# 矫正开始时确认的营收比例（与事件账本一致）
+ORTHO_START_SHARE = 0.55
+
+
+def _label(code, amount):
+    """
+    行为描述
+
+    参数：
+    - code: 行为编码（不含BEHAVIOR_TEXT）
+    - amount: 金额（写入时为整数的金额以整数传入，按整数格式输出）
+    """
+    if code == BEHAVIOR_INITIAL_VISIT:
+        return 'Initial visit'
+    if code == BEHAVIOR_INITIAL_VISIT_1YR:
+        return f'Initial visit+Buy 1yr card(+{amount})'
+    if code == BEHAVIOR_INITIAL_VISIT_5YR:
+        return f'Initial visit+Buy 5yr card(+{amount})'
+    if code == BEHAVIOR_FOLLOW_UP:
+        return 'Follow-up'
+    if code == BEHAVIOR_TREATMENT:
+        return f'Treatment(+{amount})'
+    if code == BEHAVIOR_RENEW_1YR:
+        return f'Renew 1yr card(+{amount})'
+    if code == BEHAVIOR_RENEW_5YR:
+        return f'Renew 5yr card(+{amount})'
+    if code == BEHAVIOR_ORTHO_START:
+        return f'Ortho Start(+{amount:.2f}, rev:{amount * ORTHO_START_SHARE:.2f})'
+    return f'Ortho End(rev:+{amount:.2f})'
+
+
+class BehaviorMatrix:
+    """
+    稀疏的患者×日期行为矩阵
+
+    写入按模拟日期顺序只追加到紧凑的定长类型数组（array）中；同一患者同一天可以有多条行为，
+    渲染时按写入顺序用'+'连接。每条行为只保存编码和金额，行为描述只为渲染的单元格生成。
+    查询时按患者ID稳定排序建立CSR索引（indptr / 日期 / 行为编码 / 金额），
+    索引按已写入的条数缓存，有新数据后的第一次查询才重建。
+    """
+
+    def __init__(self):
+        """初始化空矩阵"""
+        self._size = 0                                        # 已写入完整的行为条数
+        self._patients = array('i')                           # 患者ID
+        self._days = array('i')                               # 模拟日期
+        self._codes = array('b')                              # 行为编码（金额为浮点数时带FLOAT_AMOUNT标记）
+        self._amounts = array('d')                            # 金额（BEHAVIOR_TEXT为文字描述的下标）
+        self._text_of = {}                                    # 文字描述 -> 下标
+        self.labels = []                                      # 下标 -> 文字描述（TEXT行为）
+        self._index = None                                    # 缓存的CSR索引
+
+    def add(self, patient_id, day, code, amount=0):
+        """
+        记录一条患者行为
+
+        参数：
+        - patient_id: 患者ID
+        - day: 模拟日期
+        - code: 行为编码（BEHAVIOR_INITIAL_VISIT、BEHAVIOR_TREATMENT等）
+        - amount: 金额（办卡、续卡、治疗、矫正费用，矫正结束为剩余营收）
+        """
+        self._patients.append(patient_id)
+        self._days.append(day)
+        self._codes.append(code | FLOAT_AMOUNT if isinstance(amount, float) else code)
+        self._amounts.append(amount)
+        self._size += 1  # 各列都写入后才计入条数，读取方不会读到写了一半的行为
+
+    def add_text(self, patient_id, day, label):
+        """
+        记录一条以文字描述给出的患者行为（描述驻留保存）
+
+        参数：
+        - patient_id: 患者ID
+        - day: 模拟日期
+        - label: 行为描述
+        """
+        text = self._text_of.get(label)
+        if text is None:
+            text = self._text_of[label] = len(self.labels)
+            self.labels.append(label)
+        self.add(patient_id, day, BEHAVIOR_TEXT, text)
+
+    def csr(self, count=None):
+        """
+        按患者建立的CSR索引
+
+        参数：
+        - count: 只索引前count条行为，None表示全部已写入的行为
+
+        返回：
+        - (患者ID数组, indptr, 日期数组, 行为编码数组, 金额数组)：
+          第i个有行为的患者的行为位于 [indptr[i], indptr[i+1])，按日期升序
+        """
+        count = self._size if count is None else min(count, self._size)
+        cached = self._index
+        if cached is not None and cached[0] == count:
+            return cached[1]
+
+        # 先复制前count条（切片得到新的array），再转为NumPy数组，不占用写入方仍在追加的数组的缓冲区
+        def column(values, dtype):
+            return np.frombuffer(values[:count], dtype=dtype)
+
+        patients = column(self._patients, np.intc)
+        order = np.argsort(patients, kind='stable')  # 稳定排序：同一患者的行为保持写入（日期）顺序
+        sorted_patients = patients[order]
+        row_ids = np.unique(sorted_patients)
+        indptr = np.append(np.searchsorted(sorted_patients, row_ids), count)
+        index = (row_ids, indptr, column(self._days, np.intc)[order], column(self._codes, np.int8)[order],
+                 column(self._amounts, np.float64)[order])
+        self._index = (count, index)
+        return index
+
+    def window(self, patient_offset=0, patient_limit=50, day_start=1, day_end=None, count=None):
+        """
+        渲染一个患者/日期窗口
+
+        参数：
+        - patient_offset: 从第几个有行为的患者开始（按患者ID排序）
+        - patient_limit: 最多返回的患者数
+        - day_start: 起始日期（含）
+        - day_end: 结束日期（含），None表示到最后一条行为的日期
+        - count: 只查询前count条行为（快照），None表示全部
+
+        返回：
+        - 字典：total_patients（有行为的患者总数）、total_entries（行为条数）、
+          patient_offset、day_start、day_end、
+          rows（[{'PatientID', 'Cells': [[日期, 行为描述], ...]}, ...]，只含窗口内有行为的日期）
+        """
+        row_ids, indptr, days, codes, amounts = self.csr(count)
+        if day_end is None:
+            day_end = int(days.max()) if len(days) else day_start
+
+        rows = []
+        for i in range(patient_offset, min(patient_offset + patient_limit, len(row_ids))):
+            start, stop = indptr[i], indptr[i + 1]
+            patient_days = days[start:stop]
+            lo = start + np.searchsorted(patient_days, day_start, side='left')
+            hi = start + np.searchsorted(patient_days, day_end, side='right')
+            cells = []
+            for day, label in zip(days[lo:hi].tolist(), self._labels(codes, amounts, lo, hi)):
+                if cells and cells[-1][0] == day:
+                    cells[-1][1] += '+' + label  # 同一天的多条行为合并
+                else:
+                    cells.append([day, label])
+            rows.append({'PatientID': f'P{int(row_ids[i]):03}', 'Cells': cells})
+
+        return {
+            'total_patients': len(row_ids),
+            'total_entries': int(indptr[-1]),
+            'patient_offset': patient_offset,
+            'day_start': day_start,
+            'day_end': day_end,
+            'rows': rows,
+        }
+
+    def _labels(self, codes, amounts, start, stop):
+        """渲染CSR索引中 [start, stop) 范围内行为的描述"""
+        labels = []
+        for code, amount in zip(codes[start:stop].tolist(), amounts[start:stop].tolist()):
+            if code == BEHAVIOR_TEXT:
+                labels.append(self.labels[int(amount)])
+            elif code & FLOAT_AMOUNT:
+                labels.append(_label(code & ~FLOAT_AMOUNT, amount))
+            else:
+                labels.append(_label(code, int(amount)))
+        return labels
+
+    def to_frame(self, count=None):
+        """
+        生成稠密的透视表（患者为行、'D001'格式的日期为列，空单元格为''）
+
+        会物化全部患者×日期单元格，只适合小规模数据或导出
+        """
+        row_ids, indptr, days, codes, amounts = self.csr(count)
+        cells = {}
+        for i, patient_id in enumerate(row_ids.tolist()):
+            start, stop = indptr[i], indptr[i + 1]
+            row = {}
+            for day, label in zip(days[start:stop].tolist(), self._labels(codes, amounts, start, stop)):
+                column = f'D{day:03}'
+                row[column] = row[column] + '+' + label if column in row else label
+            cells[f'P{patient_id:03}'] = row
+        if not cells:
+            return pd.DataFrame()
+        frame = pd.DataFrame.from_dict(cells, orient='index')
+        # 行列都按字符串排序，与 DataFrame.pivot 的结果一致
+        frame = frame.sort_index().reindex(columns=sorted(frame.columns)).fillna('')
+        frame.index.name = 'PatientID'
+        frame.columns.name = 'Day'
+        return frame
+
+    @property
+    def nbytes(self):
+        """占用的内存（字节，不含TEXT行为的描述字符串）"""
+        columns = (self._patients, self._days, self._codes, self._amounts)
+        return sum(values.itemsize * len(values) for values in columns)
+
+    def __len__(self):
+        return self._size
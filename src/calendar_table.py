@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预计算日历表
+
+按模拟天数排列的日期数组（第N天位于下标N-1），日期字符串、ISO周数、当月天数和是否月末
+等字段在第一次访问某一天时，按该天所在的块（BLOCK_DAYS天）一次向量化计算并缓存；
+模拟天数超出日历文件范围时按真实日历向后扩展，之后的查询都是按下标读取。
+
+日历文件优先读取二进制日期数组 data/calendar.npy（内存映射，只读取访问到的块），
+没有时读取 data/calendar.json，都没有时从 START_DATE 开始按真实日历推算
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+
+# 星期名称（周一为0）
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+# 模拟第1天的日期（与 generate_static_calendar.py 一致，没有日历文件时使用）
+START_DATE = '2026-01-01'
+
+# 日历字段按块计算的天数
+BLOCK_DAYS = 366
+
+
+def _date_fields(dates):
+    """
+    由日期数组计算日历字段
+
+    参数：
+    - dates: datetime64[D] 数组
+
+    返回：
+    - 字段名 -> 数组
+    """
+    months = dates.astype('datetime64[M]')
+    month_start = months.astype('datetime64[D]')
+    day = (dates - month_start).astype(np.int64) + 1
+    weekday = (dates.astype(np.int64) + 3) % 7  # 1970-01-01 是周四
+    # ISO周数：日期所在周的周四属于哪一年，就是那一年的第几周
+    thursday = dates + (3 - weekday)
+    week_num = (thursday - thursday.astype('datetime64[Y]').astype('datetime64[D]')).astype(np.int64) // 7 + 1
+    month_days = ((months + 1).astype('datetime64[D]') - month_start).astype(np.int64)
+    return {
+        'year': dates.astype('datetime64[Y]').astype(np.int64) + 1970,
+        'month': months.astype(np.int64) % 12 + 1,
+        'day': day,
+        'weekday': weekday,
+        'week_num': week_num,
+        'month_days': month_days,
+        'is_month_end': day == month_days,
+    }
+
+
+class CalendarTable:
+    """
+    按模拟天数索引的日历表
+
+    - date: datetime64[D] 日期数组（从calendar.npy加载时为内存映射数组）
+
+    get(day) 返回与原日历条目相同格式的字典（另含 date_str、month_days、is_month_end）；
+    第一次访问某一天时计算它所在块的全部字典并缓存，之后直接按下标读取
+    """
+
+    def __init__(self, dates):
+        """
+        由日期数组创建日历表（不读取日期，字段在访问时按块计算）
+
+        参数：
+        - dates: 按模拟天数排列的 datetime64[D] 数组（可以是内存映射数组）
+        """
+        self._lock = threading.Lock()
+        self.date = dates
+        self._rows = [None] * len(dates)
+
+    def ensure(self, days):
+        """
+        保证日历表覆盖前days天，不足时按真实日历向后扩展
+
+        参数：
+        - days: 需要覆盖的模拟天数
+        """
+        if days <= len(self):
+            return
+        with self._lock:
+            size = len(self)
+            if days <= size:
+                return
+            # 至少扩展一年，避免逐天扩展；扩展后日期数组在内存中（每天8字节）
+            extra = max(days - size, 366)
+            dates = self.date[-1] + np.arange(1, extra + 1)
+            # 先扩展缓存，最后替换date（长度以date为准），读取方不会越界
+            self._rows = self._rows + [None] * extra
+            self.date = np.concatenate([self.date, dates])
+
+    def _fill(self, index, rows):
+        """计算index所在块每一天的日历字典，写入rows"""
+        start = index - index % BLOCK_DAYS
+        dates = np.asarray(self.date[start:start + BLOCK_DAYS])
+        fields = {name: values.tolist() for name, values in _date_fields(dates).items()}
+        date_str = np.datetime_as_string(dates, unit='D').tolist()
+        for offset in range(len(dates)):
+            year, month, day = fields['year'][offset], fields['month'][offset], fields['day'][offset]
+            weekday = fields['weekday'][offset]
+            rows[start + offset] = {
+                'simulation_day': start + offset + 1,
+                'date': datetime(year, month, day),
+                'date_str': date_str[offset],
+                'year': year,
+                'month': month,
+                'day': day,
+                'weekday': weekday,
+                'weekday_name': WEEKDAY_NAMES[weekday],
+                'week_num': fields['week_num'][offset],
+                'month_days': fields['month_days'][offset],
+                'is_month_end': fields['is_month_end'][offset],
+            }
+
+    def get(self, simulation_day):
+        """
+        获取某一模拟天的日历信息
+
+        参数：
+        - simulation_day: 模拟天数（从1开始）
+        """
+        if simulation_day > len(self):
+            self.ensure(simulation_day)
+        index = simulation_day - 1
+        rows = self._rows
+        row = rows[index]
+        if row is None:
+            self._fill(index, rows)
+            row = rows[index]
+        return row
+
+    def __len__(self):
+        return len(self.date)
+
+
+def load_calendar(data_dir):
+    """
+    加载日历表
+
+    参数：
+    - data_dir: 日历文件所在目录（calendar.npy / calendar.json）
+    """
+    binary_file = os.path.join(data_dir, 'calendar.npy')
+    if os.path.exists(binary_file):
+        return CalendarTable(np.load(binary_file, mmap_mode='r'))
+
+    json_file = os.path.join(data_dir, 'calendar.json')
+    if os.path.exists(json_file):
+        with open(json_file, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        return CalendarTable(np.array([entry['date'] for entry in entries], dtype='datetime64[D]'))
+
+    # 没有日历文件：从第1天开始按真实日历推算
+    return CalendarTable(np.datetime64(START_DATE, 'D') + np.arange(1))
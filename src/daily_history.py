@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式日统计数据
+
+每个日指标对应一个按模拟总天数预分配的NumPy数组，第N天位于下标N-1。
+写入时把当天的指标直接写进各列（start_day / commit_day），不为每天构造字典；
+读取接口仍可按行返回字典列表，并支持零拷贝导出为pandas DataFrame / Arrow表
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# 日指标列及类型：计数类为整数，金额类为浮点数，文本类为对象数组
+COLUMNS = {
+    'Day': np.int64,                       # 模拟天数
+    'Date': object,                        # 真实日期
+    'Week': np.int64,                      # 周数
+    'Month': np.int64,                     # 月份
+    'Year': np.int64,                      # 年份
+    'Weekday': object,                     # 星期几
+    'NewCustomers': np.int64,              # 当日新客户数
+    'PatientsSeen': np.int64,              # 今日就诊人次
+    'RevenueTotal': np.float64,            # 今日总营收
+    'Costs': np.float64,                   # 今日总成本
+    'Profit': np.float64,                  # 今日利润
+    'CashFlowToday': np.float64,           # 今日现金流
+    'Cash': np.float64,                    # 当前现金余额
+    'TotalCustomers': np.int64,            # 累计总客户数
+    'TotalMembers': np.int64,              # 累计会员数
+    'RevenueCard': np.float64,             # 卡类营收
+    'RevenueTreatment': np.float64,        # 治疗营收
+    'RevenueOrtho': np.float64,            # 矫正营收
+    'RevenueCardImmediate': np.float64,    # 卡类营收中办卡当日确认的部分
+    'RevenueCardAmortized': np.float64,    # 卡类营收中分摊确认的部分
+    'ProfitCard': np.float64,              # 卡类利润
+    'ProfitTreatment': np.float64,         # 治疗利润
+    'ProfitOrtho': np.float64,             # 矫正利润
+    'CashFlowCard': np.float64,            # 卡类现金流
+    'CashFlowTreatment': np.float64,       # 治疗现金流
+    'CashFlowOrtho': np.float64,           # 矫正现金流
+    'CashNewCard': np.float64,             # 新办卡现金流
+    'CashRenewCard': np.float64,           # 续卡现金流
+    'CashTreatment': np.float64,           # 治疗现金流
+    'CashOrtho': np.float64,               # 矫正现金流
+    'DoctorSalary': np.float64,            # 今日医生工资
+    'NurseSalary': np.float64,             # 今日护士工资
+    'OpsSalary': np.float64,               # 今日运营工资
+    'Card1YrTotal': np.float64,            # 累计1年卡销售额
+    'Card5YrTotal': np.float64,            # 累计5年卡销售额
+    'MonthlyCardRevenue': np.float64,      # 本月卡类分摊营收
+    'CardContractLiability': np.float64,   # 会员卡合同负债
+    'OrthoContractLiability': np.float64,  # 矫正合同负债
+    'ClinicType': object,                  # 诊所类型
+    'Source': object,                      # 数据来源
+    'CurrentPediatricDoctors': np.int64,   # 当前儿牙医生数
+    'CurrentOrthoDoctors': np.int64,       # 当前矫正医生数
+    'CurrentNurses': np.int64,             # 当前护士数
+    'CurrentOps': np.int64,                # 当前运营数
+}
+
+
+class DailyHistory:
+    """
+    列式存储的日统计数据
+
+    只追加：已写入的天不会再修改，因此按行数截取即可得到一致的只读视图。
+    兼容原来的列表用法：len()、下标/切片（返回字典）、迭代。
+    """
+
+    def __init__(self, capacity=0):
+        """
+        初始化空的日统计数据
+
+        参数：
+        - capacity: 预分配的天数（模拟总天数），写满后按倍数扩容
+        """
+        self._size = 0
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+    def start_day(self):
+        """
+        开始写入新的一天（写满时先扩容）
+
+        调用方把当天的指标直接写进返回的列数组的同一下标，全部列写完后调用commit_day()；
+        提交之前已写入的行数不变，读取方看不到写了一半的天
+
+        返回：
+        - (下标, 列名 -> 列数组)
+        """
+        index = self._size
+        if index == len(self._columns['Day']):
+            self._grow()
+        return index, self._columns
+
+    def commit_day(self):
+        """提交start_day()开始写入的一天"""
+        self._size += 1
+
+    def _grow(self):
+        """扩容全部列"""
+        capacity = max(2 * len(self._columns['Day']), 64)
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def column(self, name, stop=None):
+        """
+        获取一列的只读视图（不复制）
+
+        参数：
+        - name: 列名
+        - stop: 只取前stop天，None表示全部已写入的天
+        """
+        view = self._columns[name][:self._size if stop is None else min(stop, self._size)]
+        view.flags.writeable = False
+        return view
+
+    def values(self, names, index):
+        """
+        读取某一天若干列的取值（Python原生类型）
+
+        参数：
+        - names: 列名序列
+        - index: 下标
+        """
+        columns = self._columns
+        return [columns[name].item(index) for name in names]
+
+    def rows(self, start=0, stop=None):
+        """
+        按行返回字典列表（取值为Python原生类型，可直接序列化为JSON）
+
+        参数：
+        - start: 起始下标
+        - stop: 结束下标（不含），None表示全部已写入的天
+        """
+        stop = self._size if stop is None else min(stop, self._size)
+        if start >= stop:
+            return []
+        names = list(COLUMNS)
+        values = [self._columns[name][start:stop].tolist() for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def to_pandas(self, stop=None):
+        """
+        导出为pandas DataFrame，数值列与存储共享内存（零拷贝）
+
+        参数：
+        - stop: 只导出前stop天，None表示全部已写入的天
+        """
+        return pd.DataFrame({name: self.column(name, stop) for name in COLUMNS}, copy=False)
+
+    def to_arrow(self, stop=None):
+        """
+        导出为Arrow表，数值列零拷贝（需要安装pyarrow）
+
+        参数：
+        - stop: 只导出前stop天，None表示全部已写入的天
+        """
+        import pyarrow as pa
+        return pa.table({name: pa.array(self.column(name, stop)) for name in COLUMNS})
+
+    @property
+    def nbytes(self):
+        """全部列占用的内存（字节，文本列只计指针）"""
+        return sum(column.nbytes for column in self._columns.values())
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._size)
+            return self.rows(start, stop) if step == 1 else self.rows()[index]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('daily history index out of range')
+        return self.rows(index, index + 1)[0]
+
+    def __iter__(self):
+        return iter(self.rows())
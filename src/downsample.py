@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图表序列降采样
+
+长周期的日数据（10年约3650个点）按图表像素宽度降采样，只保留能体现曲线形状的点：
+- lttb: Largest-Triangle-Three-Buckets，每个桶选与前一选中点、下一桶均值构成三角形面积最大的点
+- minmax: 每个桶保留最小值和最大值所在的点，峰谷不会被抹平
+
+两种方法都返回选中点的下标（升序，含首尾两点），点数不超过目标点数
+"""
+
+import numpy as np
+
+
+# 支持的降采样方法
+METHODS = ('lttb', 'minmax')
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样
+
+    参数：
+    - x / y: 横轴 / 纵轴数组（等长，x升序）
+    - threshold: 目标点数
+
+    返回：
+    - 选中点的下标数组
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 首尾两点单独保留，中间 n-2 个点分成 threshold-2 个桶；第i个桶为 [edges[i], edges[i+1])
+    every = (n - 2) / (threshold - 2)
+    edges = np.minimum((np.arange(threshold) * every).astype(np.int64) + 1, n)
+    edges[-1] = n
+    # 各桶的均值（最后一个桶之后是最后一个点）
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x, edges[:-1]) / counts
+    avg_y = np.add.reduceat(y, edges[:-1]) / counts
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x, next_y = avg_x[i + 1], avg_y[i + 1]
+        ax, ay = x[a], y[a]
+        # 三角形面积的两倍（只比较大小，不需要除以2）
+        area = np.abs((ax - next_x) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y - ay))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, threshold):
+    """
+    最小/最大值桶降采样
+
+    参数：
+    - y: 纵轴数组
+    - threshold: 目标点数
+
+    返回：
+    - 选中点的下标数组
+    """
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    buckets = (threshold - 2) // 2
+    if buckets < 1:
+        return np.array([0, n - 1])
+
+    y = np.asarray(y)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    picked = [0, n - 1]
+    for start, end in zip(edges[:-1].tolist(), edges[1:].tolist()):
+        segment = y[start:end]
+        picked.append(start + int(segment.argmin()))
+        picked.append(start + int(segment.argmax()))
+    return np.unique(picked)
+
+
+def downsample(x, y, threshold, method='lttb'):
+    """
+    按指定方法降采样
+
+    参数：
+    - x / y: 横轴 / 纵轴数组
+    - threshold: 目标点数（图表像素宽度）
+    - method: 'lttb' 或 'minmax'
+
+    返回：
+    - (x列表, y列表)，取值为Python原生类型，可直接序列化为JSON
+    """
+    if method == 'lttb':
+        index = lttb(x, y, threshold)
+    elif method == 'minmax':
+        index = minmax(y, threshold)
+    else:
+        raise ValueError(f'未知的降采样方法：{method}')
+    return np.asarray(x)[index].tolist(), np.asarray(y)[index].tolist()
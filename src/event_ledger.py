@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+患者事件账本
+
+按日期分区的只追加事件存储，写入时同步累计当日汇总数据，
+每日结算、按患者来源的周/月汇总、按条件查询事件和单个患者的时间线/累计价值都无需回扫全部历史记录。
+
+事件以紧凑的 PatientEvent 元组保存（行为类型为整数编码，金额保持原始数值），
+日期字符串、星期、月份按天只保存一份；收入类型和中文描述等展示字段
+只在读取时为实际返回的事件生成
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+
+# 行为类型编码
+FIRST_VISIT, FOLLOW_UP, TREATMENT, RENEWAL, ORTHO_START, ORTHO_END = range(6)
+
+# 编码 -> 行为类型名称
+ACTIONS = ('初诊', '复诊', '治疗', '续卡', '矫正开始', '矫正结束')
+
+# 行为类型名称 -> 编码
+ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+
+# 矫正开始时确认的营收比例（其余在矫正完成时确认）
+ORTHO_START_SHARE = 0.55
+
+# 一条患者事件
+# - action: 行为类型编码
+# - patient_id / day / age: 患者ID、模拟天数、当时年龄
+# - card_type: 会员卡类型（'1年卡' / '5年卡'，没有卡为None）
+# - source: 患者来源（矫正结束事件不记录来源，为None）
+# - amount / cash_flow / costs / profit: 金额、现金流、成本、利润
+PatientEvent = namedtuple('PatientEvent', 'action patient_id day age card_type source amount cash_flow costs profit')
+
+
+# 患者来源（"native"=原生，"existing"=初始配置的现有会员）
+SOURCES = ('native', 'existing')
+
+# 患者累计价值指标（与事件位置一一对应的累计值元组中的顺序）
+# - CashFlow: 现金流入
+# - Revenue: 确认的营收（利润+成本）
+# - Costs: 耗材成本
+# - Visits: 到店次数（有事件的天数）
+# - Renewals: 续卡次数
+# - OrthoRevenue: 确认的矫正营收
+LTV_FIELDS = ('CashFlow', 'Revenue', 'Costs', 'Visits', 'Renewals', 'OrthoRevenue')
+
+
+def _revenue_type(event):
+    """事件的收入类型"""
+    action = event.action
+    if action == FIRST_VISIT:
+        return '卡类收入' if event.amount > 0 else '初诊'
+    if action == FOLLOW_UP:
+        return '复诊'
+    if action == TREATMENT:
+        return '治疗收入'
+    if action == RENEWAL:
+        return '卡类收入'
+    return '矫正收入'
+
+
+def _description(event):
+    """事件的中文描述"""
+    action = event.action
+    if action == FIRST_VISIT:
+        return f'患者初诊，{f"购买{event.card_type}，" if event.card_type else ""}金额{event.amount}元'
+    if action == FOLLOW_UP:
+        return '患者复诊'
+    if action == TREATMENT:
+        return f'患者接受基础治疗，收入{event.amount}元，耗材成本{event.costs:.2f}元，利润{event.profit:.2f}元'
+    if action == RENEWAL:
+        return f'患者续{event.card_type}，金额{event.amount}元'
+    if action == ORTHO_START:
+        return (f'患者开始矫正，现金流{event.amount:.2f}元（总费用{event.amount}元），'
+                f'记入营收{event.amount * ORTHO_START_SHARE:.2f}元（55%），'
+                f'耗材成本{event.costs:.2f}元，利润{event.profit:.2f}元')
+    return f'患者矫正完成，记入剩余营收{event.profit:.2f}元（45%），无额外耗材费用'
+
+
+def to_record(event, day_info):
+    """
+    把事件元组展开为事件字典（API和导出使用的格式）
+
+    参数：
+    - event: PatientEvent
+    - day_info: 当天的 (日期字符串, 星期名称, 月份)
+    """
+    date_str, weekday_name, month = day_info
+    day = event.day
+    record = {
+        'PatientID': event.patient_id,  # 患者ID
+        'Day': day,  # 模拟天数
+        'Date': date_str,  # 实际日期
+        'Week': (day - 1) // 7 + 1,  # 周数
+        'Weekday': weekday_name,  # 星期几
+        'Age': event.age,  # 年龄
+        'Action': ACTIONS[event.action],  # 行为类型
+        'CardType': event.card_type,  # 卡类型
+        'Amount': event.amount,  # 金额
+        'RevenueType': _revenue_type(event),  # 收入类型
+        'CashFlow': event.cash_flow,  # 现金流
+        'Costs': event.costs,  # 成本
+        'Profit': event.profit,  # 利润
+        'Description': _description(event),  # 描述
+    }
+    if event.source is not None:
+        record['Source'] = event.source  # 患者来源
+    record['Month'] = month  # 月份
+    return record
+
+
+def _add_totals(target, by_source):
+    """把 {来源: [现金流, 成本, 利润, 事件数]} 累加到target中"""
+    for source, totals in by_source.items():
+        current = target.get(source)
+        if current is None:
+            current = target[source] = [0, 0, 0, 0]
+        for j in range(4):
+            current[j] += totals[j]
+
+
+class EventLedger:
+    """
+    按日期分区的只追加事件账本
+
+    事件（PatientEvent）按写入顺序保存在一个列表中，同时记录每一天在列表中的起止位置和日期信息；
+    每条事件写入时把成本按行为类型累加到当日汇总中，
+    并把现金流、成本、利润按患者来源累加到当日的来源汇总中；
+    每天写完后再把当日的来源汇总累加到所在周、月的累计汇总中。
+    模拟日期单调递增，因此同一天的事件在列表中总是连续的。
+
+    写入时同时维护按患者ID、行为类型、患者来源的索引（事件位置列表，升序），
+    query() 只遍历最小的一个候选索引在日期/游标范围内的部分，不扫描全部历史。
+    所有读取接口都返回事件字典，只为返回的事件生成展示字段。
+
+    每条事件还记录该患者截至这条事件的累计价值（LTV_FIELDS），
+    某一快照时患者的累计值就是其事件位置列表中最后一个早于快照条数的位置上的累计值。
+    """
+
+    def __init__(self):
+        """初始化空账本"""
+        self._events = []       # 全部事件（PatientEvent），按写入顺序排列
+        self._day_ranges = {}   # 日期 -> [起始位置, 结束位置)
+        self._day_info = {}     # 日期 -> (日期字符串, 星期名称, 月份)
+        self._days = []         # 有事件的日期（升序），用于按日期范围定位
+        self._by_patient = {}   # 患者ID -> [事件位置]
+        self._by_action = {}    # 行为类型编码 -> [事件位置]
+        self._by_source = {}    # 患者来源 -> [事件位置]
+        self._patient_totals = []  # 事件位置 -> 该患者截至这条事件的累计值（LTV_FIELDS顺序）
+        self._patient_sources = {}  # 患者ID -> 患者来源
+        self._ltv_cache = {}    # (排序指标, 是否降序) -> (事件条数, 有事件的患者数, 排在最前的若干价值行)
+        self._day_costs = {}    # 日期 -> {行为类型编码: 累计成本}
+        self._source_days = []  # [(日期, 月份, {来源: [现金流, 成本, 利润, 事件数]})]，按日期排列（只追加）
+        self._source_day_numbers = []  # _source_days 各行的日期，用于按截止日定位
+        # 粒度 -> [[周期, 在_source_days中的起始位置, {来源: [现金流, 成本, 利润, 事件数]}]]，按时间排列（只追加）。
+        # 月按自然月分行（不同年份的同一月份各占一行），汇总值是该月份截至这一行结束时的累计值（含往年同月）；
+        # 只有已写完的日期会累加进来，最后一行在下一个周期开始前仍会变化
+        self._source_periods = {'week': [], 'month': []}
+
+    def append(self, event, date_info):
+        """
+        追加一条事件
+
+        参数：
+        - event: PatientEvent；带来源的事件还会按来源累计现金流、成本、利润
+        - date_info: 事件当天的日历信息（get_date_info的结果），每天只保存第一次传入的
+        """
+        day = event.day
+        index = len(self._events)
+        if day not in self._day_ranges:
+            self._day_info[day] = (date_info['date_str'], date_info['weekday_name'], date_info['month'])
+        self._events.append(event)
+
+        day_range = self._day_ranges.get(day)
+        if day_range is None:
+            self._day_ranges[day] = [index, index + 1]
+            self._days.append(day)
+        else:
+            day_range[1] = index + 1
+
+        # 累计值先写入，再登记事件位置，读取方按位置取到的累计值总是完整的
+        action = event.action
+        positions = self._by_patient.setdefault(event.patient_id, [])
+        if positions:
+            last = positions[-1]
+            cash_flow, revenue, costs, visits, renewals, ortho_revenue = self._patient_totals[last]
+            new_visit = self._events[last].day != day
+        else:
+            cash_flow = revenue = costs = visits = renewals = ortho_revenue = 0
+            new_visit = True
+        recognized = event.profit + event.costs
+        self._patient_totals.append((
+            cash_flow + event.cash_flow,
+            revenue + recognized,
+            costs + event.costs,
+            visits + new_visit,
+            renewals + (action == RENEWAL),
+            ortho_revenue + (recognized if action in (ORTHO_START, ORTHO_END) else 0),
+        ))
+        positions.append(index)
+        self._by_action.setdefault(action, []).append(index)
+
+        costs = self._day_costs.setdefault(day, {})
+        costs[action] = costs.get(action, 0) + event.costs
+
+        source = event.source
+        if source is not None:
+            self._by_source.setdefault(source, []).append(index)
+            self._patient_sources.setdefault(event.patient_id, source)
+            source_days = self._source_days
+            if not source_days or source_days[-1][0] != day:
+                self._start_source_day(day)
+            by_source = source_days[-1][2]
+            totals = by_source.get(source)
+            if totals is None:
+                totals = by_source[source] = [0, 0, 0, 0]
+            totals[0] += event.cash_flow
+            totals[1] += event.costs
+            totals[2] += event.profit
+            totals[3] += 1
+
+    def _start_source_day(self, day):
+        """
+        开始新一天的来源汇总：前一天已写完，先累加到所在周、月；
+        新的一天属于新的周/月时追加一行，汇总值从该周期往年的累计值开始
+        """
+        source_days = self._source_days
+        month = self._day_info[day][2]
+        for granularity, key in (('week', (day - 1) // 7 + 1), ('month', month)):
+            periods = self._source_periods[granularity]
+            if source_days:
+                _add_totals(periods[-1][2], source_days[-1][2])
+            if not periods or periods[-1][0] != key:
+                previous = next((row[2] for row in reversed(periods) if row[0] == key), {})
+                # 先追加行再追加日汇总，读取方看到新行时上一个周期已经完整
+                periods.append([key, len(source_days), {source: list(totals) for source, totals in previous.items()}])
+        source_days.append((day, month, {}))
+        self._source_day_numbers.append(day)
+
+    def _records(self, events):
+        """把一组事件展开为事件字典"""
+        day_info = self._day_info
+        return [to_record(event, day_info[event.day]) for event in events]
+
+    def records(self, stop=None):
+        """
+        前stop条事件的事件字典
+
+        参数：
+        - stop: 只展开前stop条事件（快照），None表示全部
+        """
+        return self._records(self._events[:stop])
+
+    def events_for_day(self, day):
+        """获取某一天的全部事件"""
+        day_range = self._day_ranges.get(day)
+        if day_range is None:
+            return []
+        return self._records(self._events[day_range[0]:day_range[1]])
+
+    def events_between(self, after_day, until_day):
+        """
+        获取某一天之后（不含）到另一天为止（含）的全部事件
+
+        参数：
+        - after_day: 起始日期（不含）
+        - until_day: 结束日期（含）
+        """
+        start = end = None
+        for d in range(after_day + 1, until_day + 1):
+            day_range = self._day_ranges.get(d)
+            if day_range is not None:
+                if start is None:
+                    start = day_range[0]
+                end = day_range[1]
+        if start is None:
+            return []
+        return self._records(self._events[start:end])
+
+    def _position(self, day):
+        """第一条日期不早于day的事件位置（没有时为事件总数）"""
+        days = self._days
+        i = bisect_left(days, day)
+        if i == len(days):
+            return len(self._events)
+        return self._day_ranges[days[i]][0]
+
+    def query(self, patient_id=None, action=None, source=None, day_start=None, day_end=None,
+              start=0, limit=100, count=None):
+        """
+        按条件分页查询事件
+
+        参数：
+        - patient_id / action / source: 患者ID、行为类型名称（如'治疗'）、患者来源，None表示不限
+        - day_start / day_end: 日期范围（含两端），None表示不限
+        - start: 从第几条事件（账本中的位置）开始查询，即上一页返回的next_start
+        - limit: 最多返回的事件数
+        - count: 只查询前count条事件（快照），None表示全部
+
+        返回：
+        - (事件列表, next_start)：next_start为下一页的起始位置，没有更多事件时为None
+        """
+        count = len(self._events) if count is None else min(count, len(self._events))
+        if action is not None:
+            action = ACTION_CODES.get(action, -1)
+        lo = start if day_start is None else max(start, self._position(day_start))
+        hi = count if day_end is None else min(count, self._position(day_end + 1))
+        if lo >= hi:
+            return [], None
+
+        # 各个条件对应的索引里，取落在 [lo, hi) 内的部分最短的一个遍历，其余条件逐条检查
+        filters = []
+        positions, first, last = None, lo, hi   # 不按索引时直接遍历账本位置 [lo, hi)
+        for field, value, index in (('patient_id', patient_id, self._by_patient),
+                                    ('action', action, self._by_action),
+                                    ('source', source, self._by_source)):
+            if value is None:
+                continue
+            filters.append((field, value))
+            candidates = index.get(value)
+            if not candidates:
+                return [], None
+            begin, end = bisect_left(candidates, lo), bisect_left(candidates, hi)
+            if positions is None or end - begin < last - first:
+                positions, first, last = candidates, begin, end
+
+        events = self._events
+        rows = []
+        for k in range(first, last):
+            position = k if positions is None else positions[k]
+            event = events[position]
+            if all(getattr(event, field) == value for field, value in filters):
+                rows.append(event)
+                if len(rows) == limit:
+                    return self._records(rows), position + 1
+        return self._records(rows), None
+
+    def patient(self, patient_id, count=None):
+        """
+        单个患者的时间线和累计价值
+
+        参数：
+        - patient_id: 患者ID
+        - count: 只包含前count条事件（快照），None表示全部
+
+        返回：
+        - {'PatientID', 'Source', 'FirstDay', 'LastDay', LTV_FIELDS..., 'Events': [事件, ...]}，
+          患者在范围内没有事件时返回None
+        """
+        positions = self._by_patient.get(patient_id)
+        if not positions:
+            return None
+        count = len(self._events) if count is None else count
+        end = bisect_left(positions, count)
+        if end == 0:
+            return None
+        events = self._events
+        timeline = self._records([events[position] for position in positions[:end]])
+        row = self._ltv_row(patient_id, positions, end)
+        row['Events'] = timeline
+        return row
+
+    def _ltv_row(self, patient_id, positions, end):
+        """患者截至其第end条事件（不含）的累计价值行"""
+        row = {
+            'PatientID': patient_id,
+            'Source': self._patient_sources.get(patient_id),
+            'FirstDay': self._events[positions[0]].day,
+            'LastDay': self._events[positions[end - 1]].day,
+        }
+        row.update(zip(LTV_FIELDS, self._patient_totals[positions[end - 1]]))
+        return row
+
+    def ltv_table(self, sort='Revenue', descending=True, offset=0, limit=50, count=None):
+        """
+        按累计价值排序的患者价值表（分页）
+
+        只选出排在前offset+limit位的患者（heapq，O(P log k)），不对全部患者排序；
+        同一快照（事件条数）、排序指标和方向的结果会缓存，向前翻页直接切片
+
+        参数：
+        - sort: 排序指标（LTV_FIELDS之一）
+        - descending: 是否降序（同值按患者ID升序）
+        - offset / limit: 分页
+        - count: 只统计前count条事件（快照），None表示全部
+
+        返回：
+        - (有事件的患者总数, 价值行列表)
+        """
+        count = len(self._events) if count is None else count
+        top = offset + limit
+        cached = self._ltv_cache.get((sort, descending))
+        if cached is None or cached[0] != count or len(cached[2]) < min(top, cached[1]):
+            field = LTV_FIELDS.index(sort)
+            totals = self._patient_totals
+            candidates = []
+            for patient_id, positions in list(self._by_patient.items()):
+                end = len(positions)
+                if positions[-1] >= count:
+                    end = bisect_left(positions, count)
+                    if not end:
+                        continue
+                value = totals[positions[end - 1]][field]
+                candidates.append((-value if descending else value, patient_id, positions, end))
+            best = heapq.nsmallest(top, candidates, key=lambda item: (item[0], item[1]))
+            rows = [self._ltv_row(patient_id, positions, end) for _, patient_id, positions, end in best]
+            cached = self._ltv_cache[(sort, descending)] = (count, len(candidates), rows)
+        return cached[1], cached[2][offset:top]
+
+    def day_cost(self, day, action):
+        """
+        获取某一天某类行为的累计成本
+
+        参数：
+        - day: 模拟日期
+        - action: 行为类型编码（如TREATMENT、ORTHO_START）
+        """
+        return self._day_costs.get(day, {}).get(action, 0)
+
+    def source_totals(self, until_day, granularity='week'):
+        """
+        按周/月汇总各来源患者的现金流和营收
+
+        参数：
+        - until_day: 只汇总到这一天（含），之后的日期可能还在写入
+        - granularity: 'week'（按模拟周，第1-7天为第1周）或 'month'（按事件的月份字段）
+
+        返回：
+        - 按周期排序的列表 [{'Week'/'Month': 周期, 来源: {'CashFlow', 'Revenue', 'Costs', 'Profit', 'Events'}}, ...]，
+          每行都包含 SOURCES 中的全部来源；营收为事件确认的营收（利润+成本）
+        """
+        key_name = 'Week' if granularity == 'week' else 'Month'
+        stop = bisect_right(self._source_day_numbers, until_day)  # 截止日之前（含）的来源日汇总条数
+        running = self._source_periods['week' if granularity == 'week' else 'month']
+        count = len(running)
+        cumulative = {}  # 周期 -> 截至截止日的累计汇总
+        for i in range(count):
+            key, start, by_source = running[i]
+            if start >= stop:
+                break
+            if i + 1 < count and running[i + 1][1] <= stop:
+                cumulative[key] = by_source  # 周期已完整，直接使用累计值
+                continue
+            # 截止日落在这个周期内（或周期仍在写入）：从往年同一周期的累计值开始，逐日累加到截止日
+            by_source = {source: list(totals) for source, totals in cumulative.get(key, {}).items()}
+            for day_index in range(start, stop):
+                _add_totals(by_source, self._source_days[day_index][2])
+            cumulative[key] = by_source
+
+        periods = {}
+        for key, by_source in cumulative.items():
+            period = periods[key] = {source: [0, 0, 0, 0] for source in SOURCES}
+            _add_totals(period, by_source)
+
+        rows = []
+        for key in sorted(periods):
+            row = {key_name: key}
+            for source, (cash_flow, costs, profit, events) in periods[key].items():
+                row[source] = {
+                    'CashFlow': cash_flow,
+                    'Revenue': profit + costs,
+                    'Costs': costs,
+                    'Profit': profit,
+                    'Events': events,
+                }
+            rows.append(row)
+        return rows
+
+    def __len__(self):
+        return len(self._events)
+
+    def __iter__(self):
+        return iter(self.records())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._records(self._events[index])
+        event = self._events[index]
+        return to_record(event, self._day_info[event.day])
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模拟事件推送
+
+模拟管理器每产生一天/一周/一月的统计数据就发布一条事件，
+每个订阅者（SSE连接）持有一个有界缓冲区，慢速客户端只会丢弃最旧的事件，
+不会让服务器内存无限增长
+"""
+
+import json
+import threading
+from collections import deque
+
+
+# 每个订阅者缓冲区默认容量（条）
+DEFAULT_BUFFER_SIZE = 256
+
+
+class Subscription:
+    """
+    单个订阅者的有界事件缓冲区
+
+    缓冲区满时丢弃最旧的事件并计数，客户端收到丢弃数后应通过增量查询接口重新同步
+    """
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        初始化订阅
+
+        参数：
+        - buffer_size: 缓冲区容量（条）
+        """
+        self._buffer = deque()
+        self._buffer_size = buffer_size
+        self._condition = threading.Condition()
+        self._dropped = 0       # 自上次读取以来丢弃的事件数
+        self.closed = False
+
+    def push(self, event):
+        """写入一条事件，缓冲区满时丢弃最旧的一条"""
+        with self._condition:
+            if len(self._buffer) >= self._buffer_size:
+                self._buffer.popleft()
+                self._dropped += 1
+            self._buffer.append(event)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """
+        取出缓冲区中的全部事件，缓冲区为空时最多等待timeout秒
+
+        返回：
+        - (事件列表, 丢弃的事件数)
+        """
+        with self._condition:
+            if not self._buffer and not self.closed:
+                self._condition.wait(timeout)
+            events = list(self._buffer)
+            self._buffer.clear()
+            dropped, self._dropped = self._dropped, 0
+        return events, dropped
+
+    def close(self):
+        """关闭订阅，唤醒正在等待的读取方"""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class EventBroadcaster:
+    """
+    事件广播器：把发布的事件写入每个订阅者的缓冲区
+
+    事件为 (事件名, 事件ID, 数据) 三元组；没有订阅者时发布方可以跳过构造事件数据
+    """
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        初始化广播器
+
+        参数：
+        - buffer_size: 每个订阅者的缓冲区容量（条）
+        """
+        self.buffer_size = buffer_size
+        self._subscriptions = []
+        self._lock = threading.Lock()
+
+    @property
+    def has_subscribers(self):
+        """是否有订阅者"""
+        return bool(self._subscriptions)
+
+    def subscribe(self):
+        """新建订阅"""
+        subscription = Subscription(self.buffer_size)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """取消订阅"""
+        subscription.close()
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+
+    def publish(self, event, data, event_id=None):
+        """
+        发布事件
+
+        参数：
+        - event: 事件名（如'week'、'month'）
+        - data: 可序列化为JSON的事件数据
+        - event_id: 事件ID（数据版本）
+        """
+        # 订阅列表只整体替换，遍历时不需要加锁
+        for subscription in self._subscriptions:
+            subscription.push((event, event_id, data))
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+
+def format_sse(event, data, event_id=None):
+    """
+    按Server-Sent Events格式编码一条事件
+
+    参数：
+    - event: 事件名
+    - data: 事件数据，编码为单行JSON
+    - event_id: 事件ID
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False, default=str)}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会员计数器
+
+实时维护总客户数、会员数和各类有效卡持卡人数，
+避免每天遍历全部患者统计会员数
+"""
+
+
+class MemberCounters:
+    """
+    增量维护的会员/客户计数器
+
+    计数口径：
+    - customers: 累计总客户数（所有登记过的患者）
+    - members: 会员数（活跃且买过会员卡的患者，与TotalMembers口径一致）
+    - holders: 各卡类型的有效持卡人数（活跃且会员卡未到期）
+
+    患者的 card_type / card_expiry_day / is_active 变化时由 Patient 调用 refresh()，
+    会员卡到期由 advance() 按到期日分桶处理，每次更新都是O(1)。
+    """
+
+    def __init__(self):
+        """初始化计数器"""
+        self.day = 0                             # 当前模拟日期
+        self.customers = 0                       # 累计总客户数
+        self.members = 0                         # 会员数
+        self.holders = {'1yr': 0, '5yr': 0}      # 各卡类型有效持卡人数
+        self._counted = {}                       # 患者ID -> (是否会员, 有效卡类型, 已登记的到期日)
+        self._expiry_buckets = {}                # 到期日 -> 当天到期的患者列表
+        self._expired_today = []                 # 当天到期的患者（pop_expiring()取出）
+
+    def add(self, patient):
+        """登记新患者，计入总客户数"""
+        self.customers += 1
+        self._counted[patient.id] = (False, None, None)
+        self.refresh(patient)
+
+    def refresh(self, patient):
+        """
+        根据患者当前状态更新计数
+
+        参数：
+        - patient: 状态发生变化的患者
+        """
+        old = self._counted.get(patient.id)
+        if old is None:
+            return  # 尚未登记（初始化过程中）
+
+        is_member = patient.is_active and patient.card_type is not None
+        holder_type = None
+        registered = old[2]
+        if patient.is_active and patient.card_type is not None and patient.card_expiry_day > self.day:
+            holder_type = patient.card_type
+            # 到期日变化时才登记，到期当天由advance()重新计算
+            if patient.card_expiry_day != registered:
+                registered = patient.card_expiry_day
+                self._expiry_buckets.setdefault(registered, []).append(patient)
+
+        new = (is_member, holder_type, registered)
+        if new == old:
+            return
+
+        self.members += is_member - old[0]
+        if old[1] is not None:
+            self.holders[old[1]] -= 1
+        if holder_type is not None:
+            self.holders[holder_type] += 1
+        self._counted[patient.id] = new
+
+    def advance(self, day):
+        """
+        推进到新的模拟日期，处理当天到期的会员卡
+
+        参数：
+        - day: 新的模拟日期
+        """
+        self.day = day
+        self._expired_today = self._expiry_buckets.pop(day, [])
+        for patient in self._expired_today:
+            self.refresh(patient)
+
+    def pop_expiring(self, day):
+        """
+        取出当天会员卡到期的活跃患者（续卡判定使用），需在advance(day)之后调用
+
+        参数：
+        - day: 模拟日期
+
+        返回：
+        - 按患者ID排序的到期患者列表（与遍历全部患者的顺序一致）
+        """
+        expiring = {}
+        for patient in self._expired_today:
+            if patient.is_active and patient.card_expiry_day == day:
+                expiring[patient.id] = patient
+        self._expired_today = []
+        return [expiring[pid] for pid in sorted(expiring)]
+
+    def recount(self, patients):
+        """
+        遍历全部患者重新统计（用于调试校验）
+
+        返回：
+        - (总客户数, 会员数, 各卡类型有效持卡人数)
+        """
+        members = 0
+        holders = {'1yr': 0, '5yr': 0}
+        for p in patients:
+            if p.is_active and p.card_type is not None:
+                members += 1
+                if p.card_expiry_day > self.day:
+                    holders[p.card_type] += 1
+        return len(patients), members, holders
+
+    def verify(self, patients):
+        """
+        与全量重新统计的结果比对，不一致时抛出异常
+
+        参数：
+        - patients: 全部患者列表
+        """
+        expected = self.recount(patients)
+        actual = (self.customers, self.members, self.holders)
+        if actual != expected:
+            raise RuntimeError(f'会员计数不一致（第{self.day}天）：增量{actual}，全量{expected}')
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+蒙特卡洛批量模拟
+
+同一组参数独立重复模拟N次（多进程并行），每次使用独立且可复现的随机种子，
+输出每日现金、营收、会员数的P5/P50/P95分位带，以及回本月份的分布
+
+命令行用法：
+    python src/monte_carlo.py --replications 200 --seed 42 --params params.json
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from simulation_manager import SimulationManager
+
+
+# 需要输出分位带的每日指标
+BAND_METRICS = ['Cash', 'RevenueTotal', 'TotalMembers']
+# 分位数
+PERCENTILES = {'p5': 5, 'p50': 50, 'p95': 95}
+
+
+def spawn_seeds(seed, replications):
+    """
+    为每次重复模拟生成独立的随机种子
+
+    参数：
+    - seed: 批量模拟的主种子，None表示随机
+    - replications: 重复次数
+
+    返回：
+    - 种子列表，同一主种子总是得到相同的种子列表
+    """
+    children = np.random.SeedSequence(seed).spawn(replications)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def simulate(params, seed):
+    """
+    用指定种子运行一次完整模拟（只生成日数据）
+
+    参数：
+    - params: 模拟参数（覆盖默认值的部分即可）
+    - seed: 随机种子
+
+    返回：
+    - 运行结束的SimulationManager
+    """
+    manager = SimulationManager()
+    manager.set_params(dict(params, seed=seed))
+    total_days = int(manager.params['years'] * 365)
+    for _ in range(total_days):
+        manager._run_single_day()
+    manager.publish_snapshot()  # 逐日运行不经过按周发布，结束时发布一次供读取结果
+    return manager
+
+
+def run_replication(params, seed):
+    """
+    运行一次完整模拟
+
+    参数：
+    - params: 模拟参数（覆盖默认值的部分即可）
+    - seed: 本次模拟的随机种子
+
+    返回：
+    - 每日指标数组、最终现金和回本月份
+    """
+    manager = simulate(params, seed)
+    daily = manager.get_daily_frame()
+    return {
+        'seed': seed,
+        'series': {metric: daily[metric].tolist() for metric in BAND_METRICS},
+        'final_cash': manager.state['current_cash'],
+        'break_even_month': break_even_month(daily),
+    }
+
+
+def break_even_month(daily):
+    """
+    计算回本月份：现金余额首次回到0以上（收回全部初始投资）的自然月序号，从1开始
+
+    参数：
+    - daily: 每日统计数据DataFrame
+
+    返回：
+    - 回本月份，模拟期内未回本返回None
+    """
+    reached = np.flatnonzero(daily['Cash'].to_numpy() >= 0)
+    if len(reached) == 0:
+        return None
+    year, month = daily['Year'].to_numpy(), daily['Month'].to_numpy()
+    day = reached[0]
+    return int((year[day] - year[0]) * 12 + month[day] - month[0] + 1)
+
+
+def _summarize(values):
+    """计算一组数值的分位数和均值"""
+    values = np.asarray(values, dtype=np.float64)
+    summary = {name: float(np.percentile(values, q)) for name, q in PERCENTILES.items()}
+    summary['mean'] = float(values.mean())
+    return summary
+
+
+def _is_positive_int(value):
+    """是否为正整数（不接受布尔值和浮点数）"""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 1
+
+
+def check_batch_args(replications, seed=None, workers=None):
+    """
+    校验批量模拟参数
+
+    replications、workers不是正整数或seed不是非负整数时抛出ValueError
+    """
+    if not _is_positive_int(replications):
+        raise ValueError(f'重复次数必须是正整数：{replications!r}')
+    if workers is not None and not _is_positive_int(workers):
+        raise ValueError(f'工作进程数必须是正整数：{workers!r}')
+    if seed is not None and not (isinstance(seed, int) and not isinstance(seed, bool) and seed >= 0):
+        raise ValueError(f'随机种子必须是非负整数：{seed!r}')
+
+
+def run_batch(params, replications=100, seed=None, workers=None):
+    """
+    并行运行N次重复模拟并汇总分布
+
+    参数：
+    - params: 模拟参数（覆盖默认值的部分即可）
+    - replications: 重复次数
+    - seed: 主随机种子，相同主种子得到相同结果
+    - workers: 工作进程数，None表示使用全部CPU核心
+
+    返回：
+    - 分位带与回本月份分布
+
+    参数不合法时抛出ValueError（见check_batch_args）
+    """
+    check_batch_args(replications, seed, workers)
+
+    seeds = spawn_seeds(seed, replications)
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, replications // (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run_replication, [params] * replications, seeds, chunksize=chunksize))
+
+    bands = {}
+    for metric in BAND_METRICS:
+        matrix = np.array([r['series'][metric] for r in results], dtype=np.float64)
+        bands[metric] = {name: np.percentile(matrix, q, axis=0).tolist() for name, q in PERCENTILES.items()}
+
+    months = [r['break_even_month'] for r in results]
+    reached = [m for m in months if m is not None]
+    break_even = {
+        'values': months,  # 每次模拟的回本月份（None表示未回本）
+        'probability': len(reached) / replications,  # 模拟期内回本的概率
+    }
+    if reached:
+        break_even.update(_summarize(reached))
+
+    return {
+        'replications': replications,
+        'seed': seed,
+        'seeds': seeds,
+        'days': len(results[0]['series']['Cash']) if results else 0,
+        'bands': bands,
+        'final_cash': _summarize([r['final_cash'] for r in results]),
+        'break_even_month': break_even,
+    }
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='诊所模拟蒙特卡洛批量运行')
+    parser.add_argument('--replications', type=int, default=100, help='重复模拟次数')
+    parser.add_argument('--seed', type=int, default=None, help='主随机种子')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数，默认使用全部CPU核心')
+    parser.add_argument('--params', default=None, help='参数JSON文件（覆盖默认参数）')
+    parser.add_argument('--output', default=None, help='结果JSON输出路径')
+    args = parser.parse_args()
+
+    params = {}
+    if args.params:
+        with open(args.params, 'r', encoding='utf-8') as f:
+            params = json.load(f)
+
+    try:
+        result = run_batch(params, args.replications, args.seed, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"重复次数：{result['replications']}")
+    final_cash = result['final_cash']
+    print(f"最终现金 P5/P50/P95：{final_cash['p5']:.0f} / {final_cash['p50']:.0f} / {final_cash['p95']:.0f}")
+    break_even = result['break_even_month']
+    print(f"回本概率：{break_even['probability']:.1%}")
+    if 'p50' in break_even:
+        print(f"回本月份 P5/P50/P95：{break_even['p5']:.0f} / {break_even['p50']:.0f} / {break_even['p95']:.0f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        print(f"结果已保存：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+参数扫描（网格搜索 / 拉丁超立方抽样）
+
+对 SimulationManager.default_params 中任意参数给定取值范围，展开为一组场景，
+多进程并行运行，按最终现金、回本月份等目标排序输出紧凑的结果表。
+已运行过的相同场景（按参数哈希）直接从缓存读取
+
+命令行用法：
+    python src/parameter_sweep.py --grid num_chairs=3,4,5 --grid num_nurses=3,4 --seed 1
+    python src/parameter_sweep.py --lhs price_card_5yr=3000:8000 --samples 20 --seed 1
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from monte_carlo import simulate, break_even_month
+from simulation_manager import SimulationManager
+
+
+# 排序目标：目标名 -> 是否越大越好
+OBJECTIVES = {
+    'final_cash': True,           # 最终现金
+    'total_profit': True,         # 累计利润
+    'total_revenue': True,        # 累计营收
+    'total_members': True,        # 最终会员数
+    'break_even_month': False,    # 回本月份（越早越好）
+}
+# 结果表中的指标列
+METRIC_COLUMNS = list(OBJECTIVES)
+# 不影响场景结果的参数：种子由扫描统一指定，调试开关只做校验，不参与哈希也不能扫描
+RUN_ONLY_PARAMS = ('seed', 'debug_counters')
+
+# 默认参数缓存，只构造一次SimulationManager
+_default_params_cache = None
+
+
+def _default_params():
+    """获取SimulationManager的默认参数"""
+    global _default_params_cache
+    if _default_params_cache is None:
+        _default_params_cache = SimulationManager().default_params
+    return _default_params_cache
+
+
+def _check_keys(ranges):
+    """检查扫描参数都在默认参数中且会影响结果"""
+    unknown = [key for key in ranges if key not in _default_params()]
+    if unknown:
+        raise ValueError(f'未知参数：{", ".join(unknown)}')
+    fixed = [key for key in ranges if key in RUN_ONLY_PARAMS]
+    if fixed:
+        raise ValueError(f'不能扫描的参数：{", ".join(fixed)}')
+
+
+def scenario_params(params):
+    """去掉不影响场景结果的参数（种子、调试开关），返回新字典"""
+    return {key: value for key, value in params.items() if key not in RUN_ONLY_PARAMS}
+
+
+def expand_grid(ranges):
+    """
+    展开参数网格
+
+    参数：
+    - ranges: 参数名 -> 取值列表
+
+    返回：
+    - 场景列表，每个场景是参数名 -> 取值的字典
+    """
+    if not isinstance(ranges, dict) or not all(isinstance(values, list) for values in ranges.values()):
+        raise ValueError('网格必须是参数名到取值列表的映射')
+    _check_keys(ranges)
+    keys = list(ranges)
+    return [dict(zip(keys, values)) for values in itertools.product(*(ranges[k] for k in keys))]
+
+
+def latin_hypercube(ranges, samples, seed=None):
+    """
+    拉丁超立方抽样
+
+    参数：
+    - ranges: 参数名 -> (下限, 上限)，上下限均为整数时抽样结果取整
+    - samples: 抽样场景数
+    - seed: 随机种子
+
+    返回：
+    - 场景列表
+    """
+    if not isinstance(ranges, dict) or not all(
+            isinstance(span, (list, tuple)) and len(span) == 2 for span in ranges.values()):
+        raise ValueError('抽样范围必须是参数名到[下限, 上限]的映射')
+    _check_keys(ranges)
+    rng = np.random.default_rng(seed)
+    scenarios = [{} for _ in range(samples)]
+    for key, (low, high) in ranges.items():
+        # 每个维度分成samples个等概率区间，每个区间内随机取一点，再打乱区间顺序
+        points = (rng.permutation(samples) + rng.random(samples)) / samples
+        values = low + points * (high - low)
+        if isinstance(low, int) and isinstance(high, int):
+            values = np.rint(values).astype(int)
+        for scenario, value in zip(scenarios, values.tolist()):
+            scenario[key] = value
+    return scenarios
+
+
+def scenario_hash(params, seed):
+    """
+    计算场景哈希：完整参数与种子相同的场景哈希相同
+
+    参数：
+    - params: 完整模拟参数（不含RUN_ONLY_PARAMS）
+    - seed: 随机种子
+    """
+    payload = json.dumps({'params': params, 'seed': seed}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class SweepCache:
+    """
+    场景结果缓存
+
+    以场景哈希为键保存指标结果；指定文件路径时追加写入JSON Lines文件，
+    重启后可继续复用
+    """
+
+    def __init__(self, path=None):
+        """
+        初始化缓存
+
+        参数：
+        - path: 缓存文件路径，None表示只在内存中缓存
+        """
+        self.path = path
+        self._results = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._results[entry['hash']] = entry['metrics']
+
+    def get(self, key):
+        """获取缓存的指标结果，不存在返回None"""
+        return self._results.get(key)
+
+    def put(self, key, metrics):
+        """保存指标结果"""
+        self._results[key] = metrics
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'hash': key, 'metrics': metrics}, ensure_ascii=False) + '\n')
+
+    def __contains__(self, key):
+        return key in self._results
+
+    def __len__(self):
+        return len(self._results)
+
+
+def run_scenario(params, seed):
+    """
+    运行单个场景并提取指标
+
+    返回：
+    - 指标字典（最终现金、累计利润/营收、最终会员数、回本月份）
+    """
+    manager = simulate(params, seed)
+    summary = manager.get_summary()
+    return {
+        'final_cash': summary['final_cash'],
+        'total_profit': summary['total_profit'],
+        'total_revenue': summary['total_revenue'],
+        'total_members': summary['total_members'],
+        'break_even_month': break_even_month(manager.get_daily_frame()),
+    }
+
+
+def _sort_key(row, objectives):
+    """按目标依次排序；越大越好的目标取负，缺失值（如未回本）排在最后"""
+    key = []
+    for name in objectives:
+        value = row[name]
+        if value is None:
+            key.append((1, 0))
+        else:
+            key.append((0, -value if OBJECTIVES[name] else value))
+    return key
+
+
+def run_sweep(base_params, scenarios, seed=0, objectives=('final_cash',), workers=None, cache=None):
+    """
+    并行运行一组场景并排序
+
+    参数：
+    - base_params: 基础参数，场景中的取值覆盖其中的同名参数（种子、调试开关被忽略）
+    - scenarios: 场景列表（expand_grid / latin_hypercube 的结果）
+    - seed: 所有场景共用的随机种子（公共随机数，便于场景间比较）
+    - objectives: 排序目标，按先后顺序比较
+    - workers: 工作进程数，None表示使用全部CPU核心
+    - cache: SweepCache，None时新建仅内存的缓存
+
+    返回：
+    - 结果表：columns为列名，rows为按目标排序后的行
+    """
+    for name in objectives:
+        if name not in OBJECTIVES:
+            raise ValueError(f'未知排序目标：{name}')
+    cache = cache if cache is not None else SweepCache()
+    defaults = scenario_params(_default_params())
+    base_params = scenario_params(base_params)
+
+    keys = []
+    full_params = []
+    for scenario in scenarios:
+        params = dict(defaults)
+        params.update(base_params)
+        params.update(scenario)
+        full_params.append(params)
+        keys.append(scenario_hash(params, seed))
+
+    # 只运行缓存中没有且本批内不重复的场景
+    pending = {}
+    for key, params in zip(keys, full_params):
+        if key not in cache and key not in pending:
+            pending[key] = params
+
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            metrics = executor.map(run_scenario, list(pending.values()), [seed] * len(pending))
+            for key, result in zip(pending, metrics):
+                cache.put(key, result)
+
+    param_columns = sorted({key for scenario in scenarios for key in scenario})
+    rows = []
+    for key, scenario in zip(keys, scenarios):
+        row = {'hash': key[:12], 'cached': key not in pending}
+        row.update({name: scenario.get(name) for name in param_columns})
+        row.update(cache.get(key))
+        rows.append(row)
+    rows.sort(key=lambda row: _sort_key(row, objectives))
+
+    columns = ['rank', 'hash', 'cached'] + param_columns + METRIC_COLUMNS
+    table = []
+    for rank, row in enumerate(rows, start=1):
+        row['rank'] = rank
+        table.append([row[name] for name in columns])
+    return {'columns': columns, 'rows': table, 'objectives': list(objectives), 'seed': seed}
+
+
+def _parse_value(text):
+    """解析命令行参数值：优先按JSON解析，失败则作为字符串"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _format_cell(value):
+    """格式化结果表单元格：金额取整，比例保留有效数字"""
+    if isinstance(value, float):
+        return f'{value:.0f}' if abs(value) >= 100 else f'{value:.3g}'
+    return str(value)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='诊所模拟参数扫描')
+    parser.add_argument('--grid', action='append', default=[], help='网格参数，如 num_chairs=3,4,5')
+    parser.add_argument('--lhs', action='append', default=[], help='拉丁超立方参数范围，如 price_card_5yr=3000:8000')
+    parser.add_argument('--samples', type=int, default=20, help='拉丁超立方抽样场景数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--objective', action='append', default=None, help=f'排序目标：{", ".join(OBJECTIVES)}')
+    parser.add_argument('--params', default=None, help='基础参数JSON文件')
+    parser.add_argument('--workers', type=int, default=None, help='工作进程数')
+    parser.add_argument('--cache', default=None, help='缓存文件路径（JSON Lines）')
+    args = parser.parse_args()
+
+    base_params = {}
+    if args.params:
+        with open(args.params, 'r', encoding='utf-8') as f:
+            base_params = json.load(f)
+
+    if args.lhs:
+        ranges = {}
+        for item in args.lhs:
+            key, span = item.split('=', 1)
+            low, high = span.split(':', 1)
+            ranges[key] = (_parse_value(low), _parse_value(high))
+        scenarios = latin_hypercube(ranges, args.samples, args.seed)
+    else:
+        ranges = {}
+        for item in args.grid:
+            key, values = item.split('=', 1)
+            ranges[key] = [_parse_value(v) for v in values.split(',')]
+        scenarios = expand_grid(ranges)
+
+    result = run_sweep(base_params, scenarios, args.seed, tuple(args.objective or ['final_cash']),
+                       args.workers, SweepCache(args.cache))
+
+    print('\t'.join(result['columns']))
+    for row in result['rows']:
+        print('\t'.join(_format_cell(v) for v in row))
+
+
+if __name__ == "__main__":
+    main()
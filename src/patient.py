@@ -27,9 +27,24 @@ class Patient:
     - next_ortho_appointment: 下次矫正复诊日期
     - ortho_age: 进行矫正时的年龄
     - ortho_completed: 矫正是否已完成
+    - ortho_total_cost: 矫正总费用
+    - ortho_revenue_remaining: 矫正完成时待确认的剩余营收
+    - appointment_book: 预约日历索引（可选），预约日期或活跃状态变化时自动登记
+    - member_counters: 会员计数器（可选），办卡、到期或流失时自动更新计数
+    
+    使用__slots__固定属性布局，不为每个实例创建__dict__，大量患者时显著节省内存；
+    所有属性都在这里声明，不能在运行时添加新属性
     """
     
-    def __init__(self, patient_id, join_day, initial_age, source="native"):
+    __slots__ = (
+        'appointment_book', 'member_counters',
+        'id', 'join_day', 'initial_age', 'source',
+        '_card_type', '_card_expiry_day', '_is_active', '_next_appointment_day', 'remaining_prevention',
+        'has_ortho', 'ortho_start_day', 'ortho_end_day', '_next_ortho_appointment', 'ortho_age',
+        'ortho_completed', 'ortho_total_cost', 'ortho_revenue_remaining',
+    )
+    
+    def __init__(self, patient_id, join_day, initial_age, source="native", appointment_book=None, member_counters=None):
         """
         初始化患者对象
         
@@ -38,24 +53,95 @@ class Patient:
         - join_day: 初诊日期
         - initial_age: 初诊年龄
         - source: 患者来源（"native"=原生，"existing"=初始配置的现有会员）
+        - appointment_book: 预约日历索引（AppointmentBook），None表示不建索引
+        - member_counters: 会员计数器（MemberCounters），None表示不计数
         """
+        self.appointment_book = appointment_book  # 预约日历索引
+        self.member_counters = member_counters    # 会员计数器
         self.id = patient_id           # 患者唯一识别ID
         self.join_day = join_day       # 初诊日期
         self.initial_age = initial_age # 初诊年龄
         self.source = source           # 患者来源：原生或初始配置的现有会员
-        self.card_type = None          # 初始无会员卡
-        self.card_expiry_day = 0       # 会员卡到期日期，初始为0（无卡）
-        self.next_appointment_day = None  # 下次常规复诊日期
-        self.is_active = True          # 初始为活跃状态
+        self._card_type = None         # 初始无会员卡
+        self._card_expiry_day = 0      # 会员卡到期日期，初始为0（无卡）
+        self._is_active = True         # 初始为活跃状态
+        self._next_appointment_day = None  # 下次常规复诊日期
         self.remaining_prevention = 0  # 剩余免费预防次数，初始为0
         
         # 矫正相关属性初始化
         self.has_ortho = False         # 初始未进行矫正
         self.ortho_start_day = 0       # 矫正开始日期
         self.ortho_end_day = 0         # 矫正结束日期
-        self.next_ortho_appointment = None  # 下次矫正复诊日期
+        self._next_ortho_appointment = None  # 下次矫正复诊日期
         self.ortho_age = 0             # 矫正时年龄
         self.ortho_completed = False   # 矫正未完成
+        self.ortho_total_cost = 0      # 矫正总费用
+        self.ortho_revenue_remaining = 0  # 矫正完成时待确认的剩余营收（总费用的45%）
+        
+        # 登记到会员计数器（计入总客户数）
+        if self.member_counters is not None:
+            self.member_counters.add(self)
+
+    @property
+    def card_type(self):
+        """会员卡类型"""
+        return self._card_type
+
+    @card_type.setter
+    def card_type(self, card_type):
+        self._card_type = card_type
+        if self.member_counters is not None:
+            self.member_counters.refresh(self)
+
+    @property
+    def card_expiry_day(self):
+        """会员卡到期日期"""
+        return self._card_expiry_day
+
+    @card_expiry_day.setter
+    def card_expiry_day(self, day):
+        self._card_expiry_day = day
+        if self.member_counters is not None:
+            self.member_counters.refresh(self)
+
+    @property
+    def next_appointment_day(self):
+        """下次常规复诊日期"""
+        return self._next_appointment_day
+
+    @next_appointment_day.setter
+    def next_appointment_day(self, day):
+        self._next_appointment_day = day
+        if self.appointment_book is not None and self._is_active:
+            self.appointment_book.schedule(self, day)
+
+    @property
+    def next_ortho_appointment(self):
+        """下次矫正复诊日期"""
+        return self._next_ortho_appointment
+
+    @next_ortho_appointment.setter
+    def next_ortho_appointment(self, day):
+        self._next_ortho_appointment = day
+        if self.appointment_book is not None and self._is_active:
+            self.appointment_book.schedule(self, day)
+
+    @property
+    def is_active(self):
+        """患者是否活跃（未流失）"""
+        return self._is_active
+
+    @is_active.setter
+    def is_active(self, active):
+        reactivated = active and not self._is_active
+        self._is_active = active
+        # 重新激活时把已有预约重新登记到索引
+        if reactivated and self.appointment_book is not None:
+            self.appointment_book.schedule(self, self._next_appointment_day)
+            self.appointment_book.schedule(self, self._next_ortho_appointment)
+        # 流失或重新激活时更新会员计数
+        if self.member_counters is not None:
+            self.member_counters.refresh(self)
 
     def buy_card(self, card_type, current_day, price):
         """
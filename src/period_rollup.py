@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+周/月/年统计累加器
+
+每提交一天的日数据，就从日数据列中读出当天的指标，累加到所在周、月、年的累加器中（每天O(1)），
+周期结束时直接用累加结果生成统计行，不再回扫日数据重新分组求和
+"""
+
+import math
+
+import numpy as np
+
+from daily_history import COLUMNS
+
+
+# 按周期求和的日指标
+SUM_FIELDS = (
+    'NewCustomers', 'PatientsSeen', 'RevenueTotal', 'Costs', 'Profit', 'CashFlowToday',
+    'RevenueCard', 'RevenueTreatment', 'RevenueOrtho',
+    'ProfitCard', 'ProfitTreatment', 'ProfitOrtho',
+    'CashFlowCard', 'CashFlowTreatment', 'CashFlowOrtho',
+    'DoctorSalary', 'NurseSalary', 'OpsSalary',
+)
+
+# 取周期最后一天取值的日指标
+LAST_FIELDS = (
+    'Day', 'Date', 'TotalCustomers', 'TotalMembers', 'Cash',
+    'CurrentPediatricDoctors', 'CurrentOrthoDoctors', 'CurrentNurses', 'CurrentOps',
+)
+
+# 分组使用的日指标
+_PERIOD_FIELDS = ('Month', 'Year')
+
+# 浮点列（与日数据列式存储的类型一致，累加结果和期末值都按浮点数输出）
+_FLOAT_FIELDS = frozenset(name for name, dtype in COLUMNS.items() if dtype is np.float64)
+
+
+class PeriodAccumulator:
+    """
+    单个周期（一周/一月/一年）的累加器
+
+    - totals: SUM_FIELDS 各指标的累计值（按天数顺序累加）
+    - first / last: 周期第一天 / 最后一天的 Day、Date 及 LAST_FIELDS 取值
+    """
+
+    __slots__ = ('key', 'totals', 'first', 'last')
+
+    def __init__(self, key=None):
+        """
+        初始化空累加器
+
+        参数：
+        - key: 周期标识（周数 / 月份 / 年份）
+        """
+        self.key = key
+        self.totals = {name: 0.0 if name in _FLOAT_FIELDS else 0 for name in SUM_FIELDS}
+        self.first = None
+        self.last = None
+
+    def add(self, sums, point):
+        """
+        累加一天的日数据
+
+        参数：
+        - sums: 当天 SUM_FIELDS 各指标的取值（与 SUM_FIELDS 顺序一致）
+        - point: 当天 LAST_FIELDS 的取值（各周期共用，不会再修改）
+        """
+        totals = self.totals
+        for name, value in zip(SUM_FIELDS, sums):
+            totals[name] += value
+        if self.first is None:
+            self.first = point
+        self.last = point
+
+    def __bool__(self):
+        return self.first is not None
+
+
+class PeriodRollups:
+    """
+    周/月/年累加器集合
+
+    - week: 当前周的累加器，close_week() 取出并开始新的一周
+    - months / years: 月份 / 年份 -> 累加器（按日数据的 Month / Year 字段分组）
+    - calendar_months: (年份, 月份) -> 累加器，不同年份的同一月份分开累计（月末结算工资提成使用）
+    - changed_months() / changed_years(): 取出自上次调用以来有新数据的月份 / 年份，
+      只需重建这些周期的统计行
+    """
+
+    def __init__(self):
+        """初始化空累加器集合"""
+        self.week = PeriodAccumulator()
+        self.months = {}
+        self.years = {}
+        self.calendar_months = {}
+        self._changed_months = set()
+        self._changed_years = set()
+
+    def add(self, history, index):
+        """
+        把一天的日数据累加到所在周、月、年
+
+        参数：
+        - history: DailyHistory
+        - index: 当天在日数据中的下标
+        """
+        sums = history.values(SUM_FIELDS, index)
+        point = dict(zip(LAST_FIELDS, history.values(LAST_FIELDS, index)))
+        month, year = history.values(_PERIOD_FIELDS, index)
+        self.week.add(sums, point)
+
+        accumulator = self.months.get(month)
+        if accumulator is None:
+            accumulator = self.months[month] = PeriodAccumulator(month)
+        accumulator.add(sums, point)
+        self._changed_months.add(month)
+
+        accumulator = self.years.get(year)
+        if accumulator is None:
+            accumulator = self.years[year] = PeriodAccumulator(year)
+        accumulator.add(sums, point)
+        self._changed_years.add(year)
+
+        accumulator = self.calendar_months.get((year, month))
+        if accumulator is None:
+            accumulator = self.calendar_months[(year, month)] = PeriodAccumulator((year, month))
+        accumulator.add(sums, point)
+
+    def month_totals(self, year, month):
+        """
+        某年某月已写入日数据的累计值
+
+        返回：
+        - SUM_FIELDS 各指标的累计值，当月还没有日数据时各项为0
+        """
+        accumulator = self.calendar_months.get((year, month))
+        return accumulator.totals if accumulator is not None else PeriodAccumulator().totals
+
+    def close_week(self, week):
+        """
+        结束当前周
+
+        参数：
+        - week: 结束的周数
+
+        返回：
+        - 该周的累加器（没有任何日数据时为空累加器）
+        """
+        accumulator, self.week = self.week, PeriodAccumulator()
+        accumulator.key = week
+        return accumulator
+
+    def changed_months(self):
+        """取出有新数据的月份"""
+        changed, self._changed_months = self._changed_months, set()
+        return changed
+
+    def changed_years(self):
+        """取出有新数据的年份"""
+        changed, self._changed_years = self._changed_years, set()
+        return changed
+
+
+def recompute(history, keys):
+    """
+    从日数据全量重新分组求和（用于核对增量累加结果）
+
+    参数：
+    - history: DailyHistory
+    - keys: 每一天所属周期标识的数组（与日数据等长）
+
+    返回：
+    - 周期标识 -> PeriodAccumulator
+    """
+    keys = np.asarray(keys)
+    result = {}
+    for key in np.unique(keys).tolist():
+        index = np.flatnonzero(keys == key)
+        accumulator = PeriodAccumulator(key)
+        accumulator.totals = {name: history.column(name)[index].sum().item() for name in SUM_FIELDS}
+        accumulator.first = {name: history.column(name)[index[0]] for name in LAST_FIELDS}
+        accumulator.last = {name: history.column(name)[index[-1]] for name in LAST_FIELDS}
+        for row in (accumulator.first, accumulator.last):
+            for name, value in row.items():
+                row[name] = value.item() if hasattr(value, 'item') else value
+        result[key] = accumulator
+    return result
+
+
+def compare_rows(expected, actual, label, rel_tol=1e-9, abs_tol=1e-6):
+    """
+    逐字段比较两组统计行
+
+    参数：
+    - expected: 全量重算得到的统计行列表
+    - actual: 增量累加得到的统计行列表
+    - label: 出错信息中的数据名称（weekly / monthly / yearly）
+    - rel_tol / abs_tol: 浮点数允许的误差（求和顺序不同）
+
+    返回：
+    - 不一致的描述列表，一致时为空列表
+    """
+    if len(expected) != len(actual):
+        return [f'{label}: 行数不一致 {len(expected)} != {len(actual)}']
+    mismatches = []
+    for expected_row, actual_row in zip(expected, actual):
+        for name, value in expected_row.items():
+            other = actual_row.get(name)
+            if isinstance(value, float) or isinstance(other, float):
+                same = other is not None and math.isclose(value, other, rel_tol=rel_tol, abs_tol=abs_tol)
+            else:
+                same = value == other
+            if not same:
+                mismatches.append(f'{label}: 第{expected_row.get("StartDay")}天起的{name}不一致 {value!r} != {other!r}')
+    return mismatches
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模拟随机数流
+
+每个模拟引擎实例持有自己的随机数生成器，按用途拆分为相互独立的子流，
+同一种子的模拟结果完全可复现，并行运行的多个实例之间也互不干扰
+"""
+
+import numpy as np
+
+
+# 子流名称：初始会员生成、新客到店、复诊赴约、治疗、续卡、矫正
+STREAM_NAMES = ('population', 'arrivals', 'follow_up', 'treatment', 'renewal', 'ortho')
+
+
+def new_seed():
+    """生成一个随机种子（32位整数，便于在JSON和前端中原样传递）"""
+    return int(np.random.SeedSequence().generate_state(1)[0])
+
+
+class RandomStreams:
+    """
+    按用途拆分的随机数流
+
+    属性：
+    - seed: 主种子
+    - rng: 主生成器（numpy.random.Generator）
+    - population / arrivals / follow_up / treatment / renewal / ortho: 各子流生成器
+
+    子流由主种子的SeedSequence派生，某一类判定多抽或少抽随机数不会影响其他子流
+    """
+
+    def __init__(self, seed=None):
+        """
+        初始化随机数流
+
+        参数：
+        - seed: 主种子，None时随机生成
+        """
+        self.seed = new_seed() if seed is None else int(seed)
+        root = np.random.SeedSequence(self.seed)
+        self.rng = np.random.default_rng(root)
+        for name, child in zip(STREAM_NAMES, root.spawn(len(STREAM_NAMES))):
+            setattr(self, name, np.random.default_rng(child))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模拟结果快照
+
+模拟线程每推进一周发布一个只读快照，读取结果的请求只访问快照，
+不需要加锁，也不会读到写了一半的一天
+"""
+
+from downsample import downsample
+
+
+class ResultsSnapshot:
+    """
+    某一时刻的只读结果视图
+
+    日/周数据、患者事件和行为矩阵都是只追加的，已写入的行不会再修改，
+    因此快照只记录发布时的行数，读取时按行数截取，不复制整段历史；
+    月/年数据每周生成新列表（有变化的行替换为新行），快照直接持有发布时的列表。
+    """
+
+    def __init__(self, version, run_id, state, summary, daily_history, weekly_history, monthly_history, yearly_history, ledger, behavior, records_events=True):
+        """
+        创建快照
+
+        参数：
+        - version: 数据版本
+        - run_id: 运行编号
+        - state: 当前状态（get_state的结果）
+        - summary: 总结数据（get_summary的结果）
+        - daily_history: 日统计数据（DailyHistory，只追加）
+        - weekly_history: 周统计数据列表（只追加）
+        - monthly_history: 月统计数据列表（发布后不再修改）
+        - yearly_history: 年统计数据列表（发布后不再修改）
+        - ledger: 患者事件账本（只追加）
+        - behavior: 患者行为矩阵（只追加）
+        - records_events: 模拟引擎是否记录逐条患者事件和行为矩阵（向量化引擎不记录）
+        """
+        self.version = version
+        self.run_id = run_id
+        self.state = state
+        self.summary = summary
+        self.current_day = state['current_day']
+        self._daily = daily_history
+        self._daily_count = len(daily_history)
+        self._weekly = weekly_history
+        self._weekly_count = len(weekly_history)
+        self._monthly = monthly_history
+        self._yearly = yearly_history
+        self._ledger = ledger
+        self._event_count = len(ledger)
+        self._behavior = behavior
+        self._behavior_count = len(behavior)
+        self.records_events = records_events
+        self._series_cache = {}  # (指标, 目标点数, 方法, 起始日, 结束日) -> 降采样结果
+
+    def daily(self, since_day=0):
+        """日统计数据；since_day之后的行（日数据按天连续，第N天位于下标N-1）"""
+        return self._daily.rows(since_day, self._daily_count)
+
+    def daily_frame(self):
+        """日统计数据DataFrame（与日数据存储共享内存）"""
+        return self._daily.to_pandas(self._daily_count)
+
+    def series(self, metric, width, method='lttb', day_start=1, day_end=None):
+        """
+        降采样后的日指标序列（同一快照内相同参数的结果会缓存）
+
+        参数：
+        - metric: 日指标列名（数值列）
+        - width: 目标点数（图表像素宽度）
+        - method: 降采样方法（lttb / minmax）
+        - day_start / day_end: 日期范围（含两端），day_end为None表示到快照的最后一天
+
+        返回：
+        - {'Day': [天数, ...], 'Value': [取值, ...]}
+        """
+        day_end = self._daily_count if day_end is None else min(day_end, self._daily_count)
+        key = (metric, width, method, day_start, day_end)
+        cached = self._series_cache.get(key)
+        if cached is None:
+            # 第N天位于下标N-1
+            start = max(day_start, 1) - 1
+            days = self._daily.column('Day', self._daily_count)[start:day_end]
+            values = self._daily.column(metric, self._daily_count)[start:day_end]
+            x, y = downsample(days, values, width, method)
+            cached = self._series_cache[key] = {'Day': x, 'Value': y}
+        return cached
+
+    def weekly(self, since_day=None):
+        """周统计数据；指定since_day时只返回结束日在其之后的行"""
+        return self._periods(self._weekly[:self._weekly_count], since_day)
+
+    def monthly(self, since_day=None):
+        """月统计数据；指定since_day时只返回结束日在其之后的行（含未结束的当月）"""
+        return self._periods(self._monthly, since_day)
+
+    def yearly(self, since_day=None):
+        """年统计数据；指定since_day时只返回结束日在其之后的行（含未结束的当年）"""
+        return self._periods(self._yearly, since_day)
+
+    def events(self, since_day=None):
+        """患者事件；指定since_day时只返回该天之后的事件"""
+        if since_day is None:
+            return self._ledger.records(self._event_count)
+        return self._ledger.events_between(since_day, self.current_day)
+
+    def query_events(self, start=0, limit=100, **filters):
+        """
+        按患者ID、行为类型、来源和日期范围分页查询患者事件（只查询快照发布时已写入的事件）
+
+        返回：
+        - (事件列表, 下一页的起始位置)，没有更多事件时起始位置为None
+        """
+        return self._ledger.query(start=start, limit=limit, count=self._event_count, **filters)
+
+    def patient(self, patient_id):
+        """单个患者的时间线和累计价值；快照发布时没有该患者的事件返回None"""
+        return self._ledger.patient(patient_id, self._event_count)
+
+    def ltv_table(self, sort='Revenue', descending=True, offset=0, limit=50):
+        """按累计价值排序的患者价值表：(患者总数, 当前页的价值行)"""
+        return self._ledger.ltv_table(sort, descending, offset, limit, self._event_count)
+
+    def cashflow_by_source(self, granularity='week'):
+        """按周/月汇总的各来源患者现金流和营收（汇总到快照发布时的日期）"""
+        return self._ledger.source_totals(self.current_day, granularity)
+
+    def behavior_window(self, patient_offset=0, patient_limit=50, day_start=1, day_end=None):
+        """患者行为矩阵的一个患者/日期窗口"""
+        return self._behavior.window(patient_offset, patient_limit, day_start, day_end, self._behavior_count)
+
+    def behavior_frame(self):
+        """患者行为稠密透视表"""
+        return self._behavior.to_frame(self._behavior_count)
+
+    def results(self, type, since_day=None):
+        """
+        按类型获取结果数据
+
+        参数：
+        - type: daily / weekly / monthly / yearly / patient_details
+        - since_day: 只返回该天之后新增或有变化的行，None表示全部
+        """
+        if type == "daily":
+            return self.daily(since_day or 0)
+        elif type == "weekly":
+            return self.weekly(since_day)
+        elif type == "monthly":
+            return self.monthly(since_day)
+        elif type == "yearly":
+            return self.yearly(since_day)
+        elif type == "patient_details":
+            return self.events(since_day)
+        else:
+            return []
+
+    @staticmethod
+    def _periods(rows, since_day):
+        """
+        按结束日筛选周/月/年数据
+
+        月数据按月份（1-12）跨年合并，最近更新的月份不一定在列表末尾，
+        因此逐行比较结束日，不能从末尾向前截取
+        """
+        if since_day is None:
+            return list(rows)
+        return [row for row in rows if row['EndDay'] > since_day]
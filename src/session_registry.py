@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多会话模拟管理
+
+按会话/场景ID保存各自的SimulationManager，互不干扰。
+内存中的会话按最近使用顺序（LRU）管理，超过会话数上限或内存预算时，
+最久未使用的会话序列化到磁盘，下次访问时再懒加载回内存。
+只加载本注册表写入的溢出文件（按文件摘要校验），溢出目录中的其他文件一律忽略
+"""
+
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from simulation_manager import SimulationManager
+
+
+# 各类数据单条记录的粗略内存占用（字节），用于估算会话内存
+BYTES_PER_EVENT = 500       # 患者事件（紧凑元组，含按患者、行为、来源的索引和患者累计值）
+BYTES_PER_PATIENT = 600     # 患者对象
+BYTES_BASE = 200 * 1024     # 空会话（参数、状态、周/月统计等）
+
+# 会话ID只允许字母、数字、下划线和短横线，避免拼接溢出文件路径时越出目录
+_SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def estimate_size(manager):
+    """
+    粗略估算一个会话的内存占用（字节）
+
+    参数：
+    - manager: SimulationManager
+    """
+    state = manager.state
+    size = (BYTES_BASE
+            + len(state['patient_details']) * BYTES_PER_EVENT
+            + len(state['all_patients']) * BYTES_PER_PATIENT
+            + state['daily_history'].nbytes
+            + state['behavior'].nbytes)
+    if manager.population is not None:
+        size += manager.population.nbytes
+    return size
+
+
+class _DigestWriter:
+    """写入文件的同时计算SHA-256摘要（序列化时不需要先在内存中生成完整字节串）"""
+
+    def __init__(self, file):
+        self._file = file
+        self._hash = hashlib.sha256()
+
+    def write(self, data):
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class SessionRegistry:
+    """
+    会话注册表
+
+    - get(session_id): 获取会话的SimulationManager，不存在时新建，已溢出到磁盘时懒加载
+    - acquire(session_id) / release(session_id): 请求处理期间标记会话正在使用
+    - 内存中的会话数超过max_sessions、或估算内存超过memory_budget时，
+      按LRU顺序把空闲会话溢出到磁盘；正在使用、后台运行或有事件流订阅的会话不会被溢出，
+      正在写入（持有写锁）的会话本次跳过；序列化在注册表锁之外进行，不阻塞其他会话的请求
+    - spill_idle(): 把空闲超过idle_seconds的会话溢出到磁盘
+    """
+
+    def __init__(self, max_sessions=32, memory_budget=1024 * 1024 * 1024, spill_dir=None, idle_seconds=1800):
+        """
+        初始化会话注册表
+
+        参数：
+        - max_sessions: 内存中最多保留的会话数
+        - memory_budget: 内存中全部会话的估算内存上限（字节）
+        - spill_dir: 溢出文件目录（不存在时以0700权限创建），None表示不溢出（超限的会话直接丢弃）
+        - idle_seconds: 空闲多久（秒）后溢出到磁盘
+        """
+        self.max_sessions = max_sessions
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()   # 会话ID -> SimulationManager，按最近使用排序（最旧在前）
+        self._last_used = {}             # 会话ID -> 最近访问时间
+        self._in_use = {}                # 会话ID -> 正在处理的请求数
+        self._spilling = set()           # 正在序列化到磁盘的会话ID
+        self._spilled = {}               # 会话ID -> 本注册表写入的溢出文件的SHA-256摘要
+        self._lock = threading.RLock()
+        if spill_dir:
+            os.makedirs(spill_dir, mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def valid_id(session_id):
+        """会话ID是否合法"""
+        return bool(session_id) and _SESSION_ID_PATTERN.match(session_id) is not None
+
+    def _spill_path(self, session_id):
+        """会话溢出文件路径"""
+        return os.path.join(self.spill_dir, f'{session_id}.pkl')
+
+    def get(self, session_id):
+        """
+        获取会话的SimulationManager
+
+        参数：
+        - session_id: 会话/场景ID
+
+        返回：
+        - SimulationManager
+        """
+        with self._lock:
+            manager, victims = self._checkout(session_id)
+        self._spill_all(victims)
+        return manager
+
+    def acquire(self, session_id):
+        """
+        获取会话的SimulationManager并标记为正在使用，使用结束后需调用release()
+
+        正在使用的会话不会被溢出，请求期间的写入不会落到已移出内存的对象上
+        """
+        with self._lock:
+            self._in_use[session_id] = self._in_use.get(session_id, 0) + 1
+            try:
+                manager, victims = self._checkout(session_id)
+            except Exception:
+                self.release(session_id)
+                raise
+        self._spill_all(victims)
+        return manager
+
+    def release(self, session_id):
+        """结束acquire()标记的使用"""
+        with self._lock:
+            count = self._in_use.get(session_id, 0) - 1
+            if count > 0:
+                self._in_use[session_id] = count
+            else:
+                self._in_use.pop(session_id, None)
+
+    def _checkout(self, session_id):
+        """
+        取出会话（调用方持有注册表锁），不存在时新建，已溢出到磁盘时懒加载
+
+        返回：
+        - (SimulationManager, 需要溢出的会话ID列表)，溢出由调用方释放锁后进行
+        """
+        if not self.valid_id(session_id):
+            raise ValueError(f'无效的会话ID：{session_id}')
+        manager = self._sessions.get(session_id)
+        if manager is not None:
+            self._sessions.move_to_end(session_id)
+        else:
+            manager = self._load(session_id) or SimulationManager()
+            self._sessions[session_id] = manager
+        self._last_used[session_id] = time.monotonic()
+        return manager, self._select_victims(keep=session_id)
+
+    def _load(self, session_id):
+        """从磁盘懒加载本注册表溢出的会话（摘要不符的文件不加载），不存在返回None"""
+        digest = self._spilled.pop(session_id, None)
+        if digest is None:
+            return None
+        path = self._spill_path(session_id)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.remove(path)
+        except OSError:
+            return None
+        if hashlib.sha256(data).hexdigest() != digest:
+            return None
+        return pickle.loads(data)
+
+    def _evictable(self, session_id):
+        """会话是否可以移出内存：正在使用、正在溢出、后台运行或有事件流订阅的会话不能移出"""
+        manager = self._sessions[session_id]
+        return (session_id not in self._in_use and session_id not in self._spilling
+                and not manager.is_running() and not manager.stream.has_subscribers)
+
+    def _select_victims(self, keep=None):
+        """
+        按LRU顺序选出需要移出的会话，直到会话数和估算内存都不超限（调用方持有注册表锁）
+
+        选中的会话标记为正在溢出；剩余会话都不能移出时暂时允许超限
+
+        返回：
+        - 会话ID列表，调用方释放锁后交给_spill_all()
+        """
+        count = len(self._sessions) - len(self._spilling)
+        usage = sum(estimate_size(manager) for sid, manager in self._sessions.items() if sid not in self._spilling)
+        victims = []
+        for victim in list(self._sessions):
+            if count <= self.max_sessions and usage <= self.memory_budget:
+                break
+            if victim != keep and self._evictable(victim):
+                self._spilling.add(victim)
+                victims.append(victim)
+                count -= 1
+                usage -= estimate_size(self._sessions[victim])
+        return victims
+
+    def _spill_all(self, victims):
+        """逐个溢出会话（不持有注册表锁）"""
+        for session_id in victims:
+            self._spill(session_id)
+
+    def _spill(self, session_id):
+        """
+        把_select_victims()选中的会话移出内存，配置了溢出目录时写入磁盘
+
+        序列化在注册表锁之外进行，期间持有会话的写锁；会话正在写入（拿不到写锁）、
+        序列化期间又被请求使用、或写盘失败时保留在内存中
+
+        返回：
+        - 是否已移出内存
+        """
+        with self._lock:
+            manager = self._sessions.get(session_id)
+        spilled = False
+        if manager is not None and manager.try_lock():
+            try:
+                spilled = self._write_spill(session_id, manager)
+            finally:
+                manager.unlock()
+        with self._lock:
+            self._spilling.discard(session_id)
+        return spilled
+
+    def _write_spill(self, session_id, manager):
+        """序列化会话（调用方持有会话写锁），成功后在注册表锁内移出内存"""
+        tmp_path = digest = None
+        if self.spill_dir:
+            tmp_path = f'{self._spill_path(session_id)}.{threading.get_ident()}.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    writer = _DigestWriter(f)
+                    pickle.dump(manager, writer, protocol=pickle.HIGHEST_PROTOCOL)
+                digest = writer.hexdigest()
+            except Exception:
+                # 溢出只是释放内存，失败时会话继续留在内存中，不影响触发溢出的请求
+                self._discard(tmp_path)
+                return False
+        with self._lock:
+            if self._sessions.get(session_id) is not manager or session_id in self._in_use:
+                # 序列化期间会话被删除或又被请求使用，放弃本次溢出
+                self._discard(tmp_path)
+                return False
+            if tmp_path:
+                os.replace(tmp_path, self._spill_path(session_id))
+                self._spilled[session_id] = digest
+            del self._sessions[session_id]
+            self._last_used.pop(session_id, None)
+            return True
+
+    @staticmethod
+    def _discard(path):
+        """删除未完成的溢出文件"""
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def spill_idle(self):
+        """把空闲超过idle_seconds的会话溢出到磁盘"""
+        with self._lock:
+            now = time.monotonic()
+            idle = [sid for sid, used in self._last_used.items()
+                    if now - used > self.idle_seconds and self._evictable(sid)]
+            self._spilling.update(idle)
+        return sum(1 for session_id in idle if self._spill(session_id))
+
+    def remove(self, session_id):
+        """删除会话（内存和磁盘）"""
+        with self._lock:
+            manager = self._sessions.pop(session_id, None)
+            self._last_used.pop(session_id, None)
+            if self._spilled.pop(session_id, None) is not None:
+                self._discard(self._spill_path(session_id))
+        if manager is not None:
+            manager.stop_run()  # 等待后台运行结束时不持有注册表锁
+
+    def memory_usage(self):
+        """内存中全部会话的估算内存占用（字节）"""
+        return sum(estimate_size(manager) for manager in self._sessions.values())
+
+    def stats(self):
+        """会话统计信息（不包含会话ID，会话ID即访问凭据）"""
+        with self._lock:
+            return {
+                'in_memory': len(self._sessions),
+                'spilled': len(self._spilled),
+                'max_sessions': self.max_sessions,
+                'memory_usage': self.memory_usage(),
+                'memory_budget': self.memory_budget,
+            }
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions or session_id in self._spilled
+
+    def __len__(self):
+        return len(self._sessions)
@@ -6,10 +6,13 @@
 包含诊所日常运营的主要模拟逻辑，包括患者流、医生接诊、财务计算等
 """
 
-import random
 import numpy as np
 import pandas as pd
 from .patient import Patient
+from .appointment_book import AppointmentBook
+from .behavior_matrix import BehaviorMatrix
+from .member_counters import MemberCounters
+from .random_streams import RandomStreams
 
 
 def run_simulation(
@@ -43,6 +46,7 @@ def run_simulation(
     pediatric_material_ratio=0.05,    # 儿牙耗材比例
     ortho_material_ratio=0.30,        # 矫正耗材比例
     card_revenue_recognition_ratio=0.2,  # 会员卡办卡当日确认营收比例，默认20%
+    seed=None,                        # 随机种子，None表示随机生成
 ):
     """
     诊所运营模拟核心函数
@@ -59,7 +63,7 @@ def run_simulation(
     见函数定义中的注释
     
     返回：
-    - df_pivot: 患者行为透视表
+    - behavior: 患者行为矩阵（BehaviorMatrix，稀疏存储；需要稠密透视表时调用 to_frame()）
     - daily_stats: 每日统计数据
     - df_age_dist: 年龄分布数据
     """
@@ -88,9 +92,13 @@ def run_simulation(
     age_probs = [count / total_patients for count in age_distribution.values()]
     
     # ========== 初始化模拟参数 ==========
+    streams = RandomStreams(seed)          # 按用途拆分的随机数流，同一种子结果可复现
     days = int(years * 365)                # 将模拟年限转换为总天数（整数） 
     all_patients = []                 # 存储所有产生的患者对象实例 
     pivot_records = []                # 用于存储透视表所需的原始记录: {'PatientID', 'Day', 'Val', 'Age', 'Source'}
+    pivot_index = {}                  # (患者ID, 日期) -> 该患者当天的透视表记录，合并同日动作时O(1)查找
+    appointment_book = AppointmentBook()  # 预约日历索引：按日期分桶，每天只处理当天到期的患者
+    member_counters = MemberCounters()    # 会员计数器：按到期日分桶，每天只处理当天到期的会员卡
     daily_history = []                # 存储每日总计财务数据 
     patient_counter = 0               # 全局患者ID计数器 
     current_cash = -(invest_decoration + invest_hardware)  # 初始现金流（负值，代表初始投入）
@@ -124,8 +132,22 @@ def run_simulation(
     current_ortho_doctors = 1  # 固定1个矫正医生，总共2个医生
     current_nurses = num_nurses
     
+    def record_action(p, day, val, age):
+        """记录患者当天的动作：当天已有记录（如办卡）时合并文字描述，否则新增一条透视表记录"""
+        key = (p.id, day)
+        existing = pivot_index.get(key)
+        if existing is not None:
+            existing['Val'] += f"+{val}"
+            existing['Age'] = age  # 更新年龄信息
+        else:
+            record = {'PatientID': f'P{p.id:03}', 'Day': f'D{day:03}', 'Val': val, 'Age': age, 'Source': p.source}
+            pivot_records.append(record)
+            pivot_index[key] = record
+    
     # ========== 开始逐日模拟 ==========
     for day in range(1, days + 1):  
+        member_counters.advance(day)  # 处理当天到期的会员卡
+        
         # ---------- 人员配置管理 ----------
         # 人员爬坡逻辑 - 医生数量保持2个，护士数量根据需要调整但不超过6个
         if day > 180:  # 6个月后
@@ -173,54 +195,52 @@ def run_simulation(
         card_contract_liability = (card_1yr_total + card_5yr_total) - recognized_card_revenue
         
         # 1. 老患者复诊与续卡判定 
-        for p in all_patients: 
-            if not p.is_active: continue  # 如果患者已流失则跳过 
-            
-            # 续卡判定：如果今天刚好是会员卡到期日 
-            if p.card_expiry_day == day: 
-                # 计算当前年龄：初诊年龄 + 距离初诊的年数（按365天/年计算）
-                current_age = p.initial_age + (day - p.join_day) // 365
-                roll = random.random()    # 掷随机数决定是否续费 
-                if roll < prob_renew_1yr: # 续1年 
-                    amt = p.buy_card('1yr', day, price_card_1yr) 
-                    cash_today += amt 
-                    cash_renew_card += amt 
-                    card_1yr_total += amt
-                    card_sales_today += amt
-                    pivot_records.append({'PatientID': f'P{p.id:03}', 'Day': f'D{day:03}', 'Val': f'续1年卡(+{amt})', 'Age': current_age, 'Source': p.source}) 
-                elif roll < (prob_renew_1yr + prob_renew_5yr): # 续5年 
-                    amt = p.buy_card('5yr', day, price_card_5yr) 
-                    cash_today += amt 
-                    cash_renew_card += amt 
-                    card_5yr_total += amt
-                    card_sales_today += amt
-                    pivot_records.append({'PatientID': f'P{p.id:03}', 'Day': f'D{day:03}', 'Val': f'续5年卡(+{amt})', 'Age': current_age, 'Source': p.source}) 
-            
-            # 复诊判定：如果今天有常规预约或矫正复诊 
-            if p.next_appointment_day == day or p.next_ortho_appointment == day: 
-                if random.random() < prob_follow_up: # 如果患者准时赴约 
-                    todays_visitors.append(p)        # 加入今日到店名单 
-                else: 
-                    # 未赴约，推迟30天再联系 
-                    if p.next_appointment_day == day: 
-                        p.next_appointment_day = day + 30 
-                    if p.next_ortho_appointment == day: 
-                        p.next_ortho_appointment = day + 30 
+        # 续卡判定：只处理今天会员卡到期的患者（按患者ID顺序）
+        for p in member_counters.pop_expiring(day): 
+            # 计算当前年龄：初诊年龄 + 距离初诊的年数（按365天/年计算）
+            current_age = p.initial_age + (day - p.join_day) // 365
+            roll = streams.renewal.random()    # 掷随机数决定是否续费 
+            if roll < prob_renew_1yr: # 续1年 
+                amt = p.buy_card('1yr', day, price_card_1yr) 
+                cash_today += amt 
+                cash_renew_card += amt 
+                card_1yr_total += amt
+                card_sales_today += amt
+                record_action(p, day, f'续1年卡(+{amt})', current_age)
+            elif roll < (prob_renew_1yr + prob_renew_5yr): # 续5年 
+                amt = p.buy_card('5yr', day, price_card_5yr) 
+                cash_today += amt 
+                cash_renew_card += amt 
+                card_5yr_total += amt
+                card_sales_today += amt
+                record_action(p, day, f'续5年卡(+{amt})', current_age)
+        
+        # 复诊判定：只处理今天有常规预约或矫正复诊的患者（按患者ID顺序）
+        for p in appointment_book.pop_due(day): 
+            if streams.follow_up.random() < prob_follow_up: # 如果患者准时赴约 
+                todays_visitors.append(p)        # 加入今日到店名单 
+            else: 
+                # 未赴约，推迟30天再联系 
+                if p.next_appointment_day == day: 
+                    p.next_appointment_day = day + 30 
+                if p.next_ortho_appointment == day: 
+                    p.next_ortho_appointment = day + 30 
         
         # 2. 获取新初诊客户 
         # 计算增长因子：模拟诊所开业初期客流较少，随时间增加逐渐趋于稳定（180天达到最高峰） 
         growth_factor = min(1.0, 0.4 + (day / 180) * 0.6) 
         # 根据高斯分布生成今日新客数 
-        num_new_leads = max(0, int(random.gauss(daily_new_leads_base, 1) * growth_factor)) 
+        num_new_leads = max(0, int(streams.arrivals.normal(daily_new_leads_base, 1) * growth_factor)) 
         new_customers = num_new_leads  # 记录今日新客数量 
         
         for _ in range(num_new_leads): 
             patient_counter += 1               # 增加ID计数 
             # 根据年龄分布生成初诊年龄 
-            initial_age = random.choices(age_list, weights=age_probs, k=1)[0] 
-            new_p = Patient(patient_counter, day, initial_age) # 创建新患者对象 
+            initial_age = int(streams.arrivals.choice(age_list, p=age_probs)) 
+            new_p = Patient(patient_counter, day, initial_age,
+                            appointment_book=appointment_book, member_counters=member_counters) # 创建新患者对象 
             
-            roll = random.random()             # 判定新客是否在首诊时办卡 
+            roll = streams.arrivals.random()   # 判定新客是否在首诊时办卡 
             action_desc = "初诊" 
             card_rev = 0 
             if roll < prob_card_1yr: 
@@ -238,7 +258,7 @@ def run_simulation(
                 cash_today += card_rev             # 办卡收入计入现金流
                 cash_new_card += card_rev           # 记录今日新办卡现金收入
             
-            pivot_records.append({'PatientID': f'P{new_p.id:03}', 'Day': f'D{day:03}', 'Val': action_desc, 'Age': initial_age, 'Source': new_p.source}) 
+            record_action(new_p, day, action_desc, initial_age)
             todays_visitors.append(new_p)      # 新客首日必然到店 
             all_patients.append(new_p)         # 加入总患者库 
 
@@ -268,7 +288,7 @@ def run_simulation(
             #         actions.append(f"预防(+{prevention_rev})") 
             
             # 治疗判定 
-            if random.random() < prob_treatment: # 判定是否产生普通治疗 
+            if streams.treatment.random() < prob_treatment: # 判定是否产生普通治疗 
                 # 检查是否有治疗折扣（会员卡65折） 
                 discount = 0.65 if p.card_expiry_day > 0 else 1.0 
                 treatment_amt = int(price_treatment * discount) 
@@ -336,7 +356,7 @@ def run_simulation(
                 ortho_amt = int(ortho_amt * discount)
                 
                 # 4. 随机判定是否进行矫正 - 只有矫正医生在时才能进行
-                if current_ortho_doctors > 0 and random.random() < ortho_prob: 
+                if current_ortho_doctors > 0 and streams.ortho.random() < ortho_prob: 
                     # 记录矫正信息
                     p.has_ortho = True
                     p.ortho_start_day = day
@@ -410,18 +430,13 @@ def run_simulation(
             # 记录所有动作（包括矫正复诊）
             if any([prevention_rev, treatment_rev, ortho_rev]) or len(actions) > 0: 
                 # 更新透视表记录：如果该患者今天已有动作（如办卡），则合并文字描述 
-                existing = [r for r in pivot_records if r['PatientID'] == f'P{p.id:03}' and r['Day'] == f'D{day:03}'] 
                 current_age = p.initial_age + (day - p.join_day) // 365
-                if existing: 
-                    existing[0]['Val'] += f"+{'+'.join(actions)}" 
-                    existing[0]['Age'] = current_age  # 更新年龄信息
-                else: 
-                    pivot_records.append({'PatientID': f'P{p.id:03}', 'Day': f'D{day:03}', 'Val': f"{'+'.join(actions)}", 'Age': current_age, 'Source': p.source}) 
+                record_action(p, day, '+'.join(actions), current_age)
             
             # 为就诊过的患者预约下一次常规复诊时间（设定周期加上正负5天的随机波动）
             # 只有在不是矫正复诊时才更新常规复诊时间
             if not is_ortho_appointment:
-                p.next_appointment_day = day + follow_up_cycle + random.randint(-5, 5)
+                p.next_appointment_day = day + follow_up_cycle + int(streams.follow_up.integers(-5, 6))
 
         # 4. 财务统计与支出记录 
         
@@ -500,8 +515,8 @@ def run_simulation(
         # 计算合同负债总额：卡类未确认收入 + 矫正未确认收入
         contract_liability = card_contract_liability + ortho_contract_liability
         
-        # 计算截止到当日的会员数：active且卡未过期的患者
-        current_members = sum(1 for p in all_patients if p.is_active and p.card_expiry_day > day)
+        # 计算截止到当日的会员数：active且卡未过期的患者（会员计数器增量维护）
+        current_members = sum(member_counters.holders.values())
         
         # 当日就诊总人数：实际接诊的患者数
         today_patients_seen = len(actual_seen)
@@ -549,8 +564,10 @@ def run_simulation(
     
     # 保存包含年龄信息的原始记录到CSV文件
     df_raw.to_csv(f"{result_dir}/纯新患者模拟_with_age.csv", encoding="gbk", index=False)
-    # 使用 pivot 将原始记录转换为以“患者”为行、“日期”为列的矩阵 
-    df_pivot = df_raw.pivot(index='PatientID', columns='Day', values='Val').fillna('') 
+    # 患者行为矩阵：只保存有行为的单元格，不生成稠密的“患者×日期”透视表 
+    behavior = BehaviorMatrix()
+    for (patient_id, day), record in pivot_index.items():
+        behavior.add_text(patient_id, day, record['Val'])
     
     # 创建年龄分布数据框（仅用于返回，不保存到文件）
     df_age_dist = pd.DataFrame({
@@ -559,4 +576,4 @@ def run_simulation(
         'Probability': age_probs
     })
     
-    return df_pivot, pd.DataFrame(daily_history), df_age_dist  # 返回透视表和每日统计 
+    return behavior, pd.DataFrame(daily_history), df_age_dist  # 返回行为矩阵和每日统计 
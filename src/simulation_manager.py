@@ -6,22 +6,42 @@
 负责管理模拟状态、参数和执行逻辑，支持按周步进模拟
 """
 
-import random
+import itertools
 import numpy as np
-import pandas as pd
 import os
+import threading
+import time
 import patient
 from patient import Patient
-from datetime import datetime, timedelta
+from appointment_book import AppointmentBook
+from behavior_matrix import (BehaviorMatrix, BEHAVIOR_INITIAL_VISIT, BEHAVIOR_INITIAL_VISIT_1YR,
+                             BEHAVIOR_INITIAL_VISIT_5YR, BEHAVIOR_FOLLOW_UP, BEHAVIOR_TREATMENT,
+                             BEHAVIOR_RENEW_1YR, BEHAVIOR_RENEW_5YR, BEHAVIOR_ORTHO_START, BEHAVIOR_ORTHO_END)
+from event_ledger import (EventLedger, PatientEvent, FIRST_VISIT, FOLLOW_UP, TREATMENT, RENEWAL,
+                          ORTHO_START, ORTHO_END)
+from calendar_table import load_calendar
+from daily_history import DailyHistory
+import period_rollup
+from period_rollup import PeriodRollups
+from member_counters import MemberCounters
+from vectorized_population import VectorizedPopulation
+from random_streams import RandomStreams
+from event_stream import EventBroadcaster
+from results_snapshot import ResultsSnapshot
 
 
+# 运行编号序列：所有会话共用，从进程启动时的毫秒时间戳开始递增，
+# 会话删除后重建或进程重启后都不会与旧的运行编号重复（增量查询游标和ETag依赖这一点）
+_run_ids = itertools.count(int(time.time() * 1000))
+
 class SimulationManager:
     """
     模拟管理器类，负责管理模拟状态、参数和执行逻辑
     """
     
-    # 类属性：静态日历数据，从文件加载一次
+    # 类属性：预计算日历表，第一次使用时加载一次，所有会话共享
     _calendar = None
+    _calendar_lock = threading.Lock()
     
     def __init__(self):
         """初始化模拟管理器"""
@@ -74,79 +94,101 @@ class SimulationManager:
             'card_revenue_recognition_ratio': 0.2,  # 会员卡办卡当日确认营收比例，默认20%
             'doctor_threshold': 800,  # 增加医生阈值：平均单医生会员总数>800时增加儿牙医生
             'clinic_type': 'ortho',  # 诊所类型：'ortho'做矫正，'pediatric'纯儿牙
-            'open_days': {'周一': True, '周二': False, '周三': True, '周四': True, '周五': True, '周六': True, '周日': True}  # 开诊日配置
+            'open_days': {'周一': True, '周二': False, '周三': True, '周四': True, '周五': True, '周六': True, '周日': True},  # 开诊日配置
+            'debug_counters': False,  # 调试模式：每天用全量统计校验会员计数器
+            'engine': 'object',  # 模拟引擎：'object'逐个患者对象，'vectorized'向量化数组
+            'seed': None  # 随机种子：None表示每次重置时随机生成，指定后结果可复现
         }
         
         self.params = self.default_params.copy()  # 初始化params为默认值
         
-        # 从静态文件加载日历数据，只加载一次
-        if SimulationManager._calendar is None:
-            SimulationManager._calendar = self._load_calendar()
-        self.calendar = SimulationManager._calendar
+        # 后台运行线程及停止标志（run_until在后台线程中执行时使用）
+        self._run_thread = None
+        self._stop_run = threading.Event()
+        # 写锁：推进模拟、重置、修改参数互斥；读取结果不加锁，只读已发布的快照
+        self._write_lock = threading.RLock()
+        
+        # 数据版本：模拟数据每次变化（新的一天、周统计、重置）都递增，从不回退，用于增量查询和ETag
+        self.version = 0
+        # 运行编号：每次重置取_run_ids的下一个值，增量查询的游标属于哪一次模拟运行
+        self.run_id = 0
+        # 事件推送：每产生一周的统计数据就推送周统计和当前月统计给订阅者（SSE连接）
+        self.stream = EventBroadcaster()
         
         self.reset_simulation()  # 初始化模拟状态
     
-    def _load_calendar(self):
-        """从静态JSON文件加载日历数据"""
-        import json
-        import os
-        
-        # 确定日历文件路径
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)  # 回到项目根目录
-        calendar_file = os.path.join(project_root, 'data', 'calendar.json')
-        
-        # 加载JSON文件
-        with open(calendar_file, 'r', encoding='utf-8') as f:
-            calendar_data = json.load(f)
-        
-        # 将date字段从字符串转换为datetime对象
-        for item in calendar_data:
-            item['date'] = datetime.strptime(item['date'], '%Y-%m-%d')
-        
-        return calendar_data
+    def __getstate__(self):
+        """序列化（会话溢出到磁盘）：不保存后台线程和事件流订阅（日历表是类属性，不随会话保存）"""
+        state = self.__dict__.copy()
+        for name in ('_run_thread', '_stop_run', '_write_lock', 'stream'):
+            state.pop(name, None)
+        return state
+    
+    def __setstate__(self, state):
+        """反序列化：后台线程和事件流重新创建"""
+        self.__dict__.update(state)
+        self._run_thread = None
+        self._stop_run = threading.Event()
+        self._write_lock = threading.RLock()
+        self.stream = EventBroadcaster()
+        self.progress['running'] = False
+    
+    @property
+    def calendar(self):
+        """共享的预计算日历表（第一次访问时从 data/ 目录加载，优先内存映射二进制日期数组）"""
+        if SimulationManager._calendar is None:
+            with SimulationManager._calendar_lock:
+                if SimulationManager._calendar is None:
+                    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+                    SimulationManager._calendar = load_calendar(os.path.join(project_root, 'data'))
+        return SimulationManager._calendar
     
     def get_date_info(self, simulation_day):
-        """根据模拟天数获取真实日期信息"""
-        if simulation_day > len(self.calendar):
-            # 如果超过生成的日历范围，计算扩展日期
-            extra_days = simulation_day - len(self.calendar)
-            start_date = self.calendar[-1]['date'] + timedelta(days=1)
-            extra_date = start_date + timedelta(days=extra_days - 1)
-            
-            year = extra_date.year
-            month = extra_date.month
-            day = extra_date.day
-            weekday = extra_date.weekday()
-            weekday_name = ['周一', '周二', '周三', '周四', '周五', '周六', '周日'][weekday]
-            week_num = extra_date.isocalendar()[1]
-            
-            return {
-                'simulation_day': simulation_day,
-                'date': extra_date,
-                'year': year,
-                'month': month,
-                'day': day,
-                'weekday': weekday,
-                'weekday_name': weekday_name,
-                'week_num': week_num
-            }
-        
-        return self.calendar[simulation_day - 1]
+        """根据模拟天数获取真实日期信息（按下标读取预计算的日历表，超出范围时自动扩展）"""
+        return self.calendar.get(simulation_day)
     
     def reset_simulation(self):
         """重置模拟状态"""
+        # 先停止正在进行的后台运行（不能持锁等待：后台线程每推进一周都要获取写锁）
+        self.stop_run()
+        with self._write_lock:
+            return self._reset_state()
+    
+    def _reset_state(self):
+        """重建模拟状态（调用方持有写锁）"""
+        self.run_id = next(_run_ids)
+        
+        # 运行进度（run_until更新）
+        self.progress = {
+            'running': False,  # 是否正在运行
+            'current_day': 0,  # 当前模拟天数
+            'target_day': 0,  # 目标天数
+            'total_days': self.params['years'] * 365,  # 模拟总天数
+            'elapsed_seconds': 0.0,  # 本次运行已用时间（秒）
+            'days_per_second': 0.0,  # 模拟速度（天/秒）
+            'eta_seconds': None,  # 预计剩余时间（秒）
+            'error': None  # 后台运行出错时的错误信息
+        }
+        
+        # 日历表覆盖全部模拟天数（含模拟最后一天的次日）
+        self.calendar.ensure(int(self.params['years'] * 365) + 1)
+        
+        # 按种子重建随机数流，保证同一种子的模拟结果可复现
+        self.random_streams = RandomStreams(self.params.get('seed'))
+        
         # 重置模拟状态，但保留当前参数
         self.state = {
             'current_day': 0,  # 当前模拟天数
             'current_week': 0,  # 当前模拟周数
             'current_month': 0,  # 当前模拟月数
             'all_patients': [],  # 所有患者列表
-            'pivot_records': [],  # 患者行为透视表数据
-            'patient_details': [],  # 患者详细记录，包括每个患者的行为和财务数据
-            'daily_history': [],  # 每日统计数据
+            'behavior': BehaviorMatrix(),  # 患者行为矩阵（稀疏存储的患者×日期行为）
+            'patient_details': EventLedger(),  # 患者详细记录（按日期分区的事件账本），包括每个患者的行为和财务数据
+            'daily_history': DailyHistory(int(self.params['years'] * 365)),  # 每日统计数据（列式存储）
             'weekly_history': [],  # 每周统计数据
             'monthly_history': [],  # 每月统计数据
+            'yearly_history': [],  # 每年统计数据
+            'rollups': PeriodRollups(),  # 周/月/年累加器，每天写入日数据时累加
             'patient_counter': 0,  # 患者ID计数器
             # 包含开业前期投入的初始现金
             'current_cash': -(self.params['invest_decoration'] + self.params['invest_hardware'] + self.params['pre_opening_investment']),
@@ -167,62 +209,89 @@ class SimulationManager:
             'contract_liability': 0,  # 合同负债总额
             'ortho_contract_liability': 0,  # 矫正合同负债
             'card_contract_liability': 0,  # 卡类合同负债
+            'revenue_total': 0,  # 累计总营收
+            'costs_total': 0,  # 累计总成本
         }
         
+        # 年龄分布数据，用于生成新患者年龄
+        self.age_distribution = {
+            1: 1000, 2: 2700, 3: 2600, 4: 1800, 5: 1800, 6: 1700,
+            7: 1200, 8: 1100, 9: 800, 10: 600, 11: 600, 12: 300,
+            13: 200, 14: 100
+        }
+        self.total_patients = sum(self.age_distribution.values())  # 总患者数
+        self.age_list = list(self.age_distribution.keys())  # 年龄列表
+        # 计算各年龄概率
+        self.age_probs = [count / self.total_patients for count in self.age_distribution.values()]
+        
+        # 预约日历索引：按日期分桶，每天只处理当天到期的患者
+        self.appointment_book = AppointmentBook()
+        # 会员计数器：办卡、到期和流失时增量更新，避免每天遍历全部患者
+        self.member_counters = MemberCounters()
+        
+        # 向量化引擎：患者以NumPy列数组保存（含初始现有会员），并兼作会员计数器
+        self.population = None
+        if self.params['engine'] == 'vectorized':
+            self.population = VectorizedPopulation(self.params, self.age_list, self.age_probs, self.random_streams)
+            self.member_counters = self.population
+            self.state['patient_counter'] = self.population.size
+        
         # 初始化现有会员
-        initial_members_count = self.params['initial_members']
+        initial_members_count = self.params['initial_members'] if self.population is None else 0
         if initial_members_count > 0:
             for i in range(initial_members_count):
                 self.state['patient_counter'] += 1  # 增加患者ID计数器
-                age = max(0.1, np.random.normal(9, 2))  # 生成平均9岁，标准差2岁的年龄
+                age = max(0.1, self.random_streams.population.normal(9, 2))  # 生成平均9岁，标准差2岁的年龄
                 
                 # 创建现有会员，join_day设为0表示初始就存在
-                p = Patient(self.state['patient_counter'], 0, age, source="existing")
+                p = Patient(self.state['patient_counter'], 0, age, source="existing",
+                            appointment_book=self.appointment_book,
+                            member_counters=self.member_counters)
                 
                 # 所有现有会员都有5年卡，剩余到期天数随机
                 total_5yr_days = 365 * 5
-                remaining_days = random.randint(1, total_5yr_days)
+                remaining_days = int(self.random_streams.population.integers(1, total_5yr_days + 1))
                 p.card_type = '5yr'  # 设置为5年卡
                 p.card_expiry_day = remaining_days  # 设置剩余到期天数
                 p.remaining_prevention = -1  # 5年卡无限次免费预防
                 
                 # 安排在3个月内（90天）随机到店
-                first_visit_day = random.randint(1, 90)
+                first_visit_day = int(self.random_streams.population.integers(1, 91))
                 p.next_appointment_day = first_visit_day  # 设置首次到店日期
                 
                 self.state['all_patients'].append(p)  # 添加到患者列表
         
-        # 年龄分布数据，用于生成新患者年龄
-        self.age_distribution = {
-            1: 1000, 2: 2700, 3: 2600, 4: 1800, 5: 1800, 6: 1700,
-            7: 1200, 8: 1100, 9: 800, 10: 600, 11: 600, 12: 300,
-            13: 200, 14: 100
-        }
-        self.total_patients = sum(self.age_distribution.values())  # 总患者数
-        self.age_list = list(self.age_distribution.keys())  # 年龄列表
-        # 计算各年龄概率
-        self.age_probs = [count / self.total_patients for count in self.age_distribution.values()]
-        
+        self.version += 1
+        self.publish_snapshot()
+        self._publish('reset', {'run': self.run_id, 'total_days': self.params['years'] * 365})
         return {'status': 'success', 'message': 'Simulation reset successfully'}
     
     def get_params(self):
-        """获取当前模拟参数"""
-        return self.params
+        """获取当前模拟参数（seed为本次模拟实际使用的种子）"""
+        params = dict(self.params)
+        params['seed'] = self.random_streams.seed
+        return params
     
     def set_params(self, params):
         """设置模拟参数并重置模拟"""
-        # 首先更新当前参数
-        for key, value in params.items():
-            if key in self.params:
-                self.params[key] = value
-        
-        # 然后重置模拟状态，使用更新后的参数
-        self.reset_simulation()
+        self.stop_run()
+        with self._write_lock:
+            # 首先更新当前参数
+            for key, value in params.items():
+                if key in self.params:
+                    self.params[key] = value
+            
+            # 然后重置模拟状态，使用更新后的参数
+            self._reset_state()
         
         return {'status': 'success', 'message': 'Parameters updated successfully'}
     
     def get_state(self):
-        """获取当前模拟状态"""
+        """获取当前模拟状态（最近一次发布的快照）"""
+        return dict(self.snapshot.state)
+    
+    def _current_state(self):
+        """当前模拟状态（调用方持有写锁）"""
         return {
             'current_day': self.state['current_day'],
             'current_week': self.state['current_week'],
@@ -230,35 +299,232 @@ class SimulationManager:
             'current_pediatric_doctors': self.state['current_pediatric_doctors'],
             'current_ortho_doctors': self.state['current_ortho_doctors'],
             'current_nurses': self.state['current_nurses'],
-            'current_cash': self.state['current_cash']
+            'current_cash': self.state['current_cash'],
+            'seed': self.random_streams.seed
         }
     
     def run_next_week(self):
         """运行下一周（7天）的模拟"""
-        # 检查模拟是否已完成
-        if self.state['current_day'] >= self.params['years'] * 365:
-            return {'status': 'error', 'message': 'Simulation has completed'}
+        if self.is_running():
+            return {'status': 'error', 'message': 'Simulation is running in background'}
         
-        # 运行7天模拟
+        with self._write_lock:
+            # 检查模拟是否已完成
+            if self.state['current_day'] >= self.params['years'] * 365:
+                return {'status': 'error', 'message': 'Simulation has completed'}
+            
+            self._advance_week()
+            
+            return {
+                'status': 'success',
+                'message': f'Week {self.state["current_week"]} simulated',
+                'current_week': self.state['current_week'],
+                'current_day': self.state['current_day']
+            }
+    
+    def _advance_week(self):
+        """运行7天模拟（到模拟结束为止）并更新每周统计"""
         for _ in range(7):
             if self.state['current_day'] >= self.params['years'] * 365:
                 break
             self._run_single_day()  # 运行单日模拟
+            self.version += 1
         
         self.state['current_week'] += 1  # 更新周数
         self._calculate_weekly_stats()  # 计算每周统计数据
+        self.version += 1
+        
+        weekly_history = self.state['weekly_history']
+        if weekly_history and weekly_history[-1]['Week'] == self.state['current_week']:
+            self._publish('week', weekly_history[-1])
+        if self.stream.has_subscribers and self.state['current_day']:
+            # 月度统计按自然月（1-12）排序，当前天所在的月份不一定是最后一行
+            month = self.get_date_info(self.state['current_day'])['month']
+            for row in self.state['monthly_history']:
+                if row['Month'] == month:
+                    self._publish('month', row)
+                    break
+        self.publish_snapshot()
+    
+    def publish_snapshot(self):
+        """
+        发布结果快照（调用方持有写锁）
+        
+        读取结果的接口只访问最近发布的快照，快照整体替换，读取方无需加锁
+        """
+        self.snapshot = ResultsSnapshot(
+            self.version, self.run_id, self._current_state(), self._current_summary(),
+            self.state['daily_history'], self.state['weekly_history'], self.state['monthly_history'],
+            self.state['yearly_history'], self.state['patient_details'], self.state['behavior'],
+            records_events=self.population is None)
+    
+    def get_snapshot(self):
+        """获取最近发布的结果快照"""
+        return self.snapshot
+    
+    def _publish(self, event, data):
+        """推送事件给订阅者，事件ID为当前数据版本；没有订阅者时直接跳过"""
+        if self.stream.has_subscribers:
+            self.stream.publish(event, data, self.version)
+    
+    def run_until(self, target_day=None):
+        """
+        连续运行模拟直到目标天数（按整周推进，与逐周运行的统计结果一致）
+        
+        参数：
+        - target_day: 目标天数，None表示运行到模拟结束；不是整周时运行到包含该天的整周结束
+        
+        返回：
+        - 运行结果状态
+        """
+        total_days = self.params['years'] * 365
+        target = total_days if target_day is None else min(int(target_day), total_days)
+        
+        if self.state['current_day'] >= total_days:
+            return {'status': 'error', 'message': 'Simulation has completed'}
+        if target <= self.state['current_day']:
+            return {'status': 'error', 'message': f'Target day {target} has already been reached'}
+        
+        start_day = self.state['current_day']
+        start_time = time.perf_counter()
+        self.progress.update({
+            'running': True,
+            'current_day': start_day,
+            'target_day': target,
+            'total_days': total_days,
+            'elapsed_seconds': 0.0,
+            'days_per_second': 0.0,
+            'eta_seconds': None,
+            'error': None
+        })
+        
+        stopped = False
+        try:
+            while self.state['current_day'] < target:
+                if self._stop_run.is_set():
+                    stopped = True
+                    break
+                # 每周单独持锁，周与周之间让出给重置等其他写操作
+                with self._write_lock:
+                    if self.state['current_day'] >= target:
+                        break
+                    self._advance_week()
+                
+                # 更新进度：速度按本次运行的平均值估算
+                elapsed = time.perf_counter() - start_time
+                done = self.state['current_day'] - start_day
+                speed = done / elapsed if elapsed > 0 else 0.0
+                self.progress.update({
+                    'current_day': self.state['current_day'],
+                    'elapsed_seconds': elapsed,
+                    'days_per_second': speed,
+                    'eta_seconds': (target - self.state['current_day']) / speed if speed > 0 else None
+                })
+                self._publish('progress', dict(self.progress))
+        except Exception as e:
+            self.progress['error'] = str(e)
+            raise
+        finally:
+            self.progress['running'] = False
+            self._publish('progress', dict(self.progress))
         
         return {
             'status': 'success',
-            'message': f'Week {self.state["current_week"]} simulated',
+            'message': f'Simulation stopped at day {self.state["current_day"]}' if stopped
+                       else f'Simulated to day {self.state["current_day"]}',
             'current_week': self.state['current_week'],
-            'current_day': self.state['current_day']
+            'current_day': self.state['current_day'],
+            'elapsed_seconds': self.progress['elapsed_seconds'],
+            'days_per_second': self.progress['days_per_second']
+        }
+    
+    def start_run(self, target_day=None, background=False):
+        """
+        运行模拟到目标天数
+        
+        参数：
+        - target_day: 目标天数，None表示运行到模拟结束
+        - background: 是否在后台线程中运行（立即返回，通过get_progress查询进度）
+        
+        返回：
+        - 运行结果状态（后台运行时为启动状态）
+        """
+        if self.is_running():
+            return {'status': 'error', 'message': 'Simulation is running in background'}
+        
+        if not background:
+            return self.run_until(target_day)
+        
+        total_days = self.params['years'] * 365
+        if self.state['current_day'] >= total_days:
+            return {'status': 'error', 'message': 'Simulation has completed'}
+        
+        with self._write_lock:
+            if self.is_running():
+                return {'status': 'error', 'message': 'Simulation is running in background'}
+            start_day = self.state['current_day']
+            self._stop_run.clear()
+            # 启动前先标记为运行中，避免线程调度前的进度查询返回未运行
+            self.progress['running'] = True
+            self._run_thread = threading.Thread(target=self._run_in_background, args=(target_day,), daemon=True)
+            self._run_thread.start()
+        
+        return {
+            'status': 'success',
+            'message': 'Simulation started in background',
+            'current_day': start_day
         }
     
+    def _run_in_background(self, target_day):
+        """后台线程入口：异常记录在进度中，不向外抛出"""
+        try:
+            result = self.run_until(target_day)
+            if result['status'] == 'error':
+                self.progress['error'] = result['message']
+        except Exception:
+            pass  # 错误信息已由run_until写入进度
+        finally:
+            self.progress['running'] = False
+    
+    def stop_run(self):
+        """停止后台运行并等待线程结束（在当前周结束后停止）"""
+        thread = self._run_thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            self._stop_run.set()
+            thread.join()
+        self._run_thread = None
+        self._stop_run.clear()
+    
+    def is_running(self):
+        """是否有后台运行正在进行"""
+        return self._run_thread is not None and self._run_thread.is_alive()
+    
+    def try_lock(self):
+        """
+        不等待地获取写锁（会话溢出到磁盘时使用，避免序列化写了一半的状态）
+        
+        返回：
+        - 是否获取成功；成功时调用方需调用unlock()释放
+        """
+        return self._write_lock.acquire(blocking=False)
+    
+    def unlock(self):
+        """释放try_lock()获取的写锁"""
+        self._write_lock.release()
+    
+    def get_progress(self):
+        """获取运行进度"""
+        progress = dict(self.progress)
+        progress['running'] = progress['running'] or self.is_running()
+        if not progress['running']:
+            progress['current_day'] = self.state['current_day']
+        return progress
+    
     def _run_single_day(self):
         """运行单日模拟"""
         day = self.state['current_day'] + 1  # 当前模拟天数
         self.state['current_day'] = day  # 更新当前天数
+        self.member_counters.advance(day)  # 处理当天到期的会员卡
         
         # 获取当天的日期信息
         date_info = self.get_date_info(day)
@@ -267,75 +533,64 @@ class SimulationManager:
         # 检查当天是否开诊
         if not self.params['open_days'][weekday_name]:
             # 不开诊，跳过当天模拟，但仍记录日期信息
-            # 获取当前总客户数和总会员数（如果不存在，初始化为初始会员数）
-            total_customers = self.state.get('total_customers', self.params['initial_members'])
-            total_members = self.state.get('total_members', self.params['initial_members'])
+            # 当天的预约不再处理，从预约索引中清理
+            self.appointment_book.pop_due(day)
+            # 当前总客户数和总会员数：与开诊日一致，读取会员计数器
+            total_customers = self.member_counters.customers
+            total_members = self.member_counters.members
             
-            self.state['daily_history'].append({
-                'Day': day,
-                'Week': (day - 1) // 7 + 1,
-                'Month': (day - 1) // 30 + 1,
-                'Year': 2023 + (day - 1) // 365,
-                'Date': date_info['date'].strftime('%Y-%m-%d'),
-                'Weekday': weekday_name,
-                'NewCustomers': 0,
-                'PatientsSeen': 0,
-                'TotalCustomers': total_customers,
-                'CashFlowToday': 0,
-                'Cash': self.state['current_cash'],
-                'RevenueTotal': 0,
-                'RevenueTreatment': 0,
-                'RevenueOrtho': 0,
-                'RevenueCard': 0,
-                'RevenueCardImmediate': 0,
-                'RevenueCardAmortized': 0,
-                'CashNewCard': 0,
-                'CashRenewCard': 0,
-                'CashTreatment': 0,
-                'CashOrtho': 0,
-                'DoctorSalary': 0,
-                'NurseSalary': 0,
-                'OpsSalary': 0,
-                'TotalMembers': total_members,
-                'Card1YrTotal': self.state['card_1yr_total'],
-                'Card5YrTotal': self.state['card_5yr_total'],
-                'MonthlyCardRevenue': self.state['monthly_card_revenue'],
-                'CardContractLiability': self.state['card_contract_liability'],
-                'ClinicType': self.params['clinic_type'],
-                'Source': 'native',
-                'CurrentPediatricDoctors': self.state['current_pediatric_doctors'],
-                'CurrentOrthoDoctors': self.state['current_ortho_doctors'],
-                'CurrentNurses': self.state['current_nurses'],
-                'CurrentOps': self.state['current_ops'],
-                'Costs': 0,
-                'Profit': 0
-            })
+            index, columns = self.state['daily_history'].start_day()
+            columns['Day'][index] = day
+            columns['Week'][index] = date_info['week_num']
+            columns['Month'][index] = date_info['month']
+            columns['Year'][index] = date_info['year']
+            columns['Date'][index] = date_info['date_str']
+            columns['Weekday'][index] = weekday_name
+            columns['NewCustomers'][index] = 0
+            columns['PatientsSeen'][index] = 0
+            columns['TotalCustomers'][index] = total_customers
+            columns['CashFlowToday'][index] = 0
+            columns['Cash'][index] = self.state['current_cash']
+            columns['RevenueTotal'][index] = 0
+            columns['RevenueTreatment'][index] = 0
+            columns['RevenueOrtho'][index] = 0
+            columns['RevenueCard'][index] = 0
+            columns['RevenueCardImmediate'][index] = 0
+            columns['RevenueCardAmortized'][index] = 0
+            columns['CashNewCard'][index] = 0
+            columns['CashRenewCard'][index] = 0
+            columns['CashTreatment'][index] = 0
+            columns['CashOrtho'][index] = 0
+            columns['DoctorSalary'][index] = 0
+            columns['NurseSalary'][index] = 0
+            columns['OpsSalary'][index] = 0
+            columns['TotalMembers'][index] = total_members
+            columns['Card1YrTotal'][index] = self.state['card_1yr_total']
+            columns['Card5YrTotal'][index] = self.state['card_5yr_total']
+            columns['MonthlyCardRevenue'][index] = self.state['monthly_card_revenue']
+            columns['CardContractLiability'][index] = self.state['card_contract_liability']
+            columns['ClinicType'][index] = self.params['clinic_type']
+            columns['Source'][index] = 'native'
+            columns['CurrentPediatricDoctors'][index] = self.state['current_pediatric_doctors']
+            columns['CurrentOrthoDoctors'][index] = self.state['current_ortho_doctors']
+            columns['CurrentNurses'][index] = self.state['current_nurses']
+            columns['CurrentOps'][index] = self.state['current_ops']
+            columns['OrthoContractLiability'][index] = self.state['ortho_contract_liability']
+            columns['ProfitCard'][index] = 0
+            columns['ProfitTreatment'][index] = 0
+            columns['ProfitOrtho'][index] = 0
+            columns['CashFlowCard'][index] = 0
+            columns['CashFlowTreatment'][index] = 0
+            columns['CashFlowOrtho'][index] = 0
+            columns['Costs'][index] = 0
+            columns['Profit'][index] = 0
+            self._commit_day()
             return
         
-        # 今日财务数据初始化
-        cash_today = 0  # 今日现金流
-        revenue_today = 0  # 今日营收
-        
-        # 分类收入和现金流初始化
-        revenue_treatment = 0  # 治疗营收
-        revenue_ortho = 0  # 矫正营收
+        # 卡类收入初始化
         revenue_card_immediate = 0  # 卡类收入的当日确认部分
         revenue_card_amortized = 0  # 卡类收入的分摊部分
         
-        cash_new_card = 0  # 新办卡现金流
-        cash_renew_card = 0  # 续卡现金流
-        cash_treatment = 0  # 治疗现金流
-        cash_ortho = 0  # 矫正现金流
-        
-        todays_visitors = []  # 今日到店患者列表
-        new_customers = 0  # 今日新客户数
-        
-        card_sales_today = 0  # 今日新办卡和续卡的总金额
-        
-        # 患者分类处理列表
-        pediatric_patients = []  # 儿牙患者列表
-        ortho_patients = []  # 矫正患者列表
-        
         # 计算当日卡类分摊收入（权责发生制）
         daily_card_revenue = 0  # 当日卡类分摊收入
         if day % 30 == 1 or day == 1:  # 每月第一天或模拟第一天
@@ -364,78 +619,317 @@ class SimulationManager:
         # 更新卡类合同负债
         self.state['card_contract_liability'] = (self.state['card_1yr_total'] + self.state['card_5yr_total']) - recognized_card_revenue
         
+        # 患者流处理：复诊、新客和就诊，按参数选择对象引擎或向量化引擎
+        if self.params['engine'] == 'vectorized':
+            patient_totals = self.population.simulate_day(day)
+            self.state['card_1yr_total'] += patient_totals['card_1yr_sales']  # 更新1年卡总收入
+            self.state['card_5yr_total'] += patient_totals['card_5yr_sales']  # 更新5年卡总收入
+            self.state['patient_counter'] = self.population.size  # 同步患者ID计数器
+        else:
+            patient_totals = self._simulate_patients(day)
+        
+        cash_today = patient_totals['cash_today']  # 今日现金流
+        cash_new_card = patient_totals['cash_new_card']  # 新办卡现金流
+        cash_renew_card = patient_totals['cash_renew_card']  # 续卡现金流
+        cash_treatment = patient_totals['cash_treatment']  # 治疗现金流
+        cash_ortho = patient_totals['cash_ortho']  # 矫正现金流
+        revenue_treatment = patient_totals['revenue_treatment']  # 治疗营收
+        revenue_ortho = patient_totals['revenue_ortho']  # 矫正营收
+        card_sales_today = patient_totals['card_sales']  # 今日新办卡和续卡的总金额
+        new_customers = patient_totals['new_customers']  # 今日新客户数
+        
+        # 计算医生和护士工资
+        doctor_salary_today = 0  # 今日医生工资
+        nurse_salary_today = 0  # 今日护士工资
+        ops_salary_today = 0  # 今日运营工资
+        
+        # 获取真实日期信息
+        date_info = self.get_date_info(day)
+        current_month = date_info['month']
+        current_year = date_info['year']
+        
+        # 检查是否是当月最后一天（或模拟最后一天）
+        is_last_day_of_month = date_info['is_month_end'] or day == int(self.params['years'] * 365)
+        
+        # 人员配置管理：增加医生的逻辑
+        # 计算平均单医生会员总数，当>阈值时增加儿牙医生
+        total_doctors = self.state['current_pediatric_doctors'] + self.state['current_ortho_doctors']
+        if total_doctors > 0:
+            current_members = self.member_counters.members
+            avg_members_per_doctor = current_members / total_doctors
+            doctor_threshold = self.params['doctor_threshold']
+            # 如果平均单医生会员总数>阈值，增加1个儿牙医生（最多2个儿牙医生）
+            if avg_members_per_doctor > doctor_threshold and self.state['current_pediatric_doctors'] < 2:
+                self.state['current_pediatric_doctors'] += 1
+        
+        # 只在每月最后一天计算工资
+        if is_last_day_of_month:
+            # 计算医生薪酬：底薪+提成+保底
+            # 提成基于月度总营收（权责发生制）
+            
+            # 计算月度总营收：直接读取当年当月的累计值（写入日数据时累加）
+            month_totals = self.state['rollups'].month_totals(current_year, current_month)
+            monthly_revenue = month_totals['RevenueTotal']  # 月度总营收
+            monthly_pediatric_revenue = month_totals['RevenueTreatment']  # 月度儿牙营收
+            monthly_ortho_revenue = month_totals['RevenueOrtho']  # 月度矫正营收
+            
+            # 医生薪酬计算
+            doctor_commission_rate = self.params['doctor_commission_rate']  # 医生提成比例
+            doctor_base_salary = self.params['doctor_base_salary']  # 医生底薪
+            doctor_guaranteed_salary = self.params['doctor_guaranteed_salary']  # 医生保底工资
+            doctor_guaranteed_months = self.params['doctor_guaranteed_months']  # 医生保底时长（月）
+            
+            # 儿牙医生薪酬
+            pediatric_doctor_commission = monthly_pediatric_revenue * doctor_commission_rate  # 儿牙医生提成
+            pediatric_doctor_total = doctor_base_salary + pediatric_doctor_commission  # 儿牙医生总薪酬
+            # 保底期内有保底
+            if day <= doctor_guaranteed_months * 30:  # 转换为天数比较
+                pediatric_doctor_total = max(pediatric_doctor_total, doctor_guaranteed_salary)  # 取提成和保底的最大值
+            
+            # 矫正医生薪酬
+            ortho_doctor_commission = monthly_ortho_revenue * doctor_commission_rate  # 矫正医生提成
+            ortho_doctor_total = doctor_base_salary + ortho_doctor_commission  # 矫正医生总薪酬
+            # 保底期内有保底
+            if day <= doctor_guaranteed_months * 30:  # 转换为天数比较
+                ortho_doctor_total = max(ortho_doctor_total, doctor_guaranteed_salary)  # 取提成和保底的最大值
+            
+            # 使用当前人员数量计算工资
+            doctor_salary_today = (self.state['current_pediatric_doctors'] * pediatric_doctor_total) + \
+                                  (self.state['current_ortho_doctors'] * ortho_doctor_total)  # 总医生工资
+            
+            # 护士薪酬计算
+            nurse_commission_rate = self.params['nurse_commission_rate']  # 护士提成比例
+            nurse_base_salary = self.params['nurse_base_salary']  # 护士底薪
+            nurse_guaranteed_salary = self.params['nurse_guaranteed_salary']  # 护士保底工资
+            nurse_guaranteed_months = self.params['nurse_guaranteed_months']  # 护士保底时长（月）
+            
+            nurse_commission = monthly_revenue * nurse_commission_rate  # 护士提成
+            nurse_individual = nurse_base_salary + nurse_commission  # 单个护士总薪酬
+            # 保底期内有保底
+            if day <= nurse_guaranteed_months * 30:  # 转换为天数比较
+                nurse_individual = max(nurse_individual, nurse_guaranteed_salary)  # 取提成和保底的最大值
+            nurse_salary_today = self.state['current_nurses'] * nurse_individual  # 总护士工资
+            
+            # 运营薪酬计算
+            ops_commission_rate = self.params['ops_commission_rate']  # 运营提成比例
+            ops_base_salary = self.params['ops_base_salary']  # 运营底薪
+            ops_guaranteed_salary = self.params['ops_guaranteed_salary']  # 运营保底工资
+            
+            ops_commission = monthly_revenue * ops_commission_rate  # 运营提成
+            ops_individual = ops_base_salary + ops_commission  # 运营人员总薪酬
+            # 第一年有保底
+            if day <= 365:
+                ops_individual = max(ops_individual, ops_guaranteed_salary)  # 取提成和保底的最大值
+            ops_salary_today = self.state['current_ops'] * ops_individual  # 总运营工资
+        
+        # 4. 计算当日成本
+        # 房租和工资统一在每月最后一天结算
+        costs_today = 0  # 今日总成本
+        
+        # 每日计算耗材成本（治疗和矫正的耗材成本已经在各自的处理逻辑中计算）
+        # 固定成本（房租、工资）只在每月最后一天结算
+        
+        # 检查是否是当月最后一天或模拟最后一天
+        if is_last_day_of_month:
+            # 计算月固定成本
+            # 房租计算：月房租 = 建筑面积 × 日租金 × 当月天数（日历表中预先算好）
+            month_days = date_info['month_days']
+            monthly_rent = self.params['building_area'] * self.params['rent_per_sqm_per_day'] * month_days
+            
+            # 添加水电、市场费用和每月其他成本
+            monthly_utilities = self.params['monthly_utilities']  # 每月水电费
+            monthly_marketing = self.params['monthly_marketing']  # 每月市场费用
+            monthly_other_costs = self.params['monthly_other_costs']  # 每月其他成本
+            
+            # 使用之前计算好的医生和护士工资
+            # 这些工资已经包含了提成和保底
+            costs_today = monthly_rent + monthly_utilities + monthly_marketing + monthly_other_costs + doctor_salary_today + nurse_salary_today
+        
+        # 计算当日确认的卡类收入：办卡当日确认的部分
+        card_recognition_ratio = self.params['card_revenue_recognition_ratio']  # 办卡当日确认营收比例
+        revenue_card_immediate = card_sales_today * card_recognition_ratio  # 当日确认的卡类收入
+        
+        # 计算总卡类营收（当日确认 + 分摊）
+        revenue_card = revenue_card_immediate + revenue_card_amortized  # 总卡类营收
+        
+        # 计算总营收
+        revenue_today = revenue_treatment + revenue_ortho + revenue_card  # 今日总营收
+        
+        # 计算卡类现金流
+        cash_card = cash_new_card + cash_renew_card  # 卡类现金流
+        
+        # 计算利润
+        # 1. 卡类利润：与营收记入方式一致，只要记入营收的，都直接记入利润
+        profit_card = revenue_card  # 卡类营收全部计入利润
+        
+        # 2. 治疗利润：现金流入记入营收，扣减儿牙操作成本后记入利润
+        treatment_material_cost = patient_totals['treatment_material_cost']  # 当日治疗耗材成本
+        profit_treatment = revenue_treatment - treatment_material_cost  # 治疗利润
+        
+        # 3. 矫正利润：矫正开始当次扣减全部成本，结束当次记入营收的全部记入利润
+        ortho_material_cost = patient_totals['ortho_material_cost']  # 当日矫正耗材成本
+        profit_ortho = revenue_ortho - ortho_material_cost  # 矫正利润
+        
+        # 4. 总利润：卡类利润 + 治疗利润 + 矫正利润 - 当月变动成本
+        # 当月变动成本包括：医生工资、护士工资、房租、水电、市场费用等
+        # 这些成本已经包含在costs_today中，只在每月最后一天计算
+        profit_today = profit_card + profit_treatment + profit_ortho - costs_today  # 今日总利润
+        
+        # 5. 更新现金和收入
+        self.state['current_cash'] += cash_today - costs_today  # 更新当前现金余额
+        
+        # 6. 计算各项统计指标
+        # 使用真实日历信息
+        date_info = self.get_date_info(day)
+        formatted_date = date_info['date_str']  # 真实日期字符串
+        
+        total_customers = self.member_counters.customers  # 总客户数：去重的唯一客户（所有历史患者）
+        total_members = self.member_counters.members  # 最终会员数：只有买了会员卡的患者才算
+        patients_seen = patient_totals['patients_seen']  # 就诊人次：今日到店患者数（去重）
+        
+        # 记录每日统计数据：直接写入日数据各列
+        index, columns = self.state['daily_history'].start_day()
+        columns['Day'][index] = day  # 模拟天数
+        columns['Date'][index] = formatted_date  # 真实日期
+        columns['Week'][index] = date_info['week_num']  # 真实周数（ISO周数）
+        columns['Month'][index] = date_info['month']  # 真实月份
+        columns['Year'][index] = date_info['year']  # 真实年份
+        columns['Weekday'][index] = date_info['weekday_name']  # 星期几
+        columns['NewCustomers'][index] = new_customers  # 当日新客户数
+        columns['PatientsSeen'][index] = patients_seen  # 今日就诊人次
+        columns['RevenueTotal'][index] = revenue_today  # 今日总营收
+        columns['Costs'][index] = costs_today  # 今日总成本
+        columns['Profit'][index] = profit_today  # 今日利润
+        columns['CashFlowToday'][index] = cash_today - costs_today  # 今日现金流
+        columns['Cash'][index] = self.state['current_cash']  # 当前现金余额
+        columns['TotalCustomers'][index] = total_customers  # 累计总客户数（去重）
+        columns['TotalMembers'][index] = total_members  # 累计会员数（仅买了会员卡的）
+
+        # 分类营收
+        columns['RevenueCard'][index] = revenue_card  # 卡类营收
+        columns['RevenueTreatment'][index] = revenue_treatment  # 治疗营收
+        columns['RevenueOrtho'][index] = revenue_ortho  # 矫正营收
+        columns['RevenueCardImmediate'][index] = revenue_card_immediate  # 卡类营收中办卡当日确认的部分
+        columns['RevenueCardAmortized'][index] = revenue_card_amortized  # 卡类营收中分摊确认的部分
+
+        # 分类利润
+        columns['ProfitCard'][index] = profit_card  # 卡类利润
+        columns['ProfitTreatment'][index] = profit_treatment  # 治疗利润
+        columns['ProfitOrtho'][index] = profit_ortho  # 矫正利润
+
+        # 分类现金流
+        columns['CashFlowCard'][index] = cash_card  # 卡类现金流
+        columns['CashFlowTreatment'][index] = cash_treatment  # 治疗现金流
+        columns['CashFlowOrtho'][index] = cash_ortho  # 矫正现金流
+        columns['CashNewCard'][index] = cash_new_card  # 新办卡现金流
+        columns['CashRenewCard'][index] = cash_renew_card  # 续卡现金流
+        columns['CashTreatment'][index] = cash_treatment  # 治疗现金流
+        columns['CashOrtho'][index] = cash_ortho  # 矫正现金流
+
+        # 人员工资
+        columns['DoctorSalary'][index] = doctor_salary_today  # 今日医生工资
+        columns['NurseSalary'][index] = nurse_salary_today  # 今日护士工资
+        columns['OpsSalary'][index] = ops_salary_today  # 今日运营工资
+
+        # 保留原始数据但调整顺序，将不重要的字段放在后面
+        columns['Card1YrTotal'][index] = self.state['card_1yr_total']
+        columns['Card5YrTotal'][index] = self.state['card_5yr_total']
+        columns['MonthlyCardRevenue'][index] = self.state['monthly_card_revenue']
+        columns['CardContractLiability'][index] = self.state['card_contract_liability']
+        columns['OrthoContractLiability'][index] = self.state['ortho_contract_liability']
+        columns['CurrentPediatricDoctors'][index] = self.state['current_pediatric_doctors']
+        columns['CurrentOrthoDoctors'][index] = self.state['current_ortho_doctors']
+        columns['CurrentNurses'][index] = self.state['current_nurses']
+        columns['CurrentOps'][index] = self.state['current_ops']
+        columns['ClinicType'][index] = self.params['clinic_type']
+        columns['Source'][index] = 'native'
+        self._commit_day()
+        self.state['revenue_total'] += revenue_today  # 累计总营收
+        self.state['costs_total'] += costs_today  # 累计总成本
+        
+        # 调试模式：用全量统计校验会员计数器
+        if self.params.get('debug_counters'):
+            self.member_counters.verify(self.state['all_patients'])
+    
+    def _simulate_patients(self, day):
+        """
+        对象引擎：逐个患者处理当天的复诊、新客和就诊
+        
+        参数：
+        - day: 模拟天数
+        
+        返回：
+        - 当日患者流汇总（现金流、营收、卡类销售、新客数、就诊人次、耗材成本）
+        """
+        # 今日财务数据初始化
+        cash_today = 0  # 今日现金流
+        revenue_today = 0  # 今日营收
+        
+        # 分类收入和现金流初始化
+        revenue_treatment = 0  # 治疗营收
+        revenue_ortho = 0  # 矫正营收
+        
+        cash_new_card = 0  # 新办卡现金流
+        cash_renew_card = 0  # 续卡现金流
+        cash_treatment = 0  # 治疗现金流
+        cash_ortho = 0  # 矫正现金流
+        
+        todays_visitors = []  # 今日到店患者列表
+        new_customers = 0  # 今日新客户数
+        
+        card_sales_today = 0  # 今日新办卡和续卡的总金额
+        
         # 1. 老患者复诊处理（仅处理到店患者的复诊）
         # 注：原续卡逻辑已删除，新续卡逻辑移至患者就诊处理中
-        for p in self.state['all_patients']:  # 遍历所有患者
-            if not p.is_active: continue  # 跳过非活跃患者
-            
+        # 只有当诊所类型是ortho时才处理矫正复诊
+        due_patients = self.appointment_book.pop_due(day, include_ortho=self.params['clinic_type'] == 'ortho')
+        for p in due_patients:  # 遍历今天有预约的活跃患者
             # 复诊判定：如果今天有常规预约或矫正复诊
-            is_ortho_appointment = False  # 标记是否为矫正复诊
-            # 只有当诊所类型是ortho时才处理矫正复诊
-            if p.next_appointment_day == day or (self.params['clinic_type'] == 'ortho' and p.next_ortho_appointment == day):
-                # 处理矫正复诊
-                if self.params['clinic_type'] == 'ortho' and p.next_ortho_appointment == day:
-                    is_ortho_appointment = True  # 标记为矫正复诊
-                    
-                    # 检查是否是最后一次矫正复诊（矫正完成）
-                    # 假设总共24次复诊，每次间隔45天，总时长约3年
-                    total_ortho_days = 45 * 24
-                    if day - p.ortho_start_day >= total_ortho_days and not getattr(p, 'ortho_completed', False):
-                        # 矫正完成，不产生耗材费用，营收记入剩余的45%
-                        if hasattr(p, 'ortho_revenue_remaining') and p.ortho_revenue_remaining > 0:
-                            # 记录矫正完成的营收
-                            revenue_ortho += p.ortho_revenue_remaining
-                            
-                            week_num = (day - 1) // 7 + 1  # 计算当前周数
-                            
-                            # 获取日期信息，包括星期几
-                            date_info = self.get_date_info(day)
-                            formatted_date = date_info['date'].strftime('%Y-%m-%d')
-                            
-                            # 记录患者详细信息
-                            self.state['patient_details'].append({
-                                'PatientID': p.id,  # 患者ID
-                                'Day': day,  # 模拟天数
-                                'Date': formatted_date,  # 实际日期
-                                'Week': week_num,  # 周数
-                                'Weekday': date_info['weekday_name'],  # 星期几
-                                'Age': p.initial_age + (day - p.join_day) // 365,  # 当前年龄
-                                'Action': '矫正结束',  # 行为类型
-                                'CardType': p.card_type,  # 卡类型
-                                'Amount': p.ortho_total_cost,  # 总费用
-                                'RevenueType': '矫正收入',  # 收入类型
-                                'CashFlow': 0,  # 矫正结束不产生现金流
-                                'Costs': 0,  # 矫正结束不产生耗材费用
-                                'Profit': p.ortho_revenue_remaining,  # 利润为剩余营收
-                                'Description': f'患者矫正完成，记入剩余营收{p.ortho_revenue_remaining:.2f}元（45%），无额外耗材费用'
-                            })
-                            
-                            # 记录患者行为透视表数据
-                            self.state['pivot_records'].append({
-                                'PatientID': f'P{p.id:03}', 
-                                'Day': f'D{day:03}', 
-                                'Val': f'Ortho End(rev:+{p.ortho_revenue_remaining:.2f})', 
-                                'Age': p.initial_age + (day - p.join_day) // 365, 
-                                'Source': p.source
-                            })
-                            
-                            # 标记矫正已完成
-                            p.ortho_completed = True  # 标记矫正已完成
-                            p.ortho_end_day = day  # 记录矫正结束日期
-                            p.ortho_revenue_remaining = 0  # 剩余营收清零
+            # 处理矫正复诊
+            if self.params['clinic_type'] == 'ortho' and p.next_ortho_appointment == day:
+                # 检查是否是最后一次矫正复诊（矫正完成）
+                # 假设总共24次复诊，每次间隔45天，总时长约3年
+                total_ortho_days = 45 * 24
+                if day - p.ortho_start_day >= total_ortho_days and not p.ortho_completed:
+                    # 矫正完成，不产生耗材费用，营收记入剩余的45%
+                    if p.ortho_revenue_remaining > 0:
+                        # 记录矫正完成的营收
+                        revenue_ortho += p.ortho_revenue_remaining
                         
-                        p.next_ortho_appointment = None  # 矫正完成后不再有矫正复诊
-                    else:
-                        p.next_ortho_appointment = day + 45  # 不是最后一次复诊，继续预约下一次
+                        # 记录患者详细信息
+                        self._log_event(PatientEvent(
+                            action=ORTHO_END,
+                            patient_id=p.id,
+                            day=day,
+                            age=p.initial_age + (day - p.join_day) // 365,
+                            card_type=p.card_type,
+                            source=None,  # 矫正结束事件不记录患者来源
+                            amount=p.ortho_total_cost,
+                            cash_flow=0,
+                            costs=0,
+                            profit=p.ortho_revenue_remaining
+                        ))
+                        
+                        # 记录患者行为透视表数据
+                        self.state['behavior'].add(p.id, day, BEHAVIOR_ORTHO_END, p.ortho_revenue_remaining)
+                        
+                        # 标记矫正已完成
+                        p.ortho_completed = True  # 标记矫正已完成
+                        p.ortho_end_day = day  # 记录矫正结束日期
+                        p.ortho_revenue_remaining = 0  # 剩余营收清零
                     
-                    todays_visitors.append(p)  # 添加到今日到店患者列表
+                    p.next_ortho_appointment = None  # 矫正完成后不再有矫正复诊
+                else:
+                    p.next_ortho_appointment = day + 45  # 不是最后一次复诊，继续预约下一次
                 
-                # 处理常规复诊
-                if p.next_appointment_day == day:
-                    if random.random() < self.params['prob_follow_up']:  # 判定是否复诊
-                        todays_visitors.append(p)  # 添加到今日到店患者列表
-                    else:
-                        p.next_appointment_day = day + 30  # 未赴约，推迟30天再联系
+                todays_visitors.append(p)  # 添加到今日到店患者列表
+            
+            # 处理常规复诊
+            if p.next_appointment_day == day:
+                if self.random_streams.follow_up.random() < self.params['prob_follow_up']:  # 判定是否复诊
+                    todays_visitors.append(p)  # 添加到今日到店患者列表
+                else:
+                    p.next_appointment_day = day + 30  # 未赴约，推迟30天再联系
         
         # 2. 获取新初诊客户
         # 根据是否启用爬坡计算增长因子
@@ -446,25 +940,27 @@ class SimulationManager:
             # 禁用爬坡：增长因子始终为1.0
             growth_factor = 1.0
         # 生成每日新客数量，基于高斯分布
-        num_new_leads = max(0, int(random.gauss(self.params['daily_new_leads_base'], 1) * growth_factor))
+        num_new_leads = max(0, int(self.random_streams.arrivals.normal(self.params['daily_new_leads_base'], 1) * growth_factor))
         new_customers = 0  # 初始化为0，实际新客户数
         
         # 处理每个新客户
         for _ in range(num_new_leads):
             self.state['patient_counter'] += 1  # 增加患者ID计数器
             # 根据年龄分布随机选择初始年龄
-            initial_age = random.choices(self.age_list, weights=self.age_probs, k=1)[0]
-            new_p = Patient(self.state['patient_counter'], day, initial_age)  # 创建新患者对象
+            initial_age = int(self.random_streams.arrivals.choice(self.age_list, p=self.age_probs))
+            new_p = Patient(self.state['patient_counter'], day, initial_age,
+                            appointment_book=self.appointment_book,
+                            member_counters=self.member_counters)  # 创建新患者对象
             
-            roll = random.random()  # 生成随机数用于判定办卡类型
-            action_desc = "Initial visit"  # 患者行为描述
+            roll = self.random_streams.arrivals.random()  # 生成随机数用于判定办卡类型
+            behavior_code = BEHAVIOR_INITIAL_VISIT  # 患者行为编码
             card_rev = 0  # 卡类收入
             card_type = None  # 卡类型
             
             # 判定是否办1年卡
             if roll < self.params['prob_card_1yr']:
                 card_rev = new_p.buy_card('1yr', day, self.params['price_card_1yr'])  # 患者购买1年卡
-                action_desc += f"+Buy 1yr card(+{card_rev})"  # 更新行为描述
+                behavior_code = BEHAVIOR_INITIAL_VISIT_1YR  # 初诊并办1年卡
                 cash_today += card_rev  # 更新今日现金流
                 cash_new_card += card_rev  # 更新新办卡现金流
                 self.state['card_1yr_total'] += card_rev  # 更新1年卡总收入
@@ -474,46 +970,29 @@ class SimulationManager:
             # 判定是否办5年卡
             elif roll < (self.params['prob_card_1yr'] + self.params['prob_card_5yr']):
                 card_rev = new_p.buy_card('5yr', day, self.params['price_card_5yr'])  # 患者购买5年卡
-                action_desc += f"+Buy 5yr card(+{card_rev})"  # 更新行为描述
+                behavior_code = BEHAVIOR_INITIAL_VISIT_5YR  # 初诊并办5年卡
                 cash_today += card_rev  # 更新今日现金流
                 cash_new_card += card_rev  # 更新新办卡现金流
                 self.state['card_5yr_total'] += card_rev  # 更新5年卡总收入
                 card_sales_today += card_rev  # 更新今日卡类销售总额
                 card_type = '5年卡'  # 设置卡类型
             
-            week_num = (day - 1) // 7 + 1  # 计算当前周数
-            
-            # 获取日期信息，包括星期几
-            date_info = self.get_date_info(day)
-            formatted_date = date_info['date'].strftime('%Y-%m-%d')
-            
             # 记录患者详细信息
-            self.state['patient_details'].append({
-                'PatientID': new_p.id,  # 患者ID
-                'Day': day,  # 模拟天数
-                'Date': formatted_date,  # 实际日期
-                'Week': week_num,  # 周数
-                'Weekday': date_info['weekday_name'],  # 星期几
-                'Age': initial_age,  # 初始年龄
-                'Action': '初诊',  # 行为类型
-                'CardType': card_type,  # 卡类型
-                'Amount': card_rev,  # 金额
-                'RevenueType': '卡类收入' if card_rev > 0 else '初诊',  # 收入类型
-                'CashFlow': card_rev,  # 现金流
-                'Costs': 0,  # 初诊成本已包含在固定成本中
-                'Profit': card_rev,  # 利润
-                'Description': f'患者初诊，{f"购买{card_type}，" if card_type else ""}金额{card_rev}元',  # 描述
-                'Source': new_p.source  # 患者来源
-            })
+            self._log_event(PatientEvent(
+                action=FIRST_VISIT,
+                patient_id=new_p.id,
+                day=day,
+                age=initial_age,
+                card_type=card_type,
+                source=new_p.source,
+                amount=card_rev,
+                cash_flow=card_rev,
+                costs=0,
+                profit=card_rev
+            ))
             
             # 记录患者行为透视表数据
-            self.state['pivot_records'].append({
-                'PatientID': f'P{new_p.id:03}', 
-                'Day': f'D{day:03}', 
-                'Val': action_desc, 
-                'Age': initial_age, 
-                'Source': new_p.source
-            })
+            self.state['behavior'].add(new_p.id, day, behavior_code, card_rev)
             
             # 设置新患者的初始复诊日期
             follow_up_cycle = self.params['follow_up_cycle']  # 复诊周期
@@ -530,44 +1009,27 @@ class SimulationManager:
         for p in todays_visitors:  # 遍历今日到店患者
             current_age = p.initial_age + (day - p.join_day) // 365  # 计算当前年龄
             
-            week_num = (day - 1) // 7 + 1  # 计算当前周数
-            
-            # 获取日期信息，包括星期几
-            date_info = self.get_date_info(day)
-            formatted_date = date_info['date'].strftime('%Y-%m-%d')
-            
             # 记录患者就诊信息
             if p.next_appointment_day == day or p.next_ortho_appointment == day:
                 # 这是一个复诊患者
-                self.state['patient_details'].append({
-                    'PatientID': p.id,  # 患者ID
-                    'Day': day,  # 模拟天数
-                    'Date': formatted_date,  # 实际日期
-                    'Week': week_num,  # 周数
-                    'Weekday': date_info['weekday_name'],  # 星期几
-                    'Age': current_age,  # 当前年龄
-                    'Action': '复诊',  # 行为类型
-                    'CardType': p.card_type,  # 卡类型
-                    'Amount': 0,  # 金额
-                    'RevenueType': '复诊',  # 收入类型
-                    'CashFlow': 0,  # 现金流
-                    'Costs': 0,  # 成本
-                    'Profit': 0,  # 利润
-                    'Description': f'患者复诊',  # 描述
-                    'Source': p.source  # 患者来源
-                })
+                self._log_event(PatientEvent(
+                    action=FOLLOW_UP,
+                    patient_id=p.id,
+                    day=day,
+                    age=current_age,
+                    card_type=p.card_type,
+                    source=p.source,
+                    amount=0,
+                    cash_flow=0,
+                    costs=0,
+                    profit=0
+                ))
                 
                 # 记录患者行为透视表数据
-                self.state['pivot_records'].append({
-                    'PatientID': f'P{p.id:03}', 
-                    'Day': f'D{day:03}', 
-                    'Val': f'Follow-up', 
-                    'Age': current_age, 
-                    'Source': p.source
-                })
+                self.state['behavior'].add(p.id, day, BEHAVIOR_FOLLOW_UP)
             
             # 随机判定是否进行治疗
-            if random.random() < self.params['prob_treatment']:
+            if self.random_streams.treatment.random() < self.params['prob_treatment']:
                 discount = 0.65 if p.card_expiry_day > 0 else 1.0  # 检查是否有治疗折扣（会员卡65折）
                 treatment_cost = int(self.params['price_treatment'] * discount)  # 计算治疗费用
                 cash_today += treatment_cost  # 更新今日现金流
@@ -577,40 +1039,22 @@ class SimulationManager:
                 material_cost = treatment_cost * self.params['pediatric_material_ratio']  # 计算耗材成本
                 profit = treatment_cost - material_cost  # 计算利润
                 
-                # 计算当前周数
-                week_num = (day - 1) // 7 + 1
-                
-                # 获取日期信息，包括星期几
-                date_info = self.get_date_info(day)
-                formatted_date = date_info['date'].strftime('%Y-%m-%d')
-                
                 # 记录患者详细信息
-                self.state['patient_details'].append({
-                    'PatientID': p.id,  # 患者ID
-                    'Day': day,  # 模拟天数
-                    'Date': formatted_date,  # 实际日期
-                    'Week': week_num,  # 周数
-                    'Weekday': date_info['weekday_name'],  # 星期几
-                    'Age': current_age,  # 当前年龄
-                    'Action': '治疗',  # 行为类型
-                    'CardType': p.card_type,  # 卡类型
-                    'Amount': treatment_cost,  # 金额
-                    'RevenueType': '治疗收入',  # 收入类型
-                    'CashFlow': treatment_cost,  # 现金流
-                    'Costs': material_cost,  # 成本
-                    'Profit': profit,  # 利润
-                    'Description': f'患者接受基础治疗，收入{treatment_cost}元，耗材成本{material_cost:.2f}元，利润{profit:.2f}元',  # 描述
-                    'Source': p.source  # 患者来源
-                })
+                self._log_event(PatientEvent(
+                    action=TREATMENT,
+                    patient_id=p.id,
+                    day=day,
+                    age=current_age,
+                    card_type=p.card_type,
+                    source=p.source,
+                    amount=treatment_cost,
+                    cash_flow=treatment_cost,
+                    costs=material_cost,
+                    profit=profit
+                ))
                 
                 # 记录患者行为透视表数据
-                self.state['pivot_records'].append({
-                    'PatientID': f'P{p.id:03}', 
-                    'Day': f'D{day:03}', 
-                    'Val': f'Treatment(+{treatment_cost})', 
-                    'Age': current_age, 
-                    'Source': p.source
-                })
+                self.state['behavior'].add(p.id, day, BEHAVIOR_TREATMENT, treatment_cost)
             
             # 续卡判定：只有当天到店的患者，且卡有效期在正负365天内才会判定续卡
             if p.card_expiry_day > 0:  # 有有效的会员卡
@@ -619,13 +1063,7 @@ class SimulationManager:
                 # 如果到期日与就诊日相差正负365天内
                 if abs(expiry_diff) < 365:
                     current_age = p.initial_age + (day - p.join_day) // 365  # 计算当前年龄
-                    roll = random.random()  # 生成随机数用于判定续卡类型
-                    
-                    week_num = (day - 1) // 7 + 1  # 计算当前周数
-                    
-                    # 获取日期信息，包括星期几
-                    date_info = self.get_date_info(day)
-                    formatted_date = date_info['date'].strftime('%Y-%m-%d')
+                    roll = self.random_streams.renewal.random()  # 生成随机数用于判定续卡类型
                     
                     # 判定续1年卡
                     if roll < self.params['prob_renew_1yr']:
@@ -636,32 +1074,21 @@ class SimulationManager:
                         card_sales_today += amt  # 更新今日卡类销售总额
                         
                         # 记录患者详细信息
-                        self.state['patient_details'].append({
-                            'PatientID': p.id,  # 患者ID
-                            'Day': day,  # 模拟天数
-                            'Date': formatted_date,  # 实际日期
-                            'Week': week_num,  # 周数
-                            'Weekday': date_info['weekday_name'],  # 星期几
-                            'Age': current_age,  # 当前年龄
-                            'Action': '续卡',  # 行为类型
-                            'CardType': '1年卡',  # 卡类型
-                            'Amount': amt,  # 金额
-                            'RevenueType': '卡类收入',  # 收入类型
-                            'CashFlow': amt,  # 现金流
-                            'Costs': 0,  # 续卡无直接成本
-                            'Profit': amt,  # 利润
-                            'Description': f'患者续1年卡，金额{amt}元',  # 描述
-                            'Source': p.source  # 患者来源
-                        })
+                        self._log_event(PatientEvent(
+                            action=RENEWAL,
+                            patient_id=p.id,
+                            day=day,
+                            age=current_age,
+                            card_type='1年卡',
+                            source=p.source,
+                            amount=amt,
+                            cash_flow=amt,
+                            costs=0,
+                            profit=amt
+                        ))
                         
                         # 记录患者行为透视表数据
-                        self.state['pivot_records'].append({
-                            'PatientID': f'P{p.id:03}', 
-                            'Day': f'D{day:03}', 
-                            'Val': f'Renew 1yr card(+{amt})', 
-                            'Age': current_age, 
-                            'Source': p.source
-                        })
+                        self.state['behavior'].add(p.id, day, BEHAVIOR_RENEW_1YR, amt)
                     
                     # 判定续5年卡
                     elif roll < (self.params['prob_renew_1yr'] + self.params['prob_renew_5yr']):
@@ -672,32 +1099,21 @@ class SimulationManager:
                         card_sales_today += amt  # 更新今日卡类销售总额
                         
                         # 记录患者详细信息
-                        self.state['patient_details'].append({
-                            'PatientID': p.id,  # 患者ID
-                            'Day': day,  # 模拟天数
-                            'Date': formatted_date,  # 实际日期
-                            'Week': week_num,  # 周数
-                            'Weekday': date_info['weekday_name'],  # 星期几
-                            'Age': current_age,  # 当前年龄
-                            'Action': '续卡',  # 行为类型
-                            'CardType': '5年卡',  # 卡类型
-                            'Amount': amt,  # 金额
-                            'RevenueType': '卡类收入',  # 收入类型
-                            'CashFlow': amt,  # 现金流
-                            'Costs': 0,  # 续卡无直接成本
-                            'Profit': amt,  # 利润
-                            'Description': f'患者续5年卡，金额{amt}元',  # 描述
-                            'Source': p.source  # 患者来源
-                        })
+                        self._log_event(PatientEvent(
+                            action=RENEWAL,
+                            patient_id=p.id,
+                            day=day,
+                            age=current_age,
+                            card_type='5年卡',
+                            source=p.source,
+                            amount=amt,
+                            cash_flow=amt,
+                            costs=0,
+                            profit=amt
+                        ))
                         
                         # 记录患者行为透视表数据
-                        self.state['pivot_records'].append({
-                            'PatientID': f'P{p.id:03}', 
-                            'Day': f'D{day:03}', 
-                            'Val': f'Renew 5yr card(+{amt})', 
-                            'Age': current_age, 
-                            'Source': p.source
-                        })
+                        self.state['behavior'].add(p.id, day, BEHAVIOR_RENEW_5YR, amt)
             
             # 随机判定是否进行矫正 - 根据年龄调整概率
             # 只有当诊所类型是ortho时才允许矫正
@@ -715,7 +1131,7 @@ class SimulationManager:
                     age_ortho_prob = base_ortho_prob * 5.0  # 11-14岁概率高
                 
                 # 判定是否进行矫正
-                if random.random() < age_ortho_prob:
+                if self.random_streams.ortho.random() < age_ortho_prob:
                     ortho_cost = self.params['price_ortho']  # 基础矫正价格
                     discount = 0.65 if p.card_expiry_day > 0 else 1.0  # 检查是否有治疗折扣（会员卡65折）
                     ortho_cost = int(ortho_cost * discount)  # 计算实际矫正费用
@@ -729,39 +1145,22 @@ class SimulationManager:
                     material_cost = ortho_cost * self.params['ortho_material_ratio']  # 计算耗材成本
                     profit = ortho_cost * 0.55 - material_cost  # 计算利润
                     
-                    week_num = (day - 1) // 7 + 1  # 计算当前周数
-                    
-                    # 获取日期信息，包括星期几
-                    date_info = self.get_date_info(day)
-                    formatted_date = date_info['date'].strftime('%Y-%m-%d')
-                    
                     # 记录患者详细信息
-                    self.state['patient_details'].append({
-                        'PatientID': p.id,  # 患者ID
-                        'Day': day,  # 模拟天数
-                        'Date': formatted_date,  # 实际日期
-                        'Week': week_num,  # 周数
-                        'Weekday': date_info['weekday_name'],  # 星期几
-                        'Age': current_age,  # 当前年龄
-                        'Action': '矫正开始',  # 行为类型
-                        'CardType': p.card_type,  # 卡类型
-                        'Amount': ortho_cost,  # 金额
-                        'RevenueType': '矫正收入',  # 收入类型
-                        'CashFlow': ortho_cost,  # 现金流是全额
-                        'Costs': material_cost,  # 成本
-                        'Profit': profit,  # 利润
-                        'Description': f'患者开始矫正，现金流{ortho_cost:.2f}元（总费用{ortho_cost}元），记入营收{ortho_cost * 0.55:.2f}元（55%），耗材成本{material_cost:.2f}元，利润{profit:.2f}元',  # 描述
-                        'Source': p.source  # 患者来源
-                    })
+                    self._log_event(PatientEvent(
+                        action=ORTHO_START,
+                        patient_id=p.id,
+                        day=day,
+                        age=current_age,
+                        card_type=p.card_type,
+                        source=p.source,
+                        amount=ortho_cost,
+                        cash_flow=ortho_cost,
+                        costs=material_cost,
+                        profit=profit
+                    ))
                     
                     # 记录患者行为透视表数据
-                    self.state['pivot_records'].append({
-                        'PatientID': f'P{p.id:03}', 
-                        'Day': f'D{day:03}', 
-                        'Val': f'Ortho Start(+{ortho_cost:.2f}, rev:{ortho_cost * 0.55:.2f})', 
-                        'Age': current_age, 
-                        'Source': p.source
-                    })
+                    self.state['behavior'].add(p.id, day, BEHAVIOR_ORTHO_START, ortho_cost)
                     
                     # 设置矫正相关属性
                     p.has_ortho = True  # 标记已进行矫正
@@ -776,400 +1175,215 @@ class SimulationManager:
                 follow_up_cycle = self.params['follow_up_cycle']  # 获取复诊周期
                 p.next_appointment_day = day + follow_up_cycle  # 设置下次复诊日期
         
-        # 计算医生和护士工资
-        doctor_salary_today = 0  # 今日医生工资
-        nurse_salary_today = 0  # 今日护士工资
-        ops_salary_today = 0  # 今日运营工资
-        
-        # 获取真实日期信息
-        date_info = self.get_date_info(day)
-        current_month = date_info['month']
-        current_year = date_info['year']
-        
-        # 检查是否是当月最后一天
-        next_day_info = self.get_date_info(day + 1)  # 获取次日信息
-        is_last_day_of_month = (next_day_info['month'] != current_month) or day == int(self.params['years'] * 365)
-        
-        # 人员配置管理：增加医生的逻辑
-        # 计算平均单医生会员总数，当>阈值时增加儿牙医生
-        total_doctors = self.state['current_pediatric_doctors'] + self.state['current_ortho_doctors']
-        if total_doctors > 0:
-            current_members = len([p for p in self.state['all_patients'] if p.is_active and p.card_type is not None])
-            avg_members_per_doctor = current_members / total_doctors
-            doctor_threshold = self.params['doctor_threshold']
-            # 如果平均单医生会员总数>阈值，增加1个儿牙医生（最多2个儿牙医生）
-            if avg_members_per_doctor > doctor_threshold and self.state['current_pediatric_doctors'] < 2:
-                self.state['current_pediatric_doctors'] += 1
-        
-        # 只在每月最后一天计算工资
-        if is_last_day_of_month:
-            # 计算医生薪酬：底薪+提成+保底
-            # 提成基于月度总营收（权责发生制）
-            
-            # 计算月度总营收
-            monthly_revenue = 0  # 月度总营收
-            monthly_pediatric_revenue = 0  # 月度儿牙营收
-            monthly_ortho_revenue = 0  # 月度矫正营收
-            
-            # 获取当月的日数据
-            for d in reversed(self.state['daily_history']):
-                if d['Month'] == current_month:
-                    monthly_revenue += d['RevenueTotal']  # 累计总营收
-                    monthly_pediatric_revenue += d.get('RevenueTreatment', 0)  # 累计儿牙营收
-                    monthly_ortho_revenue += d.get('RevenueOrtho', 0)  # 累计矫正营收
-            
-            # 医生薪酬计算
-            doctor_commission_rate = self.params['doctor_commission_rate']  # 医生提成比例
-            doctor_base_salary = self.params['doctor_base_salary']  # 医生底薪
-            doctor_guaranteed_salary = self.params['doctor_guaranteed_salary']  # 医生保底工资
-            doctor_guaranteed_months = self.params['doctor_guaranteed_months']  # 医生保底时长（月）
-            
-            # 儿牙医生薪酬
-            pediatric_doctor_commission = monthly_pediatric_revenue * doctor_commission_rate  # 儿牙医生提成
-            pediatric_doctor_total = doctor_base_salary + pediatric_doctor_commission  # 儿牙医生总薪酬
-            # 保底期内有保底
-            if day <= doctor_guaranteed_months * 30:  # 转换为天数比较
-                pediatric_doctor_total = max(pediatric_doctor_total, doctor_guaranteed_salary)  # 取提成和保底的最大值
-            
-            # 矫正医生薪酬
-            ortho_doctor_commission = monthly_ortho_revenue * doctor_commission_rate  # 矫正医生提成
-            ortho_doctor_total = doctor_base_salary + ortho_doctor_commission  # 矫正医生总薪酬
-            # 保底期内有保底
-            if day <= doctor_guaranteed_months * 30:  # 转换为天数比较
-                ortho_doctor_total = max(ortho_doctor_total, doctor_guaranteed_salary)  # 取提成和保底的最大值
-            
-            # 使用当前人员数量计算工资
-            doctor_salary_today = (self.state['current_pediatric_doctors'] * pediatric_doctor_total) + \
-                                  (self.state['current_ortho_doctors'] * ortho_doctor_total)  # 总医生工资
-            
-            # 护士薪酬计算
-            nurse_commission_rate = self.params['nurse_commission_rate']  # 护士提成比例
-            nurse_base_salary = self.params['nurse_base_salary']  # 护士底薪
-            nurse_guaranteed_salary = self.params['nurse_guaranteed_salary']  # 护士保底工资
-            nurse_guaranteed_months = self.params['nurse_guaranteed_months']  # 护士保底时长（月）
-            
-            nurse_commission = monthly_revenue * nurse_commission_rate  # 护士提成
-            nurse_individual = nurse_base_salary + nurse_commission  # 单个护士总薪酬
-            # 保底期内有保底
-            if day <= nurse_guaranteed_months * 30:  # 转换为天数比较
-                nurse_individual = max(nurse_individual, nurse_guaranteed_salary)  # 取提成和保底的最大值
-            nurse_salary_today = self.state['current_nurses'] * nurse_individual  # 总护士工资
-            
-            # 运营薪酬计算
-            ops_commission_rate = self.params['ops_commission_rate']  # 运营提成比例
-            ops_base_salary = self.params['ops_base_salary']  # 运营底薪
-            ops_guaranteed_salary = self.params['ops_guaranteed_salary']  # 运营保底工资
-            
-            ops_commission = monthly_revenue * ops_commission_rate  # 运营提成
-            ops_individual = ops_base_salary + ops_commission  # 运营人员总薪酬
-            # 第一年有保底
-            if day <= 365:
-                ops_individual = max(ops_individual, ops_guaranteed_salary)  # 取提成和保底的最大值
-            ops_salary_today = self.state['current_ops'] * ops_individual  # 总运营工资
-        
-        # 4. 计算当日成本
-        # 房租和工资统一在每月最后一天结算
-        costs_today = 0  # 今日总成本
-        
-        # 每日计算耗材成本（治疗和矫正的耗材成本已经在各自的处理逻辑中计算）
-        # 固定成本（房租、工资）只在每月最后一天结算
-        
-        # 检查是否是当月最后一天或模拟最后一天
-        if is_last_day_of_month:
-            # 计算月固定成本
-            # 房租计算：月房租 = 建筑面积 × 日租金 × 当月天数
-            # 使用真实日历计算当月天数
-            # 找到当月的第一天
-            month_days = 0
-            for date_info in self.calendar:
-                if date_info['year'] == current_year and date_info['month'] == current_month:
-                    month_days += 1
-            
-            # 如果在日历范围外，计算下一个月的第一天，然后减去当前月的第一天
-            if month_days == 0:
-                # 计算当前月的第一天
-                current_month_start = datetime(current_year, current_month, 1)
-                # 计算下一个月的第一天
-                if current_month == 12:
-                    next_month_start = datetime(current_year + 1, 1, 1)
-                else:
-                    next_month_start = datetime(current_year, current_month + 1, 1)
-                # 计算当月天数
-                month_days = (next_month_start - current_month_start).days
-            
-            monthly_rent = self.params['building_area'] * self.params['rent_per_sqm_per_day'] * month_days
-            
-            # 添加水电、市场费用和每月其他成本
-            monthly_utilities = self.params['monthly_utilities']  # 每月水电费
-            monthly_marketing = self.params['monthly_marketing']  # 每月市场费用
-            monthly_other_costs = self.params['monthly_other_costs']  # 每月其他成本
-            
-            # 使用之前计算好的医生和护士工资
-            # 这些工资已经包含了提成和保底
-            costs_today = monthly_rent + monthly_utilities + monthly_marketing + monthly_other_costs + doctor_salary_today + nurse_salary_today
-        
-        # 计算当日确认的卡类收入：办卡当日确认的部分
-        card_recognition_ratio = self.params['card_revenue_recognition_ratio']  # 办卡当日确认营收比例
-        revenue_card_immediate = card_sales_today * card_recognition_ratio  # 当日确认的卡类收入
-        
-        # 计算总卡类营收（当日确认 + 分摊）
-        revenue_card = revenue_card_immediate + revenue_card_amortized  # 总卡类营收
-        
-        # 计算总营收
-        revenue_today = revenue_treatment + revenue_ortho + revenue_card  # 今日总营收
-        
-        # 计算卡类现金流
-        cash_card = cash_new_card + cash_renew_card  # 卡类现金流
-        
-        # 计算利润
-        # 1. 卡类利润：与营收记入方式一致，只要记入营收的，都直接记入利润
-        profit_card = revenue_card  # 卡类营收全部计入利润
-        
-        # 2. 治疗利润：现金流入记入营收，扣减儿牙操作成本后记入利润
-        treatment_material_cost = 0  # 当日治疗耗材成本
-        # 从patient_details中查找今日的治疗记录，计算耗材成本
-        for record in self.state['patient_details']:
-            if record['Day'] == day and record['Action'] == '治疗':
-                treatment_material_cost += record['Costs']
-        profit_treatment = revenue_treatment - treatment_material_cost  # 治疗利润
-        
-        # 3. 矫正利润：矫正开始当次扣减全部成本，结束当次记入营收的全部记入利润
-        ortho_material_cost = 0  # 当日矫正耗材成本
-        # 从patient_details中查找今日的矫正记录，计算耗材成本
-        for record in self.state['patient_details']:
-            if record['Day'] == day and record['Action'] == '矫正开始':
-                ortho_material_cost += record['Costs']
-        profit_ortho = revenue_ortho - ortho_material_cost  # 矫正利润
-        
-        # 4. 总利润：卡类利润 + 治疗利润 + 矫正利润 - 当月变动成本
-        # 当月变动成本包括：医生工资、护士工资、房租、水电、市场费用等
-        # 这些成本已经包含在costs_today中，只在每月最后一天计算
-        profit_today = profit_card + profit_treatment + profit_ortho - costs_today  # 今日总利润
-        
-        # 5. 更新现金和收入
-        self.state['current_cash'] += cash_today - costs_today  # 更新当前现金余额
-        
-        # 6. 计算各项统计指标
-        # 使用真实日历信息
-        date_info = self.get_date_info(day)
-        formatted_date = date_info['date'].strftime('%Y-%m-%d')  # 真实日期字符串
-        
-        total_customers = len(self.state['all_patients'])  # 总客户数：去重的唯一客户（所有历史患者）
-        total_members = len([p for p in self.state['all_patients'] if p.is_active and p.card_type is not None])  # 最终会员数：只有买了会员卡的患者才算
         # 去重患者，避免同一患者多次到店被重复统计
         unique_patients = list(set(todays_visitors))
-        patients_seen = len(unique_patients)  # 就诊人次：今日到店患者数（去重）
-        
-        # 记录每日统计数据
-        self.state['daily_history'].append({
-            'Day': day,  # 模拟天数
-            'Date': formatted_date,  # 真实日期
-            'Week': date_info['week_num'],  # 真实周数（ISO周数）
-            'Month': date_info['month'],  # 真实月份
-            'Year': date_info['year'],  # 真实年份
-            'Weekday': date_info['weekday_name'],  # 星期几
-            'NewCustomers': new_customers,  # 当日新客户数
-            'PatientsSeen': patients_seen,  # 今日就诊人次
-            'RevenueTotal': revenue_today,  # 今日总营收
-            'Costs': costs_today,  # 今日总成本
-            'Profit': profit_today,  # 今日利润
-            'CashFlowToday': cash_today - costs_today,  # 今日现金流
-            'Cash': self.state['current_cash'],  # 当前现金余额
-            'TotalCustomers': total_customers,  # 累计总客户数（去重）
-            'TotalMembers': total_members,  # 累计会员数（仅买了会员卡的）
-            
-            # 分类营收
-            'RevenueCard': revenue_card,  # 卡类营收
-            'RevenueTreatment': revenue_treatment,  # 治疗营收
-            'RevenueOrtho': revenue_ortho,  # 矫正营收
-            
-            # 分类利润
-            'ProfitCard': profit_card,  # 卡类利润
-            'ProfitTreatment': profit_treatment,  # 治疗利润
-            'ProfitOrtho': profit_ortho,  # 矫正利润
-            
-            # 分类现金流
-            'CashFlowCard': cash_card,  # 卡类现金流
-            'CashFlowTreatment': cash_treatment,  # 治疗现金流
-            'CashFlowOrtho': cash_ortho,  # 矫正现金流
-            
-            # 人员工资
-            'DoctorSalary': doctor_salary_today,  # 今日医生工资
-            'NurseSalary': nurse_salary_today,  # 今日护士工资
-            'OpsSalary': ops_salary_today,  # 今日运营工资
-            
-            # 保留原始数据但调整顺序，将不重要的字段放在后面
-            'Card1YrTotal': self.state['card_1yr_total'],
-            'Card5YrTotal': self.state['card_5yr_total'],
-            'MonthlyCardRevenue': self.state['monthly_card_revenue'],
-            'CardContractLiability': self.state['card_contract_liability'],
-            'OrthoContractLiability': self.state['ortho_contract_liability'],
-            'CurrentPediatricDoctors': self.state['current_pediatric_doctors'],
-            'CurrentOrthoDoctors': self.state['current_ortho_doctors'],
-            'CurrentNurses': self.state['current_nurses'],
-            'CurrentOps': self.state['current_ops']
-        })
         
-        # 更新患者详细记录中的月份
-        for record in self.state['patient_details']:
-            if record['Day'] == day and 'Month' not in record:
-                record['Month'] = current_month  # 添加月份字段
+        return {
+            'cash_today': cash_today,
+            'cash_new_card': cash_new_card,
+            'cash_renew_card': cash_renew_card,
+            'cash_treatment': cash_treatment,
+            'cash_ortho': cash_ortho,
+            'revenue_treatment': revenue_treatment,
+            'revenue_ortho': revenue_ortho,
+            'card_sales': card_sales_today,
+            'new_customers': new_customers,
+            'patients_seen': len(unique_patients),  # 就诊人次：今日到店患者数（去重）
+            # 当日耗材成本：事件账本写入时已按行为类型累计
+            'treatment_material_cost': self.state['patient_details'].day_cost(day, TREATMENT),
+            'ortho_material_cost': self.state['patient_details'].day_cost(day, ORTHO_START),
+        }
+    
+    def _log_event(self, event):
+        """记录一条患者事件（PatientEvent）到事件账本，日期信息按天保存一份"""
+        self.state['patient_details'].append(event, self.get_date_info(event.day))
+    
+    def _commit_day(self):
+        """提交直接写入日数据列的一天，并累加到所在周、月、年"""
+        history = self.state['daily_history']
+        history.commit_day()
+        self.state['rollups'].add(history, len(history) - 1)
     
     def _calculate_weekly_stats(self):
-        """计算每周统计数据"""
-        # 简单的周统计，实际逻辑需扩展
-        if len(self.state['daily_history']) < 7:
+        """结束当前周：生成周统计数据，并更新本周涉及的月度、年度统计"""
+        rollups = self.state['rollups']
+        week = rollups.close_week(self.state['current_week'])
+        if not week:
             return
         
-        weekly_data = self.state['daily_history'][-7:]
-        weekly_stats = {
-            'Week': self.state['current_week'],
-            'StartDay': weekly_data[0]['Day'],
-            'EndDay': weekly_data[-1]['Day'],
-            'StartDate': weekly_data[0]['Date'],  # 周起始日期
-            'EndDate': weekly_data[-1]['Date'],  # 周结束日期
-            'NewCustomers': sum(d['NewCustomers'] for d in weekly_data),  # 周新增客户数
-            'TotalCustomers': weekly_data[-1]['TotalCustomers'],  # 累计总客户数（去重）
-            'TotalMembers': weekly_data[-1]['TotalMembers'],  # 累计会员数（仅买了会员卡的）
-            'PatientsSeen': sum(d['PatientsSeen'] for d in weekly_data),  # 周就诊人次
-            'RevenueTotal': sum(d['RevenueTotal'] for d in weekly_data),  # 周总营收
-            'Costs': sum(d['Costs'] for d in weekly_data),  # 周总成本
-            'Profit': sum(d['Profit'] for d in weekly_data),  # 周总利润
-            'CashFlowWeekly': sum(d['CashFlowToday'] for d in weekly_data),  # 周现金流
-            'Cash': weekly_data[-1]['Cash'],  # 周末现金余额
+        self.state['weekly_history'].append(self._weekly_row(week))
+        
+        # 只重建本周有新数据的月份/年份
+        self.state['monthly_history'] = self._updated_rows(
+            self.state['monthly_history'], 'Month', rollups.months, rollups.changed_months())
+        self.state['yearly_history'] = self._updated_rows(
+            self.state['yearly_history'], 'Year', rollups.years, rollups.changed_years())
+        
+        # 更新当前月份
+        self.state['current_month'] = max(rollups.months)
+    
+    def _updated_rows(self, rows, key, accumulators, changed):
+        """
+        重建有变化的月度/年度统计行
+        
+        已发布的统计行不会修改：有变化的周期生成新行，返回按周期排序的新列表
+        """
+        by_key = {row[key]: row for row in rows}
+        for period in changed:
+            by_key[period] = self._period_row(accumulators[period], key)
+        return [by_key[period] for period in sorted(by_key)]
+    
+    def _weekly_row(self, week):
+        """用周累加器生成周统计数据"""
+        totals, first, last = week.totals, week.first, week.last
+        return {
+            'Week': week.key,
+            'StartDay': first['Day'],
+            'EndDay': last['Day'],
+            'StartDate': first['Date'],  # 周起始日期
+            'EndDate': last['Date'],  # 周结束日期
+            'NewCustomers': totals['NewCustomers'],  # 周新增客户数
+            'TotalCustomers': last['TotalCustomers'],  # 累计总客户数（去重）
+            'TotalMembers': last['TotalMembers'],  # 累计会员数（仅买了会员卡的）
+            'PatientsSeen': totals['PatientsSeen'],  # 周就诊人次
+            'RevenueTotal': totals['RevenueTotal'],  # 周总营收
+            'Costs': totals['Costs'],  # 周总成本
+            'Profit': totals['Profit'],  # 周总利润
+            'CashFlowWeekly': totals['CashFlowToday'],  # 周现金流
+            'Cash': last['Cash'],  # 周末现金余额
             
             # 分类营收
-            'RevenueCard': sum(d.get('RevenueCard', 0) for d in weekly_data),  # 周卡类营收
-            'RevenueTreatment': sum(d['RevenueTreatment'] for d in weekly_data),  # 周治疗营收
-            'RevenueOrtho': sum(d['RevenueOrtho'] for d in weekly_data),  # 周矫正营收
+            'RevenueCard': totals['RevenueCard'],  # 周卡类营收
+            'RevenueTreatment': totals['RevenueTreatment'],  # 周治疗营收
+            'RevenueOrtho': totals['RevenueOrtho'],  # 周矫正营收
             
             # 分类利润
-            'ProfitCard': sum(d.get('ProfitCard', 0) for d in weekly_data),  # 周卡类利润
-            'ProfitTreatment': sum(d.get('ProfitTreatment', 0) for d in weekly_data),  # 周治疗利润
-            'ProfitOrtho': sum(d.get('ProfitOrtho', 0) for d in weekly_data),  # 周矫正利润
+            'ProfitCard': totals['ProfitCard'],  # 周卡类利润
+            'ProfitTreatment': totals['ProfitTreatment'],  # 周治疗利润
+            'ProfitOrtho': totals['ProfitOrtho'],  # 周矫正利润
             
             # 分类现金流
-            'CashFlowCard': sum(d.get('CashFlowCard', 0) for d in weekly_data),  # 周卡类现金流
-            'CashFlowTreatment': sum(d.get('CashFlowTreatment', 0) for d in weekly_data),  # 周治疗现金流
-            'CashFlowOrtho': sum(d.get('CashFlowOrtho', 0) for d in weekly_data),  # 周矫正现金流
+            'CashFlowCard': totals['CashFlowCard'],  # 周卡类现金流
+            'CashFlowTreatment': totals['CashFlowTreatment'],  # 周治疗现金流
+            'CashFlowOrtho': totals['CashFlowOrtho'],  # 周矫正现金流
             
             # 人员相关
-            'CurrentPediatricDoctors': weekly_data[-1]['CurrentPediatricDoctors'],  # 当前儿牙医生数
-            'CurrentOrthoDoctors': weekly_data[-1]['CurrentOrthoDoctors'],  # 当前矫正医生数
-            'CurrentNurses': weekly_data[-1]['CurrentNurses'],  # 当前护士数
-            'CurrentOps': weekly_data[-1].get('CurrentOps', 1),  # 当前运营数
-            'DoctorSalary': sum(d.get('DoctorSalary', 0) for d in weekly_data),  # 周医生工资
-            'NurseSalary': sum(d.get('NurseSalary', 0) for d in weekly_data),  # 周护士工资
-            'OpsSalary': sum(d.get('OpsSalary', 0) for d in weekly_data)  # 周运营工资
+            'CurrentPediatricDoctors': last['CurrentPediatricDoctors'],  # 当前儿牙医生数
+            'CurrentOrthoDoctors': last['CurrentOrthoDoctors'],  # 当前矫正医生数
+            'CurrentNurses': last['CurrentNurses'],  # 当前护士数
+            'CurrentOps': last['CurrentOps'],  # 当前运营数
+            'DoctorSalary': totals['DoctorSalary'],  # 周医生工资
+            'NurseSalary': totals['NurseSalary'],  # 周护士工资
+            'OpsSalary': totals['OpsSalary']  # 周运营工资
         }
-        
-        self.state['weekly_history'].append(weekly_stats)
-        
-        # 重新计算所有月度数据，确保数据准确性
-        self._recalculate_all_monthly_stats()
     
-    def _recalculate_all_monthly_stats(self):
-        """重新计算所有月度数据，直接从日数据聚合"""
-        # 清空现有月度数据
-        self.state['monthly_history'] = []
-        
-        # 获取所有日数据
-        daily_data = self.state['daily_history']
-        if not daily_data:
-            return
-        
-        # 按月分组日数据：将每个日数据分配到它所属的月份
-        monthly_groups = {}
-        for day in daily_data:
-            if 'Month' not in day:
-                continue
-            month = day['Month']
-            if month not in monthly_groups:
-                monthly_groups[month] = []
-            monthly_groups[month].append(day)
-        
-        # 为每个月计算统计数据
-        for month, month_days in sorted(monthly_groups.items()):
-            # 确保数据按天数排序
-            month_days.sort(key=lambda x: x['Day'])
+    def _period_row(self, period, key='Month'):
+        """
+        用月/年累加器生成月度或年度统计数据
+        
+        参数：
+        - period: PeriodAccumulator
+        - key: 'Month' 或 'Year'
+        """
+        totals, first, last = period.totals, period.first, period.last
+        
+        # 获取期末的医生和护士人数
+        total_doctors = last['CurrentPediatricDoctors'] + last['CurrentOrthoDoctors']
+        total_nurses = last['CurrentNurses']
+        total_ops = last['CurrentOps']
+        
+        # 计算人均工资（避免除以0）
+        avg_doctor_salary = totals['DoctorSalary'] / total_doctors if total_doctors > 0 else 0
+        avg_nurse_salary = totals['NurseSalary'] / total_nurses if total_nurses > 0 else 0
+        avg_ops_salary = totals['OpsSalary'] / total_ops if total_ops > 0 else 0
+        
+        suffix = 'Monthly' if key == 'Month' else 'Yearly'
+        return {
+            key: period.key,
+            'StartDay': first['Day'],
+            'EndDay': last['Day'],
+            'NewCustomers': totals['NewCustomers'],  # 新增客户数
+            'TotalCustomers': last['TotalCustomers'],  # 累计总客户数（去重）
+            'TotalMembers': last['TotalMembers'],  # 累计会员数（仅买了会员卡的）
+            'PatientsSeen': totals['PatientsSeen'],  # 就诊人次
+            'RevenueTotal': totals['RevenueTotal'],  # 总营收
+            'Costs': totals['Costs'],  # 总成本
+            'Profit': totals['Profit'],  # 总利润
+            f'CashFlow{suffix}': totals['CashFlowToday'],  # 期间现金流
+            'Cash': last['Cash'],  # 期末现金余额
             
-            # 计算月总医生工资和护士工资
-            total_doctor_salary = sum(d.get('DoctorSalary', 0) for d in month_days)
-            total_nurse_salary = sum(d.get('NurseSalary', 0) for d in month_days)
-            total_ops_salary = sum(d.get('OpsSalary', 0) for d in month_days)
+            # 分类营收
+            'RevenueCard': totals['RevenueCard'],  # 卡类营收
+            'RevenueTreatment': totals['RevenueTreatment'],  # 治疗营收
+            'RevenueOrtho': totals['RevenueOrtho'],  # 矫正营收
             
-            # 获取月末的医生和护士人数
-            total_doctors = month_days[-1]['CurrentPediatricDoctors'] + month_days[-1]['CurrentOrthoDoctors']
-            total_nurses = month_days[-1]['CurrentNurses']
-            total_ops = month_days[-1].get('CurrentOps', 1)
+            # 分类利润
+            'ProfitCard': totals['ProfitCard'],  # 卡类利润
+            'ProfitTreatment': totals['ProfitTreatment'],  # 治疗利润
+            'ProfitOrtho': totals['ProfitOrtho'],  # 矫正利润
             
-            # 计算人均工资（避免除以0）
-            avg_doctor_salary = total_doctor_salary / total_doctors if total_doctors > 0 else 0
-            avg_nurse_salary = total_nurse_salary / total_nurses if total_nurses > 0 else 0
-            avg_ops_salary = total_ops_salary / total_ops if total_ops > 0 else 0
+            # 分类现金流
+            'CashFlowCard': totals['CashFlowCard'],  # 卡类现金流
+            'CashFlowTreatment': totals['CashFlowTreatment'],  # 治疗现金流
+            'CashFlowOrtho': totals['CashFlowOrtho'],  # 矫正现金流
             
-            monthly_stats = {
-                'Month': month,
-                'StartDay': month_days[0]['Day'],
-                'EndDay': month_days[-1]['Day'],
-                'NewCustomers': sum(d['NewCustomers'] for d in month_days),  # 月新增客户数
-                'TotalCustomers': month_days[-1]['TotalCustomers'],  # 累计总客户数（去重）
-                'TotalMembers': month_days[-1]['TotalMembers'],  # 累计会员数（仅买了会员卡的）
-                'PatientsSeen': sum(d['PatientsSeen'] for d in month_days),  # 月就诊人次
-                'RevenueTotal': sum(d['RevenueTotal'] for d in month_days),  # 月总营收
-                'Costs': sum(d['Costs'] for d in month_days),  # 月总成本
-                'Profit': sum(d['Profit'] for d in month_days),  # 月总利润
-                'CashFlowMonthly': sum(d['CashFlowToday'] for d in month_days),  # 月现金流
-                'Cash': month_days[-1]['Cash'],  # 月末现金余额
-                
-                # 分类营收
-                'RevenueCard': sum(d.get('RevenueCard', 0) for d in month_days),  # 月卡类营收
-                'RevenueTreatment': sum(d.get('RevenueTreatment', 0) for d in month_days),  # 月治疗营收
-                'RevenueOrtho': sum(d.get('RevenueOrtho', 0) for d in month_days),  # 月矫正营收
-                
-                # 分类利润
-                'ProfitCard': sum(d.get('ProfitCard', 0) for d in month_days),  # 月卡类利润
-                'ProfitTreatment': sum(d.get('ProfitTreatment', 0) for d in month_days),  # 月治疗利润
-                'ProfitOrtho': sum(d.get('ProfitOrtho', 0) for d in month_days),  # 月矫正利润
-                
-                # 分类现金流
-                'CashFlowCard': sum(d.get('CashFlowCard', 0) for d in month_days),  # 月卡类现金流
-                'CashFlowTreatment': sum(d.get('CashFlowTreatment', 0) for d in month_days),  # 月治疗现金流
-                'CashFlowOrtho': sum(d.get('CashFlowOrtho', 0) for d in month_days),  # 月矫正现金流
-                
-                # 人员工资（人均）
-                'DoctorSalary': avg_doctor_salary,  # 月人均医生工资
-                'NurseSalary': avg_nurse_salary,  # 月人均护士工资
-                'OpsSalary': avg_ops_salary,  # 月人均运营工资
-                
-                # 人员相关
-                'CurrentPediatricDoctors': month_days[-1]['CurrentPediatricDoctors'],  # 当前儿牙医生数
-                'CurrentOrthoDoctors': month_days[-1]['CurrentOrthoDoctors'],  # 当前矫正医生数
-                'CurrentNurses': month_days[-1]['CurrentNurses'],  # 当前护士数
-                'CurrentOps': month_days[-1].get('CurrentOps', 1)  # 当前运营数
-            }
+            # 人员工资（人均）
+            'DoctorSalary': avg_doctor_salary,  # 人均医生工资
+            'NurseSalary': avg_nurse_salary,  # 人均护士工资
+            'OpsSalary': avg_ops_salary,  # 人均运营工资
             
-            self.state['monthly_history'].append(monthly_stats)
-        
-        # 更新当前月份
-        if monthly_groups:
-            self.state['current_month'] = max(monthly_groups.keys())
-        else:
-            self.state['current_month'] = 0
+            # 人员相关
+            'CurrentPediatricDoctors': last['CurrentPediatricDoctors'],  # 当前儿牙医生数
+            'CurrentOrthoDoctors': last['CurrentOrthoDoctors'],  # 当前矫正医生数
+            'CurrentNurses': last['CurrentNurses'],  # 当前护士数
+            'CurrentOps': last['CurrentOps']  # 当前运营数
+        }
+    
+    def verify_rollups(self):
+        """
+        用日数据全量重算周/月/年统计，核对增量累加的结果
+        
+        返回：
+        - 不一致的描述列表，一致时为空列表
+        """
+        with self._write_lock:
+            history = self.state['daily_history']
+            if not len(history):
+                return []
+            weeks = period_rollup.recompute(history, (history.column('Day') - 1) // 7 + 1)
+            months = period_rollup.recompute(history, history.column('Month'))
+            years = period_rollup.recompute(history, history.column('Year'))
+            closed_weeks = [weeks[row['Week']] for row in self.state['weekly_history']]
+            return (period_rollup.compare_rows([self._weekly_row(w) for w in closed_weeks],
+                                               self.state['weekly_history'], 'weekly')
+                    + period_rollup.compare_rows([self._period_row(months[m], 'Month') for m in sorted(months)],
+                                                 self.state['monthly_history'], 'monthly')
+                    + period_rollup.compare_rows([self._period_row(years[y], 'Year') for y in sorted(years)],
+                                                 self.state['yearly_history'], 'yearly'))
     
     def get_results(self, type="daily"):
-        """获取结果数据"""
+        """获取结果数据（最近一次发布的快照）"""
         if type == "daily":
-            return self.state['daily_history']
+            return self.snapshot.daily()
         elif type == "weekly":
-            return self.state['weekly_history']
+            return self.snapshot.weekly()
         elif type == "monthly":
-            return self.state['monthly_history']
+            return self.snapshot.monthly()
+        elif type == "yearly":
+            return self.snapshot.yearly()
         else:
             return []
     
+    def get_daily_frame(self):
+        """获取日统计数据DataFrame（最近一次发布的快照，与日数据存储共享内存，不要修改）"""
+        return self.snapshot.daily_frame()
+    
     def get_summary(self):
-        """获取总结数据"""
+        """获取总结数据（最近一次发布的快照）"""
+        return dict(self.snapshot.summary)
+    
+    def _current_summary(self):
+        """当前总结数据（调用方持有写锁）"""
         if not self.state['daily_history']:
             return {
                 'total_weeks': 0,
@@ -1177,16 +1391,17 @@ class SimulationManager:
                 'total_members': 0,
                 'total_revenue': 0,
                 'total_profit': 0,
-                'final_cash': -(self.params['invest_decoration'] + self.params['invest_hardware'])
+                'final_cash': -(self.params['invest_decoration'] + self.params['invest_hardware']),
+                'seed': self.random_streams.seed
             }
         
         # 总客户数：去重的唯一客户（所有历史患者）
-        total_customers = len(self.state['all_patients'])
+        total_customers = self.member_counters.customers
         # 最终会员数：只有买了会员卡的患者才算
-        total_members = len([p for p in self.state['all_patients'] if p.is_active and p.card_type is not None])
-        # 总营收和总成本
-        total_revenue = sum(d['RevenueTotal'] for d in self.state['daily_history'])
-        total_costs = sum(d['Costs'] for d in self.state['daily_history'])
+        total_members = self.member_counters.members
+        # 总营收和总成本：每天写入日数据时累计
+        total_revenue = self.state['revenue_total']
+        total_costs = self.state['costs_total']
         
         return {
             'total_weeks': self.state['current_week'],
@@ -1194,20 +1409,33 @@ class SimulationManager:
             'total_members': total_members,
             'total_revenue': total_revenue,
             'total_profit': total_revenue - total_costs,
-            'final_cash': self.state['current_cash']
+            'final_cash': self.state['current_cash'],
+            'card_1yr_holders': self.member_counters.holders['1yr'],  # 1年卡有效持卡人数
+            'card_5yr_holders': self.member_counters.holders['5yr'],  # 5年卡有效持卡人数
+            'seed': self.random_streams.seed  # 本次模拟使用的随机种子
         }
     
     def get_patient_details(self):
-        """获取患者详细记录"""
-        return self.state['patient_details']
+        """获取患者详细记录（最近一次发布的快照）"""
+        return self.snapshot.events()
+    
+    def query_patient_details(self, start=0, limit=100, **filters):
+        """按患者ID、行为类型、来源和日期范围分页查询患者详细记录（最近一次发布的快照）"""
+        return self.snapshot.query_events(start, limit, **filters)
+    
+    def get_patient(self, patient_id):
+        """获取单个患者的时间线和累计价值（最近一次发布的快照），没有该患者返回None"""
+        return self.snapshot.patient(patient_id)
+    
+    def get_ltv_table(self, sort='Revenue', descending=True, offset=0, limit=50):
+        """获取按累计价值排序的患者价值表（最近一次发布的快照）"""
+        return self.snapshot.ltv_table(sort, descending, offset, limit)
+    
+    def get_behavior_window(self, patient_offset=0, patient_limit=50, day_start=1, day_end=None):
+        """获取患者行为矩阵的一个患者/日期窗口（最近一次发布的快照，只渲染窗口内的单元格）"""
+        return self.snapshot.behavior_window(patient_offset, patient_limit, day_start, day_end)
     
     def get_pivot_data(self):
-        """获取患者行为透视表数据"""
-        df_raw = pd.DataFrame(self.state['pivot_records'])
-        if df_raw.empty:
-            return pd.DataFrame()
-        
-        # 使用 pivot 将原始记录转换为以“患者”为行、“日期”为列的矩阵
-        df_pivot = df_raw.pivot(index='PatientID', columns='Day', values='Val').fillna('')
-        return df_pivot
+        """获取患者行为透视表数据（稠密表，会物化全部单元格；浏览请用get_behavior_window）"""
+        return self.snapshot.behavior_frame()
 
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量化患者群体引擎
+
+以NumPy列数组（结构化数组的列式存储）保存全部患者，不再创建Patient对象。
+每天对到期掩码批量抽取随机数，完成复诊、治疗、续卡和矫正判定，
+用于模拟大规模连锁诊所（10万+会员、10年）的场景
+"""
+
+import numpy as np
+
+from random_streams import RandomStreams
+
+
+NO_DAY = -1                  # 无预约
+CARD_NONE = 0                # 无会员卡
+CARD_1YR = 1                 # 1年卡
+CARD_5YR = 2                 # 5年卡
+ORTHO_TOTAL_DAYS = 45 * 24   # 矫正总时长：24次复诊，每次间隔45天
+
+# 列名 -> (数据类型, 默认值)
+COLUMNS = {
+    'join_day': (np.int32, 0),                      # 初诊日期
+    'initial_age': (np.float64, 0.0),               # 初诊年龄
+    'source': (np.int8, 0),                         # 患者来源：0=原生，1=现有会员
+    'card_type': (np.int8, CARD_NONE),              # 会员卡类型
+    'card_expiry_day': (np.int32, 0),               # 会员卡到期日期
+    'next_appointment_day': (np.int32, NO_DAY),     # 下次常规复诊日期
+    'is_active': (np.bool_, True),                  # 是否活跃
+    'has_ortho': (np.bool_, False),                 # 是否已进行过矫正
+    'ortho_start_day': (np.int32, 0),               # 矫正开始日期
+    'ortho_end_day': (np.int32, 0),                 # 矫正结束日期
+    'next_ortho_appointment': (np.int32, NO_DAY),   # 下次矫正复诊日期
+    'ortho_age': (np.float64, 0.0),                 # 矫正时年龄
+    'ortho_completed': (np.bool_, False),           # 矫正是否已完成
+    'ortho_total_cost': (np.int64, 0),              # 矫正总费用
+    'ortho_revenue_remaining': (np.float64, 0.0),   # 待确认的矫正营收（45%）
+}
+
+
+class VectorizedPopulation:
+    """
+    列式存储的患者群体
+
+    每个患者属性对应一个NumPy数组，患者ID即数组下标+1。
+    判定规则与 SimulationManager._simulate_patients 的对象引擎一致，
+    同时提供与 MemberCounters 相同的计数接口（customers / members / holders）。
+    """
+
+    def __init__(self, params, age_list, age_probs, streams=None):
+        """
+        初始化患者群体，并生成初始现有会员
+
+        参数：
+        - params: 模拟参数字典
+        - age_list: 新客年龄取值列表
+        - age_probs: 各年龄对应的概率
+        - streams: 随机数流（RandomStreams），None时随机生成种子
+        """
+        self.params = params
+        self.streams = streams if streams is not None else RandomStreams()
+        self.age_values = np.asarray(age_list, dtype=np.float64)
+        self.age_probs = np.asarray(age_probs, dtype=np.float64)
+
+        self.size = 0       # 当前患者数
+        self.capacity = 0   # 数组容量
+        self.day = 0        # 当前模拟日期
+        self.members = 0    # 会员数（活跃且买过会员卡）
+        self._holders = None  # 缓存的有效持卡人数，办卡或日期推进后重新统计
+        for name, (dtype, fill) in COLUMNS.items():
+            setattr(self, name, np.full(0, fill, dtype=dtype))
+
+        self._add_existing_members(params['initial_members'])
+
+    def _ensure_capacity(self, needed):
+        """扩容列数组，容量按倍数增长"""
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2, 1024)
+        for name, (dtype, fill) in COLUMNS.items():
+            column = np.full(capacity, fill, dtype=dtype)
+            column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def _append(self, count, join_day, ages, source):
+        """追加count个患者，返回其下标数组"""
+        self._ensure_capacity(self.size + count)
+        idx = np.arange(self.size, self.size + count)
+        self.join_day[idx] = join_day
+        self.initial_age[idx] = ages
+        self.source[idx] = source
+        self.size += count
+        return idx
+
+    def _add_existing_members(self, count):
+        """生成初始现有会员：均持5年卡，剩余有效期随机，3个月内随机到店"""
+        if count <= 0:
+            return
+        rng = self.streams.population
+        ages = np.maximum(0.1, rng.normal(9, 2, count))  # 平均9岁，标准差2岁
+        idx = self._append(count, 0, ages, source=1)
+        self.card_type[idx] = CARD_5YR
+        self.card_expiry_day[idx] = rng.integers(1, 365 * 5 + 1, count)
+        self.next_appointment_day[idx] = rng.integers(1, 91, count)
+        self.members += count
+        self._holders = None
+
+    @property
+    def nbytes(self):
+        """全部列数组占用的内存（字节）"""
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+    # ---------- 与 MemberCounters 一致的计数接口 ----------
+
+    @property
+    def customers(self):
+        """累计总客户数"""
+        return self.size
+
+    @property
+    def holders(self):
+        """各卡类型的有效持卡人数（同一天内没有办卡时直接返回缓存的统计）"""
+        if self._holders is None:
+            n = self.size
+            valid = self.is_active[:n] & (self.card_expiry_day[:n] > self.day)
+            card_type = self.card_type[:n]
+            self._holders = {
+                '1yr': int(np.count_nonzero(valid & (card_type == CARD_1YR))),
+                '5yr': int(np.count_nonzero(valid & (card_type == CARD_5YR))),
+            }
+        return dict(self._holders)
+
+    def advance(self, day):
+        """推进到新的模拟日期"""
+        self.day = day
+        self._holders = None  # 会员卡到期按日期判断
+
+    def verify(self, patients=None):
+        """与全量重新统计的会员数比对，不一致时抛出异常（patients参数仅为接口兼容）"""
+        n = self.size
+        expected = int(np.count_nonzero(self.is_active[:n] & (self.card_type[:n] != CARD_NONE)))
+        if self.members != expected:
+            raise RuntimeError(f'会员计数不一致（第{self.day}天）：增量{self.members}，全量{expected}')
+
+    # ---------- 每日模拟 ----------
+
+    def simulate_day(self, day):
+        """
+        批量处理当天的复诊、新客和就诊
+
+        参数：
+        - day: 模拟天数
+
+        返回：
+        - 当日患者流汇总，字段与对象引擎一致，另含当日1年卡/5年卡销售额
+        """
+        params = self.params
+        streams = self.streams
+        n = self.size
+        ortho_clinic = params['clinic_type'] == 'ortho'
+        totals = {
+            'cash_today': 0, 'cash_new_card': 0, 'cash_renew_card': 0,
+            'cash_treatment': 0, 'cash_ortho': 0,
+            'revenue_treatment': 0, 'revenue_ortho': 0,
+            'card_sales': 0, 'card_1yr_sales': 0, 'card_5yr_sales': 0,
+            'new_customers': 0, 'patients_seen': 0,
+            'treatment_material_cost': 0, 'ortho_material_cost': 0,
+        }
+        active = self.is_active[:n]
+
+        # 1. 矫正复诊：到期即到店，疗程结束时确认剩余45%营收
+        ortho_visits = np.empty(0, dtype=np.int64)
+        if ortho_clinic:
+            ortho_visits = np.flatnonzero(active & (self.next_ortho_appointment[:n] == day))
+            finishing = ortho_visits[(day - self.ortho_start_day[ortho_visits] >= ORTHO_TOTAL_DAYS)
+                                     & ~self.ortho_completed[ortho_visits]]
+            paying = finishing[self.ortho_revenue_remaining[finishing] > 0]
+            totals['revenue_ortho'] += float(self.ortho_revenue_remaining[paying].sum())
+            self.ortho_completed[paying] = True
+            self.ortho_end_day[paying] = day
+            self.ortho_revenue_remaining[paying] = 0
+            self.next_ortho_appointment[ortho_visits] = day + 45
+            self.next_ortho_appointment[finishing] = NO_DAY
+
+        # 常规复诊：按复诊率批量判定是否赴约，未赴约推迟30天
+        due = np.flatnonzero(active & (self.next_appointment_day[:n] == day))
+        show = streams.follow_up.random(due.size) < params['prob_follow_up']
+        follow_ups = due[show]
+        self.next_appointment_day[due[~show]] = day + 30
+
+        # 2. 新初诊客户
+        if params.get('enable_growth_curve', True):
+            growth_factor = min(1.0, 0.4 + (day / 180) * 0.6)
+        else:
+            growth_factor = 1.0
+        num_new_leads = max(0, int(streams.arrivals.normal(params['daily_new_leads_base'], 1) * growth_factor))
+        new_idx = np.empty(0, dtype=np.int64)
+        if num_new_leads > 0:
+            ages = streams.arrivals.choice(self.age_values, size=num_new_leads, p=self.age_probs)
+            new_idx = self._append(num_new_leads, day, ages, source=0)
+            roll = streams.arrivals.random(num_new_leads)
+            buy_1yr = new_idx[roll < params['prob_card_1yr']]
+            buy_5yr = new_idx[(roll >= params['prob_card_1yr'])
+                              & (roll < params['prob_card_1yr'] + params['prob_card_5yr'])]
+            sales_1yr = self._buy_card(buy_1yr, CARD_1YR, day)
+            sales_5yr = self._buy_card(buy_5yr, CARD_5YR, day)
+            self.members += buy_1yr.size + buy_5yr.size
+            totals['cash_new_card'] += sales_1yr + sales_5yr
+            totals['card_1yr_sales'] += sales_1yr
+            totals['card_5yr_sales'] += sales_5yr
+            self.next_appointment_day[new_idx] = day + params['follow_up_cycle']
+            totals['new_customers'] = num_new_leads
+
+        # 3. 患者就诊：同一患者当天既有矫正复诊又有常规复诊时就诊两次
+        visitors = np.unique(np.concatenate([ortho_visits, follow_ups, new_idx]))
+        totals['patients_seen'] = int(visitors.size)
+        self._visit(visitors, day, totals)
+        self._visit(np.intersect1d(ortho_visits, follow_ups), day, totals)
+
+        totals['card_sales'] = totals['card_1yr_sales'] + totals['card_5yr_sales']
+        totals['cash_today'] = (totals['cash_new_card'] + totals['cash_renew_card']
+                                + totals['cash_treatment'] + totals['cash_ortho'])
+        return totals
+
+    def _buy_card(self, idx, card_type, day):
+        """批量办卡，返回办卡总金额"""
+        if card_type == CARD_1YR:
+            duration, price = 365, self.params['price_card_1yr']
+        else:
+            duration, price = 365 * 5, self.params['price_card_5yr']
+        self.card_type[idx] = card_type
+        self.card_expiry_day[idx] = day + duration
+        if idx.size:
+            self._holders = None
+        return int(idx.size) * price
+
+    def _visit(self, idx, day, totals):
+        """对一批到店患者批量判定治疗、续卡和矫正"""
+        if idx.size == 0:
+            return
+        params = self.params
+        streams = self.streams
+        current_age = self.initial_age[idx] + (day - self.join_day[idx]) // 365
+
+        # 治疗：会员卡（曾办卡即可）享65折
+        treated = idx[streams.treatment.random(idx.size) < params['prob_treatment']]
+        discount = np.where(self.card_expiry_day[treated] > 0, 0.65, 1.0)
+        treatment_cost = (params['price_treatment'] * discount).astype(np.int64)
+        treatment_total = int(treatment_cost.sum())
+        totals['cash_treatment'] += treatment_total
+        totals['revenue_treatment'] += treatment_total
+        totals['treatment_material_cost'] += float((treatment_cost * params['pediatric_material_ratio']).sum())
+
+        # 续卡：卡到期日与就诊日相差正负365天内才判定
+        expiry = self.card_expiry_day[idx]
+        eligible = idx[(expiry > 0) & (np.abs(expiry - day) < 365)]
+        roll = streams.renewal.random(eligible.size)
+        renew_1yr = eligible[roll < params['prob_renew_1yr']]
+        renew_5yr = eligible[(roll >= params['prob_renew_1yr'])
+                             & (roll < params['prob_renew_1yr'] + params['prob_renew_5yr'])]
+        sales_1yr = self._buy_card(renew_1yr, CARD_1YR, day)
+        sales_5yr = self._buy_card(renew_5yr, CARD_5YR, day)
+        totals['cash_renew_card'] += sales_1yr + sales_5yr
+        totals['card_1yr_sales'] += sales_1yr
+        totals['card_5yr_sales'] += sales_5yr
+
+        # 矫正：仅矫正型诊所，按年龄调整概率
+        if params['clinic_type'] == 'ortho':
+            multiplier = np.select(
+                [current_age < 6, (current_age >= 6) & (current_age <= 10), (current_age >= 11) & (current_age <= 14)],
+                [0.1, 2.0, 5.0],
+                default=1.0
+            )
+            starting = streams.ortho.random(idx.size) < params['prob_ortho'] * multiplier
+            started = idx[starting]
+            discount = np.where(self.card_expiry_day[started] > 0, 0.65, 1.0)
+            ortho_cost = (params['price_ortho'] * discount).astype(np.int64)
+            totals['cash_ortho'] += int(ortho_cost.sum())
+            totals['revenue_ortho'] += float((ortho_cost * 0.55).sum())
+            totals['ortho_material_cost'] += float((ortho_cost * params['ortho_material_ratio']).sum())
+            self.has_ortho[started] = True
+            self.ortho_start_day[started] = day
+            self.ortho_age[started] = current_age[starting]
+            self.next_ortho_appointment[started] = day + 45
+            self.ortho_total_cost[started] = ortho_cost
+            self.ortho_revenue_remaining[started] = ortho_cost * 0.45
+
+        # 设置下次常规复诊日期
+        next_day = self.next_appointment_day[idx]
+        self.next_appointment_day[idx[next_day <= day]] = day + params['follow_up_cycle']
@@ -12,6 +12,7 @@ function initControlPage() {
     const paramsForm = document.getElementById('params-form');
     const resetBtn = document.getElementById('reset-btn');
     const nextBtn = document.getElementById('next-btn');
+    const runBtn = document.getElementById('run-btn');
     const alertDiv = document.getElementById('alert');
     
     // 加载当前参数
@@ -44,8 +45,19 @@ function initControlPage() {
         runNextWeek();
     });
     
-    // 定期更新状态（每秒）
-    setInterval(loadCurrentState, 1000);
+    // 运行到结束按钮点击事件
+    runBtn.addEventListener('click', function() {
+        runToEnd();
+    });
+    
+    // 订阅模拟事件流，状态变化时更新；浏览器不支持时退回定期轮询（每秒）
+    if (typeof EventSource !== 'undefined') {
+        const source = new EventSource('/api/stream');
+        source.addEventListener('week', loadCurrentState);
+        source.addEventListener('reset', loadCurrentState);
+    } else {
+        setInterval(loadCurrentState, 1000);
+    }
 }
 
 // 定义全局变量存储DOM元素
@@ -202,6 +214,54 @@ function runNextWeek() {
     });
 }
 
+// 运行到结束（服务器后台运行，定期查询进度）
+function runToEnd() {
+    fetch('/api/simulation/run', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ background: true })
+    })
+    .then(response => response.json())
+    .then(result => {
+        if (result.status === 'success') {
+            showAlert('模拟已开始后台运行', 'success');
+            pollProgress();
+        } else {
+            showAlert(result.message, 'error');
+        }
+    })
+    .catch(error => {
+        console.error('Error running simulation:', error);
+        showAlert('运行模拟失败：' + error.message, 'error');
+    });
+}
+
+// 查询后台运行进度，运行结束前每秒查询一次
+function pollProgress() {
+    fetch('/api/simulation/progress')
+        .then(response => response.json())
+        .then(progress => {
+            if (progress.error) {
+                showAlert('运行模拟失败：' + progress.error, 'error');
+                return;
+            }
+            if (progress.running) {
+                const eta = progress.eta_seconds === null ? '--' : progress.eta_seconds.toFixed(0);
+                showAlert(`运行中：第 ${progress.current_day} / ${progress.target_day} 天，` +
+                          `${progress.days_per_second.toFixed(0)} 天/秒，预计剩余 ${eta} 秒`, 'warning');
+                setTimeout(pollProgress, 1000);
+            } else {
+                showAlert(`模拟已运行到第 ${progress.current_day} 天`, 'success');
+                loadCurrentState();
+            }
+        })
+        .catch(error => {
+            console.error('Error loading progress:', error);
+        });
+}
+
 // 添加星期几开关功能
 function addWeekdayToggle() {
     const weekdayBtns = document.querySelectorAll('.weekday-btn');
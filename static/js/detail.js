@@ -23,10 +23,16 @@ function initDetailPage() {
     // 当前数据
     let currentData = [];
     
+    // 各类数据的本地缓存：增量查询游标和已加载的行
+    const dataCache = {};
+    
     // 分页配置
     let currentPage = 1;
     const itemsPerPage = 100;
     
+    // 行为矩阵窗口：按患者翻页、按日期窗口平移，只向后端请求当前窗口
+    const behaviorWindow = { patientOffset: 0, patientLimit: 50, dayStart: 1, days: 30 };
+    
     // 绑定标签页切换事件
     tabBtns.forEach(btn => {
         btn.addEventListener('click', function() {
@@ -70,11 +76,32 @@ function initDetailPage() {
     // 初始加载数据
     loadData();
     
-    // 定期更新数据（每3秒）
-    setInterval(loadData, 3000);
+    // 订阅模拟事件流，有新数据时增量加载；浏览器不支持时退回定期轮询（每3秒）
+    if (typeof EventSource !== 'undefined') {
+        const source = new EventSource('/api/stream');
+        ['week', 'reset', 'gap'].forEach(event => source.addEventListener(event, scheduleLoad));
+    } else {
+        setInterval(loadData, 3000);
+    }
+    
+    // 合并短时间内的多次更新通知（连续运行时每秒可能产生上百周），最多每秒加载一次
+    let loadTimer = null;
+    function scheduleLoad() {
+        if (loadTimer === null) {
+            loadTimer = setTimeout(() => {
+                loadTimer = null;
+                loadData();
+            }, 1000);
+        }
+    }
     
     // 加载数据
     function loadData() {
+        if (currentDataType === 'behavior') {
+            loadBehavior();
+            return;
+        }
+        
         let endpoint;
         
         // 根据数据类型选择不同的API端点
@@ -88,9 +115,29 @@ function initDetailPage() {
             endpoint = '/api/results/patient_details';
         }
         
-        fetch(endpoint)
+        // 只请求上次游标之后的增量数据
+        const cache = dataCache[currentDataType] || (dataCache[currentDataType] = { cursor: null, rows: [] });
+        const query = cache.cursor ? `cursor=${encodeURIComponent(cache.cursor)}` : 'since_day=0';
+        const dataType = currentDataType;
+        const cursor = cache.cursor;
+        
+        fetch(`${endpoint}?${query}`)
             .then(response => response.json())
-            .then(data => {
+            .then(result => {
+                if (result.status === 'error') {
+                    // 如向量化引擎不记录患者明细
+                    console.error('Error loading data:', result.message);
+                    if (dataType === currentDataType) {
+                        renderTable([]);
+                        renderPagination(0);
+                    }
+                    return;
+                }
+                // 同一游标的并发请求只合并一次
+                const data = cache.cursor === cursor ? mergeRows(dataType, cache, result) : cache.rows;
+                if (dataType !== currentDataType) {
+                    return; // 请求期间已切换标签页
+                }
                 currentData = data;
                 
                 // 应用过滤
@@ -112,6 +159,122 @@ function initDetailPage() {
             });
     }
     
+    // 加载行为矩阵的当前窗口
+    function loadBehavior() {
+        const w = behaviorWindow;
+        const query = `patient_offset=${w.patientOffset}&patient_limit=${w.patientLimit}` +
+            `&day_start=${w.dayStart}&day_end=${w.dayStart + w.days - 1}`;
+        
+        fetch(`/api/behavior?${query}`)
+            .then(response => response.json())
+            .then(result => {
+                if (currentDataType !== 'behavior' || result.status === 'error') {
+                    return;
+                }
+                renderBehavior(result);
+                renderBehaviorPagination(result);
+            })
+            .catch(error => {
+                console.error('Error loading behavior matrix:', error);
+            });
+    }
+    
+    // 渲染行为矩阵窗口：每行一个患者，每列一天，只有有行为的单元格有内容
+    function renderBehavior(result) {
+        const days = [];
+        for (let day = result.day_start; day <= result.day_end; day++) {
+            days.push(day);
+        }
+        
+        const tableHead = resultTable.querySelector('thead');
+        tableHead.innerHTML = '<tr><th>患者ID</th>' + days.map(day => `<th>第${day}天</th>`).join('') + '</tr>';
+        
+        if (result.rows.length === 0) {
+            resultTableBody.innerHTML = `<tr><td colspan="${days.length + 1}">暂无数据</td></tr>`;
+            return;
+        }
+        
+        let html = '';
+        result.rows.forEach(row => {
+            const cells = {};
+            row.Cells.forEach(([day, label]) => { cells[day] = label; });
+            html += `<tr><td>${row.PatientID}</td>`;
+            days.forEach(day => {
+                html += `<td>${cells[day] || ''}</td>`;
+            });
+            html += '</tr>';
+        });
+        resultTableBody.innerHTML = html;
+    }
+    
+    // 渲染行为矩阵的翻页控件：上/下一批患者、前/后一个日期窗口
+    function renderBehaviorPagination(result) {
+        const w = behaviorWindow;
+        const oldPagination = document.querySelector('.pagination-controls');
+        if (oldPagination) {
+            oldPagination.remove();
+        }
+        
+        const pagination = document.createElement('div');
+        pagination.className = 'pagination-controls';
+        
+        const addButton = (text, disabled, onClick) => {
+            const btn = document.createElement('button');
+            btn.className = 'btn btn-secondary';
+            btn.textContent = text;
+            btn.disabled = disabled;
+            btn.addEventListener('click', function() {
+                onClick();
+                loadBehavior();
+            });
+            pagination.appendChild(btn);
+        };
+        const addInfo = text => {
+            const info = document.createElement('span');
+            info.className = 'page-info';
+            info.textContent = text;
+            pagination.appendChild(info);
+        };
+        
+        const lastPatient = Math.min(w.patientOffset + w.patientLimit, result.total_patients);
+        addButton('上一批患者', w.patientOffset === 0, () => { w.patientOffset = Math.max(0, w.patientOffset - w.patientLimit); });
+        addInfo(`患者 ${result.total_patients ? w.patientOffset + 1 : 0}-${lastPatient} / 共 ${result.total_patients} 人`);
+        addButton('下一批患者', lastPatient >= result.total_patients, () => { w.patientOffset += w.patientLimit; });
+        
+        addButton('前一段日期', w.dayStart === 1, () => { w.dayStart = Math.max(1, w.dayStart - w.days); });
+        addInfo(`第 ${result.day_start}-${result.day_end} 天 / 当前第 ${result.current_day} 天`);
+        addButton('后一段日期', result.day_end >= result.current_day, () => { w.dayStart += w.days; });
+        
+        const filterSection = document.querySelector('.filter-section');
+        filterSection.appendChild(pagination);
+    }
+    
+    // 合并增量数据到本地缓存
+    function mergeRows(dataType, cache, result) {
+        if (result.reset) {
+            cache.rows = []; // 模拟已重置，丢弃旧数据
+        }
+        if (dataType === 'weekly' || dataType === 'monthly') {
+            // 周/月数据：未结束的周期会随新数据更新，按周数/月份覆盖已有行
+            // （月数据按月份跨年合并，更新的月份不一定是最后一行）
+            const key = dataType === 'weekly' ? 'Week' : 'Month';
+            const positions = new Map(cache.rows.map((row, i) => [row[key], i]));
+            result.rows.forEach(row => {
+                const position = positions.get(row[key]);
+                if (position !== undefined) {
+                    cache.rows[position] = row;
+                } else {
+                    positions.set(row[key], cache.rows.length);
+                    cache.rows.push(row);
+                }
+            });
+        } else {
+            cache.rows.push(...result.rows);
+        }
+        cache.cursor = result.cursor;
+        return cache.rows;
+    }
+    
     // 应用过滤
     function applyFilters(data) {
         const monthFilter = filterMonth.value;
@@ -191,6 +354,11 @@ function initDetailPage() {
     
     // 更新过滤选项
     function updateFilterOptions() {
+        // 行为矩阵按窗口翻页，不使用月/周/日过滤
+        document.querySelectorAll('.filter-group').forEach(group => {
+            group.style.display = currentDataType === 'behavior' ? 'none' : '';
+        });
+        
         // 清除现有选项
         filterMonth.innerHTML = '<option value="all">全部</option>';
         filterWeek.innerHTML = '<option value="all">全部</option>';
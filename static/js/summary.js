@@ -76,11 +76,28 @@ function initSummaryPage() {
     loadSummaryData();
     refreshCharts();
     
-    // 定期更新数据（每5秒）
-    setInterval(() => {
-        loadSummaryData();
-        refreshCharts();
-    }, 5000);
+    // 订阅模拟事件流，有新数据时刷新；浏览器不支持时退回定期轮询（每5秒）
+    if (typeof EventSource !== 'undefined') {
+        const source = new EventSource('/api/stream');
+        ['week', 'reset', 'gap'].forEach(event => source.addEventListener(event, scheduleRefresh));
+    } else {
+        setInterval(() => {
+            loadSummaryData();
+            refreshCharts();
+        }, 5000);
+    }
+    
+    // 合并短时间内的多次更新通知，最多每2秒刷新一次（图表重绘开销较大）
+    let refreshTimer = null;
+    function scheduleRefresh() {
+        if (refreshTimer === null) {
+            refreshTimer = setTimeout(() => {
+                refreshTimer = null;
+                loadSummaryData();
+                refreshCharts();
+            }, 2000);
+        }
+    }
     
     // 比较两个数据对象是否相等
     function isDataEqual(data1, data2) {
@@ -801,44 +818,21 @@ function initSummaryPage() {
         console.log('Canvas上下文获取成功');
         
         try {
-            // 获取患者详细记录以计算老店和新店的现金流
-            fetch('/api/results/patient_details')
+            // 获取服务端按周/月汇总的老店和纯新患者现金流
+            const isMonthly = !isWeekly;
+            fetch(`/api/results/cashflow_by_source?granularity=${isMonthly ? 'month' : 'week'}`)
                 .then(response => response.json())
-                .then(patientDetails => {
-                    console.log('患者详细记录:', patientDetails.length);
-                    
-                    // 准备图表数据
-                    const isMonthly = !isWeekly;
+                .then(rows => {
+                    console.log('来源汇总数据:', rows.length);
                     
-                    // 按月份或周数分组，计算老店和新店的现金流
+                    // 按月份或周数索引各来源的现金流
                     const groupedData = {};
-                    
-                    // 遍历患者详细记录
-                    patientDetails.forEach(record => {
-                        // 确保Month字段存在
-                        if (!record.Month) {
-                            record.Month = Math.floor((record.Day - 1) / 31) + 1;
-                        }
-                        
-                        const key = isMonthly ? record.Month : Math.ceil(record.Day / 7);
-                        if (!groupedData[key]) {
-                            groupedData[key] = {
-                                oldCashFlow: 0,
-                                newCashFlow: 0
-                            };
-                        }
-                        
-                        const cashFlow = record.CashFlow || 0;
-                        const source = record.Source || 'unknown';
-                        console.log('患者记录:', record.PatientID, record.Day, record.Action, source, cashFlow);
-                        
-                        if (source === 'existing' || source === 'all') {
-                            // 老店带来的现金流（包括初始会员）
-                            groupedData[key].oldCashFlow += cashFlow;
-                        } else if (source === 'native') {
-                            // 纯新带来的现金流
-                            groupedData[key].newCashFlow += cashFlow;
-                        }
+                    rows.forEach(row => {
+                        const key = isMonthly ? row.Month : row.Week;
+                        groupedData[key] = {
+                            oldCashFlow: row.existing.CashFlow,  // 老店带来的现金流（包括初始会员）
+                            newCashFlow: row.native.CashFlow  // 纯新带来的现金流
+                        };
                     });
                     
                     // 准备图表的标签和数据
@@ -946,7 +940,7 @@ function initSummaryPage() {
                     console.log('=== 老店与纯新现金流对比图渲染成功 ===');
                 })
                 .catch(error => {
-                    console.error('获取患者详细记录失败:', error);
+                    console.error('获取来源汇总数据失败:', error);
                     // 显示错误信息
                     const chartContainer = canvas.parentElement;
                     chartContainer.innerHTML += `<div style="text-align: center; color: #ff6b6b; padding: 20px;">获取数据失败: ${error.message}</div>`;
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+测试公共配置
+
+与app.py、benchmark.py保持一致：项目根目录和src目录加入导入路径
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.append(os.path.join(ROOT, 'src'))
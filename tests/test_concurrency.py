@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+并发读写测试：后台连续运行模拟的同时，多个线程反复读取结果接口
+
+每个响应都来自同一个已发布的快照，不应读到写了一半的天或不连续的天数
+"""
+
+import threading
+import time
+
+import app as web
+
+READERS = 4  # 读取线程数
+YEARS = 2  # 模拟时长（年）
+
+
+def _check_daily(rows, errors):
+    """日数据：天数从1开始连续，现金余额逐日等于前一天余额加当日现金流"""
+    if [row['Day'] for row in rows] != list(range(1, len(rows) + 1)):
+        errors.append(f'日数据天数不连续：共{len(rows)}行')
+        return
+    for previous, row in zip(rows, rows[1:]):
+        if abs(previous['Cash'] + row['CashFlowToday'] - row['Cash']) > 1e-6:
+            errors.append(f'第{row["Day"]}天现金余额与现金流不一致')
+            return
+
+
+def _check_details(delta, errors):
+    """增量明细：事件都在游标范围内，且按天数不减"""
+    days = [row['Day'] for row in delta['rows']]
+    if any(not delta['since_day'] < day <= delta['current_day'] for day in days):
+        errors.append('增量明细超出游标范围')
+    if days != sorted(days):
+        errors.append('增量明细天数乱序')
+
+
+def test_readers_see_consistent_results_while_running():
+    scenario = 'test-concurrency'
+    headers = {web.SCENARIO_HEADER: scenario}
+    control = web.app.test_client()
+    control.post('/api/params', json={'years': YEARS, 'seed': 1}, headers=headers)
+    manager = web.sessions.get(scenario)
+    errors = []
+    counts = []
+
+    def reader():
+        client = web.app.test_client()
+        cursor = None
+        events = 0
+        reads = 0
+        while True:
+            running = manager.is_running()
+            response = client.get('/api/results/daily', headers=headers)
+            _check_daily(response.get_json(), errors)
+            query = f'?cursor={cursor}' if cursor else '?since_day=0'
+            delta = client.get('/api/results/patient_details' + query, headers=headers).get_json()
+            _check_details(delta, errors)
+            events += len(delta['rows'])
+            cursor = delta['cursor']
+            reads += 1
+            if not running:
+                break
+        counts.append((reads, events))
+
+    try:
+        control.post('/api/simulation/run', json={'background': True}, headers=headers)
+        threads = [threading.Thread(target=reader) for _ in range(READERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=300)
+        while manager.is_running():
+            time.sleep(0.01)
+
+        assert errors == []
+        assert len(counts) == READERS
+        total = len(manager.get_patient_details())
+        for reads, events in counts:
+            assert reads > 1  # 运行期间读到过中间状态
+            assert events == total  # 增量明细合计不重不漏
+        assert len(manager.get_snapshot().results('daily')) == YEARS * 365
+    finally:
+        web.sessions.remove(scenario)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+列式日统计数据测试
+"""
+
+import numpy as np
+
+from daily_history import COLUMNS
+from simulation_manager import SimulationManager
+
+
+def _history(days=30):
+    manager = SimulationManager()
+    manager.set_params({'years': 1, 'seed': 1})
+    for _ in range(days):
+        manager._run_single_day()
+    return manager.state['daily_history']
+
+
+def test_to_pandas_shares_column_memory():
+    history = _history()
+    frame = history.to_pandas()
+    assert len(frame) == len(history)
+    for name in COLUMNS:
+        assert np.shares_memory(frame[name].to_numpy(), history.column(name)), name
+
+
+def test_uncommitted_day_is_not_visible():
+    history = _history(3)
+    index, columns = history.start_day()
+    columns['Day'][index] = 4
+    assert len(history) == 3
+    assert [row['Day'] for row in history.rows()] == [1, 2, 3]
+    history.commit_day()
+    assert history[-1]['Day'] == 4
+
+
+def test_closed_days_carry_customer_counts():
+    history = _history(60)
+    rows = history.rows()
+    closed = [(previous, row) for previous, row in zip(rows, rows[1:]) if row['Weekday'] == '周二']
+    assert closed
+    for previous, row in closed:
+        assert row['PatientsSeen'] == 0
+        assert row['TotalCustomers'] == previous['TotalCustomers']  # 不开诊日没有新客户，累计客户数不变
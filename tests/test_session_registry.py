@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+会话注册表测试：溢出到磁盘与懒加载
+"""
+
+import os
+import pickle
+
+from session_registry import SessionRegistry
+
+
+class _Planted:
+    """反序列化时会执行代码的对象"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return (os.mkdir, (self.path,))
+
+
+def test_spilled_session_is_loaded_back(tmp_path):
+    registry = SessionRegistry(max_sessions=1, spill_dir=str(tmp_path))
+    manager = registry.get('a')
+    manager.set_params({'years': 1, 'seed': 1})
+    manager.run_next_week()
+
+    registry.get('b')  # 超出会话数上限，a溢出到磁盘
+    assert 'a' in registry
+    stats = registry.stats()
+    assert (stats['in_memory'], stats['spilled']) == (1, 1)
+
+    assert registry.get('a').state['current_day'] == 7
+    assert not os.path.exists(tmp_path / 'a.pkl')
+
+
+def test_files_not_written_by_registry_are_ignored(tmp_path):
+    registry = SessionRegistry(max_sessions=1, spill_dir=str(tmp_path))
+    planted = _Planted(str(tmp_path / 'executed'))
+    (tmp_path / 'x.pkl').write_bytes(pickle.dumps(planted))
+
+    assert 'x' not in registry
+    assert registry.get('x').state['current_day'] == 0  # 新建的会话
+    assert not os.path.exists(planted.path)
+
+
+def test_tampered_spill_file_is_not_loaded(tmp_path):
+    registry = SessionRegistry(max_sessions=1, spill_dir=str(tmp_path))
+    registry.get('a').set_params({'years': 1, 'seed': 1})
+    registry.get('b')
+    planted = _Planted(str(tmp_path / 'executed'))
+    (tmp_path / 'a.pkl').write_bytes(pickle.dumps(planted))
+
+    assert registry.get('a').state['current_day'] == 0
+    assert not os.path.exists(planted.path)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+事件流测试：断开的连接不会留下订阅
+"""
+
+import app as web
+
+
+def test_closing_unstarted_stream_leaves_no_subscriber():
+    scenario = 'test-stream'
+    try:
+        with web.app.test_request_context('/api/stream', headers={web.SCENARIO_HEADER: scenario}):
+            response = web.api_stream()
+            manager = web.sessions.get(scenario)
+            response.close()  # 客户端在生成器开始前断开
+            assert not manager.stream.has_subscribers
+    finally:
+        web.sessions.remove(scenario)
+
+
+def test_stream_unsubscribes_on_close():
+    scenario = 'test-stream'
+    try:
+        with web.app.test_request_context('/api/stream', headers={web.SCENARIO_HEADER: scenario}):
+            response = web.api_stream()
+            manager = web.sessions.get(scenario)
+            chunks = iter(response.response)
+            assert next(chunks).startswith('id: ')  # 连接建立时的state事件
+            assert manager.stream.has_subscribers
+            response.close()
+            assert not manager.stream.has_subscribers
+    finally:
+        web.sessions.remove(scenario)